@@ -0,0 +1,193 @@
+import asyncio
+from bisect import bisect_right
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Set, Tuple
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from agents._rate_limit import request_tokens
+from agents._tokens import count_prompt_tokens
+
+
+class AsyncBatcher:
+    """
+    Debouncing batcher that coalesces concurrent submissions into one call.
+
+    Items submitted within max_wait_ms of each other (up to max_batch_size)
+    are handed to batch_fn together, and each caller receives the result at
+    the matching position of the returned list.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int = 8, max_wait_ms: float = 50):
+        """
+        Initialize the batcher.
+
+        Args:
+            batch_fn: Coroutine function taking a list of items and returning
+                a list of results in the same order
+            max_batch_size: Flush as soon as this many items are pending
+            max_wait_ms: Flush at most this long after the first pending item
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # keep references so in-flight batches are not garbage collected
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Submit an item and wait for its result.
+
+        Args:
+            item: Item to include in the next batch
+
+        Returns:
+            The result batch_fn produced for this item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            # batch_fn may report per-item failures by returning the exception
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+# upper bounds (exclusive) of the expected-output-length bins; longer calls go in a final bin
+OUTPUT_TOKEN_BINS = (150, 400)
+
+
+class _QueuedCall(NamedTuple):
+    priority: int
+    tokens: int
+    est_out_tokens: int
+    call: Callable[[], Awaitable[Any]]
+
+
+class BatchingLLMClient:
+    """
+    Wrapper around a chat model that coalesces concurrent calls.
+
+    Calls arriving within max_wait_ms of each other are dispatched together,
+    so a burst of emails shares warm connections; rate limiting happens in
+    the shared connection pool (see _llm._http_async_client).
+    Within a batch, calls are grouped into bins by expected output length
+    and short ones start first; every caller receives its result as soon
+    as its own call finishes, so short replies are not held back by long
+    ones. Any other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, llm, max_batch: int = 16, max_wait_ms: float = 20):
+        """
+        Initialize the client.
+
+        Args:
+            llm: LangChain chat model instance to wrap
+            max_batch: Maximum number of calls dispatched together
+            max_wait_ms: Maximum time a call waits for others to join its batch
+        """
+        self.llm = llm
+        self._batcher = AsyncBatcher(self._dispatch, max_batch_size=max_batch, max_wait_ms=max_wait_ms)
+
+    def __getattr__(self, name: str) -> Any:
+        # only reached for attributes not set on the wrapper itself
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    async def submit(self, call: Callable[[], Awaitable[Any]], priority: int = 0, tokens: int = 0, est_out_tokens: int = 0) -> Any:
+        """
+        Run a call against the wrapped model as part of the next batch.
+
+        Args:
+            call: Zero-argument coroutine function issuing the request
+            priority: Higher-priority calls start first within a batch
+            tokens: Estimated tokens the request will consume
+            est_out_tokens: Expected length of the response, used for binning
+
+        Returns:
+            The call's result
+        """
+        # the batch hands back one task per call, so each caller gets its own result,
+        # exception or cancellation as soon as its call finishes
+        task = await self._batcher.submit(_QueuedCall(priority, tokens, est_out_tokens, call))
+        return await task
+
+    async def ainvoke(self, messages: List[BaseMessage], priority: int = 0) -> Any:
+        """
+        Invoke the wrapped model as part of the next batch.
+
+        Args:
+            messages: Messages to send to the LLM
+            priority: Higher-priority calls start first within a batch
+
+        Returns:
+            The model's response message
+        """
+        return await self.submit(lambda: self.llm.ainvoke(messages), priority, estimate_tokens(messages))
+
+    async def _dispatch(self, items: List[_QueuedCall]) -> List[asyncio.Task]:
+        async def _one(item: _QueuedCall) -> Any:
+            # each call runs in its own task, so this only labels that call's request
+            request_tokens.set(item.tokens)
+            return await item.call()
+
+        # tasks queue on the rate limiter in creation order, so start the shortest
+        # output bin first and, within a bin, the highest priority first
+        order = sorted(
+            range(len(items)),
+            key=lambda i: (bisect_right(OUTPUT_TOKEN_BINS, items[i].est_out_tokens), -items[i].priority),
+        )
+        tasks: List[Any] = [None] * len(items)
+        for i in order:
+            tasks[i] = asyncio.ensure_future(_one(items[i]))
+        return tasks
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """
+    Estimate the token count of a prompt.
+
+    System prompts are fixed module constants, so they are counted exactly
+    (and only once, see count_prompt_tokens); the per-email messages use a
+    cheap four-characters-per-token estimate.
+    """
+    return sum(
+        count_prompt_tokens(m.content) if isinstance(m, SystemMessage) else len(m.content) // 4
+        for m in messages
+    )
@@ -0,0 +1,231 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    """
+    Serialize an object to compact JSON.
+
+    Uses orjson when it is installed and falls back to the standard library
+    otherwise. Values that are not JSON-serializable are converted with str().
+
+    Args:
+        obj: Object to serialize
+        sort_keys: Whether to sort dictionary keys (for stable cache keys)
+        indent: Whether to pretty-print with two-space indentation (for display)
+
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=str, option=option).decode()
+
+    if indent:
+        return json.dumps(obj, sort_keys=sort_keys, default=str, indent=2, ensure_ascii=False)
+    return json.dumps(obj, sort_keys=sort_keys, default=str, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(data: str) -> Any:
+    """
+    Deserialize a JSON document.
+
+    orjson rejects raw control characters inside strings, which LLMs
+    sometimes emit, so those documents are retried with the lenient
+    standard library parser.
+
+    Args:
+        data: JSON string
+
+    Returns:
+        Parsed value
+
+    Raises:
+        json.JSONDecodeError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(data, strict=False)
+
+
+# braces, quotes and escape sequences (consumed whole, so an escaped quote never matches '"')
+_RE_JSON_TOKEN = re.compile(r'\\.|[{}"]', re.DOTALL)
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Find the first balanced JSON object in a piece of text.
+
+    Scans from the first '{' for braces, quotes and escape sequences only,
+    tracking brace depth while skipping over braces inside string literals.
+
+    Args:
+        text: Raw text that may contain a JSON object
+
+    Returns:
+        The JSON object as a substring, or None if no balanced object is found
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    # only visit the characters that can change the scanner state
+    for match in _RE_JSON_TOKEN.finditer(text, start):
+        token = match.group()
+        if in_string:
+            if token == '"':
+                in_string = False
+        elif token == '"':
+            in_string = True
+        elif token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:match.end()]
+
+    return None
+
+
+class JSONObjectStream:
+    """
+    Incremental parser for a JSON object that arrives in chunks.
+
+    Each call to feed() returns the top-level members whose values have
+    been fully received, so consumers can act on early fields while later
+    ones are still streaming. Once the closing brace arrives, result()
+    returns the whole object without a second parse of the full text.
+    Text before the opening brace (e.g. a code fence) and after the closing
+    brace is ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start: Optional[int] = None
+        self._done = False
+        self._result: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        """Whether the closing brace of the object has been received"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add a chunk of text and return newly completed members.
+
+        Args:
+            chunk: Next piece of the streamed response
+
+        Returns:
+            List of (key, value) pairs completed by this chunk
+
+        Raises:
+            json.JSONDecodeError: If a completed member is not valid JSON
+        """
+        members: List[Tuple[str, Any]] = []
+        if self._done:
+            return members
+
+        self._buffer += chunk
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._member_start is None:
+                # still looking for the opening brace
+                if char == '{':
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._member_start:i], members)
+                    self._done = True
+                    break
+            elif char == ',' and self._depth == 1:
+                self._emit(buffer[self._member_start:i], members)
+                self._member_start = i + 1
+
+        self._pos = len(buffer)
+        return members
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Return the fully parsed object.
+
+        Returns:
+            Parsed JSON object
+
+        Raises:
+            ValueError: If the closing brace has not been received yet
+        """
+        if not self._done:
+            raise ValueError("Incomplete JSON object in response")
+        return self._result
+
+    def _emit(self, text: str, members: List[Tuple[str, Any]]) -> None:
+        if text.strip():
+            member = loads("{" + text + "}")
+            self._result.update(member)
+            members.extend(member.items())
+
+
+def parse_llm_json(content: str) -> Dict[str, Any]:
+    """
+    Parse a JSON object out of an LLM response.
+
+    Most responses are already clean JSON, so a direct parse is tried first
+    and the brace scanner is only used when the model wrapped the object in
+    extra text.
+
+    Args:
+        content: Raw response content from the LLM
+
+    Returns:
+        Parsed JSON as dictionary
+
+    Raises:
+        json.JSONDecodeError: If JSON parsing fails
+        ValueError: If no JSON object is found
+    """
+    try:
+        return loads(content)
+    except json.JSONDecodeError:
+        pass
+
+    candidate = extract_json_object(content)
+    if candidate is None:
+        raise ValueError("No JSON object found in response")
+
+    return loads(candidate)
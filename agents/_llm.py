@@ -0,0 +1,208 @@
+import asyncio
+import importlib.util
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from agents._batching import estimate_tokens
+from agents._json import JSONObjectStream, parse_llm_json
+from agents._rate_limit import RateLimitedTransport, request_tokens
+
+# seconds to wait before the first retry; doubled on each further attempt
+RETRY_BACKOFF = 0.5
+
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+@lru_cache(maxsize=None)
+def _http_async_client() -> httpx.AsyncClient:
+    """Process-wide connection pool shared by every LLM client, rate limited per provider"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=_HTTP2,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    )
+    return httpx.AsyncClient(transport=RateLimitedTransport(transport), timeout=60)
+
+
+async def aclose_http_client() -> None:
+    """Close the shared connection pool; call once on application shutdown"""
+    if _http_async_client.cache_info().currsize:
+        await _http_async_client().aclose()
+        _http_async_client.cache_clear()
+        get_llm.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_llm(temperature: float = 0.1, model: str = "gpt-4o") -> ChatOpenAI:
+    """
+    Return the shared chat model for a temperature and model name.
+
+    Agents share instances (and a single connection pool) so concurrent
+    calls reuse warm TCP/TLS connections instead of each agent opening its
+    own.
+
+    Args:
+        temperature: Sampling temperature
+        model: OpenAI model name
+
+    Returns:
+        Process-wide ChatOpenAI instance for these settings
+    """
+    return ChatOpenAI(
+        temperature=temperature,
+        model=model,
+        http_async_client=_http_async_client(),
+    )
+
+
+# LangChain message types mapped to OpenAI chat roles
+_OPENAI_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+async def _ainvoke_openai_json(llm, messages: List[BaseMessage], on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+    """
+    Call the OpenAI client behind a ChatOpenAI instance directly in JSON mode.
+
+    Skips LangChain's message conversion, callbacks and output parsing,
+    while still honouring the instance's model, temperature, credentials
+    and HTTP client. The response is streamed and parsed incrementally as
+    it arrives, so no second pass over the full text is needed, and
+    on_field is called with each top-level field as soon as it completes.
+    """
+    stream = await llm.root_async_client.chat.completions.create(
+        model=llm.model_name,
+        temperature=llm.temperature,
+        messages=[{"role": _OPENAI_ROLES[m.type], "content": m.content} for m in messages],
+        response_format={"type": "json_object"},
+        stream=True,
+    )
+
+    parser = JSONObjectStream()
+    parts = []
+    failed = False
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            continue
+        parts.append(delta)
+        if not failed:
+            try:
+                for key, value in parser.feed(delta):
+                    if on_field is not None:
+                        on_field(key, value)
+            except ValueError:
+                failed = True
+
+    if not failed and parser.done:
+        return parser.result()
+
+    # the incremental parse failed, so fall back to the lenient full-text parser
+    return parse_llm_json("".join(parts))
+
+
+async def ainvoke_structured(llm, schema: Type[BaseModel], messages: List[BaseMessage], max_retries: int = 2,
+                             on_field: Optional[Callable[[str, Any], None]] = None, est_out_tokens: int = 0) -> Dict[str, Any]:
+    """
+    Invoke an LLM and return its response validated against a Pydantic schema.
+
+    OpenAI chat models are called through their underlying client in JSON
+    mode, bypassing the LangChain invoke machinery. Other models use their
+    structured-output mode so the provider enforces the schema, and models
+    without structured-output support fall back to parsing JSON out of the
+    text response. When the output does not validate, the error is fed
+    back to the model and the call is retried with backoff.
+
+    Args:
+        llm: LangChain chat model instance, optionally wrapped in a BatchingLLMClient
+        schema: Pydantic model describing the expected response
+        messages: Messages to send to the LLM
+        max_retries: Number of corrective retries after the first attempt
+        on_field: Called with each top-level field as it streams in, before
+            validation (streaming OpenAI path only; fields from an attempt
+            that later fails validation may be reported too)
+        est_out_tokens: Expected response length, used by BatchingLLMClient
+            to batch calls of similar length together
+
+    Returns:
+        The validated response as a dictionary
+
+    Raises:
+        ValueError: If the response still does not match the schema after all retries
+    """
+    # route every request through the batching client when the model is wrapped in one
+    batching_submit = getattr(llm, "submit", None)
+    if batching_submit is not None:
+        llm = llm.llm
+
+    async def submit(call):
+        if batching_submit is None:
+            token = request_tokens.set(estimate_tokens(messages))
+            try:
+                return await call()
+            finally:
+                request_tokens.reset(token)
+        return await batching_submit(call, tokens=estimate_tokens(messages), est_out_tokens=est_out_tokens)
+
+    direct = getattr(llm, "root_async_client", None) is not None
+    structured_llm = None
+    if not direct:
+        try:
+            structured_llm = llm.with_structured_output(schema, method="function_calling", include_raw=True)
+        except NotImplementedError:
+            pass
+
+    messages = list(messages)
+    for attempt in range(max_retries + 1):
+        if structured_llm is not None:
+            result = await submit(lambda: structured_llm.ainvoke(messages))
+            if result["parsed"] is not None:
+                return result["parsed"].model_dump()
+            error = result["parsing_error"] or ValueError("Model returned no structured output")
+        else:
+            try:
+                if direct:
+                    data = await submit(lambda: _ainvoke_openai_json(llm, messages, on_field))
+                else:
+                    data = parse_llm_json((await submit(lambda: llm.ainvoke(messages))).content)
+                return schema.model_validate(data).model_dump()
+            except ValueError as e:
+                error = e
+
+        if attempt == max_retries:
+            raise error
+
+        # tell the model what was wrong so the next attempt can correct it
+        messages.append(HumanMessage(
+            content=f"Your previous response did not match the required schema: {error}\n"
+                    f"Respond again with output that matches the schema exactly."
+        ))
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+async def astream_json_fields(llm, messages: List[BaseMessage]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream an LLM's JSON response and yield each top-level field once complete.
+
+    Lets callers start on early fields (or show them in a UI) while the
+    rest of the response is still being generated. Unlike
+    ainvoke_structured, the output is not validated against a schema.
+
+    Args:
+        llm: LangChain chat model instance
+        messages: Messages to send to the LLM
+
+    Yields:
+        (key, value) pairs in the order the model produces them
+
+    Raises:
+        json.JSONDecodeError: If a field is not valid JSON
+    """
+    parser = JSONObjectStream()
+    async for chunk in llm.astream(messages):
+        for key, value in parser.feed(chunk.content):
+            yield key, value
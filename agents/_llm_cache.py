@@ -0,0 +1,140 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from agents import _json
+
+load_dotenv()
+
+# responses quote email contents, so they are only written to disk (in
+# plaintext, without expiry) when LUMORA_CACHE_DIR opts in; memory only otherwise
+CACHE_DIR = os.getenv("LUMORA_CACHE_DIR") or None
+
+
+def make_key(*parts: str) -> str:
+    """
+    Build a content-addressable cache key from several string parts.
+
+    Each part is length-prefixed with 8 bytes before hashing so that
+    ("ab", "c") and ("a", "bc") never produce the same key.
+
+    Args:
+        parts: Key components, e.g. prompt version, model, call site, inputs
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Cache of parsed LLM responses keyed by make_key().
+
+    Entries live in a bounded in-memory LRU and, when a cache directory is
+    configured, as one JSON file per key so they survive restarts.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = CACHE_DIR, max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory for on-disk entries (None or "" for memory only)
+            max_entries: Maximum number of entries kept in memory
+        """
+        self.cache_dir = cache_dir or None
+        self.max_entries = max_entries
+        # values are stored serialized so callers always get a fresh copy
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+
+        if self.cache_dir:
+            # only the owner may read the cached responses
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        raw = self._memory.get(key)
+        if raw is not None:
+            self._memory.move_to_end(key)
+            return _json.loads(raw)
+
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                raw = f.read()
+        except OSError:
+            return None
+
+        self._remember(key, raw)
+        return _json.loads(raw)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Store a response in the cache.
+
+        Args:
+            key: Cache key from make_key()
+            value: JSON-serializable response
+        """
+        raw = _json.dumps(value)
+        self._remember(key, raw)
+
+        if not self.cache_dir:
+            return
+
+        # write to a temp file first so readers never see a partial entry
+        tmp_path = f"{self._path(key)}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(raw)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            pass
+
+    def _remember(self, key: str, raw: str) -> None:
+        self._memory[key] = raw
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+_default_cache: Optional[LLMCache] = None
+
+
+def _cache() -> LLMCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LLMCache()
+    return _default_cache
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Look up a key in the process-wide cache"""
+    return _cache().get(key)
+
+
+def put(key: str, value: Dict[str, Any]) -> None:
+    """Store a value in the process-wide cache"""
+    _cache().put(key, value)
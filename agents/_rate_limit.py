@@ -0,0 +1,293 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class ProviderProfile:
+    """Steady-state limits for an LLM provider"""
+    rpm: int
+    tpm: int
+    max_concurrency: int
+    target_latency: float
+
+
+# seed limits per provider; the concurrency limit then adapts at runtime
+PROVIDER_PROFILES = {
+    "openai": ProviderProfile(rpm=500, tpm=150_000, max_concurrency=10, target_latency=2.0),
+    "azure": ProviderProfile(rpm=300, tpm=120_000, max_concurrency=8, target_latency=2.0),
+}
+
+# environment variables overriding the profile limits to match the account's quota tier
+_PROFILE_ENV = {
+    "rpm": "LUMORA_LLM_RPM",
+    "tpm": "LUMORA_LLM_TPM",
+    "max_concurrency": "LUMORA_LLM_MAX_CONCURRENCY",
+}
+
+_PROVIDER_PATTERNS = [
+    (re.compile(r"\.openai\.azure\.com"), "azure"),
+    (re.compile(r"api\.openai\.com"), "openai"),
+]
+
+# status codes that mean the provider wants us to back off
+_BACKOFF_STATUSES = {429, 503}
+
+_WINDOW = 60.0
+
+# rough characters-per-token ratio for requests without a caller-supplied estimate
+_CHARS_PER_TOKEN = 4
+
+# token estimate for the request about to be sent, set by callers that know it better
+request_tokens: ContextVar[Optional[int]] = ContextVar("request_tokens", default=None)
+
+
+def detect_provider(host: str) -> str:
+    """
+    Detect the provider behind an API host name.
+
+    Args:
+        host: Host the request is sent to
+
+    Returns:
+        Key into PROVIDER_PROFILES (defaults to "openai")
+    """
+    for pattern, provider in _PROVIDER_PATTERNS:
+        if pattern.search(host):
+            return provider
+    return "openai"
+
+
+def provider_profile(provider: str) -> ProviderProfile:
+    """
+    Return the limits for a provider, with any environment overrides applied.
+
+    Args:
+        provider: Key into PROVIDER_PROFILES
+
+    Returns:
+        The provider's profile
+    """
+    overrides = {field: int(os.environ[name]) for field, name in _PROFILE_ENV.items() if os.getenv(name)}
+    return replace(PROVIDER_PROFILES[provider], **overrides)
+
+
+def _is_backoff_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status in _BACKOFF_STATUSES or type(error).__name__ == "RateLimitError"
+
+
+class _Slot:
+    """One request's hold on the limiter"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.throttled = False
+        self.released = False
+
+    def backoff(self) -> None:
+        """Report that the provider rejected the request as over its limits"""
+        self.throttled = True
+
+
+class LLMRateLimiter:
+    """
+    Provider-aware limiter for LLM requests.
+
+    Enforces sliding-window requests-per-minute and tokens-per-minute
+    budgets, plus a concurrency limit tuned by AIMD: it halves when the
+    provider answers 429/503 and grows by one after each success that
+    finishes within the provider's target latency.
+    """
+
+    def __init__(self, profile: ProviderProfile):
+        """
+        Initialize the limiter.
+
+        Args:
+            profile: Provider limits to enforce
+        """
+        self.profile = profile
+        self.limit = float(profile.max_concurrency)
+        self._inflight = 0
+        self._requests: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._condition = asyncio.Condition()
+
+    def _expire(self, now: float) -> None:
+        while self._requests and now - self._requests[0][0] >= _WINDOW:
+            _, tokens = self._requests.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        # seconds until this request fits every budget, 0 if it fits now
+        if self._inflight >= max(1, int(self.limit)):
+            return -1
+        over_rpm = len(self._requests) >= self.profile.rpm
+        over_tpm = bool(self._requests) and self._tokens_in_window + tokens > self.profile.tpm
+        if over_rpm or over_tpm:
+            return self._requests[0][0] + _WINDOW - now
+        return 0
+
+    async def reserve(self, tokens: int = 0) -> "_Slot":
+        """
+        Wait for capacity, then take a slot for one request.
+
+        Every reserved slot must be handed back with release().
+
+        Args:
+            tokens: Estimated tokens the request will consume
+
+        Returns:
+            The slot; call its backoff() when the provider answers 429/503
+        """
+        async with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(tokens, now)
+                if wait == 0:
+                    break
+                if wait < 0:
+                    # at the concurrency limit; woken when a slot frees up
+                    await self._condition.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+            self._inflight += 1
+            self._requests.append((now, tokens))
+            self._tokens_in_window += tokens
+
+        return _Slot()
+
+    async def release(self, slot: "_Slot", error: Optional[BaseException] = None) -> None:
+        """
+        Hand back a slot once its request has finished, adapting the concurrency limit.
+
+        Releasing a slot more than once has no further effect.
+
+        Args:
+            slot: Slot returned by reserve()
+            error: Exception the request failed with, if any
+        """
+        if slot.released:
+            return
+        slot.released = True
+
+        if slot.throttled or (error is not None and _is_backoff_error(error)):
+            self.limit = max(1.0, self.limit / 2)
+        elif error is None and time.monotonic() - slot.start <= self.profile.target_latency:
+            self.limit = min(float(self.profile.max_concurrency), self.limit + 1)
+
+        async with self._condition:
+            self._inflight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0) -> AsyncIterator["_Slot"]:
+        """
+        Wait for capacity, then hold a slot for the duration of one request.
+
+        Args:
+            tokens: Estimated tokens the request will consume
+
+        Yields:
+            The slot; call its backoff() when the provider answers 429/503
+        """
+        slot = await self.reserve(tokens)
+        try:
+            yield slot
+        except BaseException as e:
+            await self.release(slot, e)
+            raise
+        await self.release(slot)
+
+
+class _SlotReleasingStream(httpx.AsyncByteStream):
+    """Response body that keeps its request's slot until the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, limiter: LLMRateLimiter, slot: "_Slot"):
+        self._stream = stream
+        self._limiter = limiter
+        self._slot = slot
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except BaseException as e:
+            await self._limiter.release(self._slot, e)
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            await self._limiter.release(self._slot)
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that gates every request through a rate limiter.
+
+    Installed on the connection pool shared by every chat model, so all
+    agents draw from one budget per provider instead of only the ones
+    that opt in.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        """
+        Initialize the transport.
+
+        Args:
+            transport: Transport that actually sends the requests
+        """
+        self._transport = transport
+        self._limiters: Dict[str, LLMRateLimiter] = {}
+
+    def limiter_for(self, host: str) -> LLMRateLimiter:
+        """Return the limiter shared by every request to a host's provider"""
+        provider = detect_provider(host)
+        if provider not in self._limiters:
+            self._limiters[provider] = LLMRateLimiter(provider_profile(provider))
+        return self._limiters[provider]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = request_tokens.get()
+        if tokens is None:
+            try:
+                tokens = len(request.content) // _CHARS_PER_TOKEN
+            except httpx.RequestNotRead:
+                tokens = 0
+
+        limiter = self.limiter_for(request.url.host)
+        slot = await limiter.reserve(tokens)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            await limiter.release(slot, e)
+            raise
+
+        if response.status_code in _BACKOFF_STATUSES:
+            slot.backoff()
+        # headers arrive before a streamed completion's body, so the slot is
+        # held (and the latency measured) until the body has been read and closed
+        response.stream = _SlotReleasingStream(response.stream, limiter, slot)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# upper bound on email content tokens sent to the LLM
+MAX_CONTENT_TOKENS = 4000
+
+# rough characters-per-token ratio used when tiktoken or its encoding is unavailable
+_CHARS_PER_TOKEN = 4
+
+_TRUNCATION_MARKER = "\n…[truncated]"
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # loaded on first use: tiktoken downloads the BPE file the first time,
+    # which fails offline, so any error falls back to the character budget
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def truncate_to_tokens(text: str, max_tokens: int = MAX_CONTENT_TOKENS) -> str:
+    """
+    Truncate text to a token budget before it is placed in a prompt.
+
+    Counts tokens with tiktoken when it is installed and otherwise falls
+    back to a character budget. Truncated text ends with a marker so the
+    model knows the content is incomplete.
+
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+
+    Returns:
+        The original text if it fits, otherwise its truncated prefix
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        max_chars = max_tokens * _CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars] + _TRUNCATION_MARKER
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + _TRUNCATION_MARKER
+
+
+@lru_cache(maxsize=64)
+def count_prompt_tokens(text: str) -> int:
+    """
+    Count the tokens in a fixed prompt, such as a module-level system prompt.
+
+    Results are memoized, so each distinct prompt is tokenized once per
+    process instead of on every request.
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        Number of tokens in the text
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,11 +1,173 @@
-import json
+import asyncio
+import logging
 import re
-from typing import Dict, Any
-# import asyncio
-from langchain_openai import ChatOpenAI
+import string
+from typing import Dict, Any, List
 from langchain_core.messages import HumanMessage, SystemMessage
 from email.message import Message
 
+from agents import _json, _llm_cache
+from agents._batching import AsyncBatcher
+from agents._llm import ainvoke_structured, get_llm
+from agents._tokens import truncate_to_tokens
+from agents.schemas import EmailAnalysis, EmailAnalysisBatch, KGExtraction
+
+logger = logging.getLogger(__name__)
+
+# bump when prompts change so cached responses are invalidated
+PROMPT_VERSION = "v2"
+
+_RE_NL3 = re.compile(r'\n{3,}')
+_INVOICE_RE = re.compile(r'\b(?:invoice|payment|bill|receipt|due|statement|charge)s?\b', re.IGNORECASE)
+
+# system prompts are kept byte-identical across calls so provider-side
+# prompt caching can reuse the prefix; per-email data goes at the tail
+_SYSTEM_ANALYSE = """You are Dela's email analysis engine. Your role is to analyze emails and extract structured information.
+
+Focus on identifying:
+- Primary intent of the email (request, information, follow-up, etc.)
+- Key entities mentioned (people, organizations, products, etc.)
+- Any action items or requests
+- Priority level (high, medium, low)
+- Category (invoice, meeting, task, etc.)
+- Sentiment (positive, negative, neutral)
+
+If the email contains an invoice or payment request, extract:
+- Invoice number
+- Amount
+- Due date
+- Vendor/supplier name
+- Payment method requested (if any)
+
+Always return valid JSON only, no additional text or explanations."""
+
+_ANALYSE_INSTRUCTIONS = """Analyze this email and extract structured information.
+
+Return a JSON object with the following structure:
+{
+    "intent": "string",
+    "category": "string",
+    "priority": "string",
+    "sentiment": "string",
+    "entities": [
+        {
+            "type": "string",
+            "name": "string",
+            "relevance": "string"
+        }
+    ],
+    "action_items": [
+        {
+            "description": "string",
+            "due_date": "string or null",
+            "assignee": "string or null"
+        }
+    ],
+    "invoice_data": {
+        "is_invoice": true/false,
+        "invoice_number": "string or null",
+        "amount": "string or null",
+        "currency": "string or null",
+        "due_date": "string or null",
+        "vendor": "string or null",
+        "payment_method": "string or null"
+    },
+    "summary": "string"
+}
+
+Email:
+"""
+
+_USER_TMPL_ANALYSE = string.Template(_ANALYSE_INSTRUCTIONS + """From: $sender
+To: $to
+Subject: $subject
+Date: $date
+
+Content:
+$content""")
+
+_ANALYSE_BATCH_INSTRUCTIONS = """Analyze each of the following emails independently and extract structured information.
+
+Return a JSON object of the form {"results": [{"id": <email id>, "analysis": {...}}, ...]}
+with exactly one entry per email, where each analysis has the following structure:
+{
+    "intent": "string",
+    "category": "string",
+    "priority": "string",
+    "sentiment": "string",
+    "entities": [{"type": "string", "name": "string", "relevance": "string"}],
+    "action_items": [{"description": "string", "due_date": "string or null", "assignee": "string or null"}],
+    "invoice_data": {
+        "is_invoice": true/false,
+        "invoice_number": "string or null",
+        "amount": "string or null",
+        "currency": "string or null",
+        "due_date": "string or null",
+        "vendor": "string or null",
+        "payment_method": "string or null"
+    },
+    "summary": "string"
+}
+
+Emails:
+"""
+
+_SYSTEM_KG = """You are Dela's knowledge graph extraction engine. Your role is to analyze email data and extract structured information for workflow automation.
+
+Focus on identifying workflow-relevant entities:
+- People (sender, recipients, mentioned individuals)
+- Organizations (companies, departments)
+- Documents (invoices, reports, attachments)
+- Systems (software, platforms mentioned)
+- Tasks (action items, requests)
+
+Extract relationships that show workflow dependencies:
+- SENT_BY (email SENT_BY person)
+- RECEIVED_BY (email RECEIVED_BY person)
+- MENTIONS (email MENTIONS person/org/system)
+- CONTAINS (email CONTAINS document/task)
+- REQUESTS (email REQUESTS action/information)
+- RELATED_TO (email RELATED_TO previous communication)
+
+Always return valid JSON only, no additional text or explanations."""
+
+_KG_INSTRUCTIONS = """Extract entities and relationships from this email data for Dela's knowledge graph.
+
+Return a JSON object with the following structure:
+{
+    "entities": [
+        {
+            "type": "string",
+            "properties": {
+                "name": "string",
+                "id": "string",
+                "other_properties": "as needed"
+            }
+        }
+    ],
+    "relationships": [
+        {
+            "from_type": "string",
+            "from_properties": {
+                "identifying_property": "value"
+            },
+            "to_type": "string",
+            "to_properties": {
+                "identifying_property": "value"
+            },
+            "type": "string",
+            "properties": {
+                "optional_properties": "as needed"
+            }
+        }
+    ]
+}
+
+Email Data: """
+
+_SYSTEM_MESSAGE_ANALYSE = SystemMessage(content=_SYSTEM_ANALYSE)
+_SYSTEM_MESSAGE_KG = SystemMessage(content=_SYSTEM_KG)
+
 class Analyser:
     """
     Analyser agent that processes emails, extracts key information, and determines intent.
@@ -20,10 +182,9 @@ class Analyser:
         Args:
             llm: LangChain language model instance (optional)
         """
-        self.llm = llm or ChatOpenAI(
-            temperature=0.1,
-            model="gpt-4o",
-        )
+        self.llm = llm or get_llm(temperature=0.1, model="gpt-4o")
+        # coalesces concurrent analyse_email and analyse_email_full calls into one LLM request
+        self._batcher = AsyncBatcher(self._analyse_contents_batch, max_batch_size=8, max_wait_ms=50)
     
     async def analyse_email(self, email_message: Message) -> Dict[str, Any]:
         """
@@ -42,14 +203,101 @@ class Analyser:
         email_content = self._extract_email_content(email_message)
         email_data["content"] = email_content
         
-        # Analyse email content using LLM
-        analysis_result = await self._analyse_content(email_data)
+        # Analyse email content using LLM, batched with concurrent callers
+        analysis_result = await self._batcher.submit(email_data)
+        
+        # Merge results
+        email_data.update(analysis_result)
+        
+        return email_data
+    
+    async def analyse_emails_batch(self, emails: List[Message]) -> List[Dict[str, Any]]:
+        """
+        Analyse several email messages with a single LLM call.
+        
+        Args:
+            emails: Email messages to analyse
+            
+        Returns:
+            List of dictionaries containing extracted information and intent,
+            in the same order as the input
+        """
+        emails_data = []
+        for email_message in emails:
+            email_data = self._extract_email_metadata(email_message)
+            email_data["content"] = self._extract_email_content(email_message)
+            emails_data.append(email_data)
+        
+        analysis_results = await self._analyse_contents_batch(emails_data)
+        
+        for email_data, analysis_result in zip(emails_data, analysis_results):
+            email_data.update(analysis_result)
+        
+        return emails_data
+    
+    async def analyse_many(self, messages: List[Message], max_concurrent: int = 16) -> List[Dict[str, Any]]:
+        """
+        Analyse many email messages concurrently with bounded parallelism.
+        
+        Args:
+            messages: Email messages to analyse
+            max_concurrent: Maximum number of analyses in flight at once
+        
+        Returns:
+            List of analysis results in the same order as the input
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def _one(email_message: Message) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.analyse_email(email_message)
+        
+        return await asyncio.gather(*(_one(m) for m in messages))
+    
+    async def analyse_email_full(self, email_message: Message) -> Dict[str, Any]:
+        """
+        Analyse an email message and extract knowledge graph data in one pass.
+        
+        The content analysis and the knowledge graph extraction are independent
+        LLM calls, so they are issued concurrently instead of back to back.
+        
+        Args:
+            email_message: Email message to analyse
+            
+        Returns:
+            Dictionary containing extracted information, intent and kg_data
+        """
+        # Extract metadata and content once for both LLM calls
+        email_data = self._extract_email_metadata(email_message)
+        email_data["content"] = self._extract_email_content(email_message)
+        
+        # Run analysis and KG extraction concurrently; the analysis is batched with concurrent callers
+        analysis_result, kg_data = await asyncio.gather(
+            self._batcher.submit(email_data),
+            self.extract_entities_for_kg(email_data),
+        )
         
         # Merge results
         email_data.update(analysis_result)
+        email_data["kg_data"] = kg_data
         
         return email_data
     
+    def analyse_email_metadata_only(self, email_message: Message) -> Dict[str, Any]:
+        """
+        Extract an email's headers without decoding its body.
+        
+        Useful for cheap triage (e.g. detect_invoice on the subject) before
+        committing to a full analysis.
+        
+        Args:
+            email_message: Email message
+            
+        Returns:
+            Dictionary containing email metadata only
+        """
+        return self._extract_email_metadata(email_message)
+    
     def _extract_email_metadata(self, email_message: Message) -> Dict[str, Any]:
         """
         Extract basic metadata from an email message.
@@ -80,25 +328,41 @@ class Analyser:
         Returns:
             Extracted email content as text
         """
-        content = ""
-        
-        # Handle multipart messages
+        # Find the first text/plain part without decoding the ones before it
         if email_message.is_multipart():
-            for part in email_message.get_payload():
-                if part.get_content_type() == "text/plain":
-                    content = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
-                    break
+            part = next((p for p in email_message.get_payload() if p.get_content_type() == "text/plain"), None)
         else:
-            # Handle single part messages
-            if email_message.get_content_type() == "text/plain":
-                content = email_message.get_payload(decode=True).decode(email_message.get_content_charset() or 'utf-8', errors='replace')
+            part = email_message if email_message.get_content_type() == "text/plain" else None
+        
+        if part is None:
+            return ""
+        
+        content = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='replace')
         
         # Clean up content
-        content = re.sub(r'\r\n', '\n', content)
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = content.replace('\r\n', '\n')
+        content = _RE_NL3.sub('\n\n', content)
         
         return content
     
+    def _cache_key(self, call_site: str, payload: Dict[str, Any]) -> str:
+        """
+        Build the LLM response cache key for a call site and its inputs.
+        
+        Args:
+            call_site: Name of the prompt being sent
+            payload: Inputs interpolated into the prompt
+            
+        Returns:
+            Content-addressable cache key
+        """
+        return _llm_cache.make_key(
+            PROMPT_VERSION,
+            getattr(self.llm, "model_name", type(self.llm).__name__),
+            call_site,
+            _json.dumps(payload, sort_keys=True),
+        )
+    
     async def _analyse_content(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Analyse email content using LLM to extract intent and key information.
@@ -109,93 +373,33 @@ class Analyser:
         Returns:
             Dictionary containing analysis results
         """
-        system_prompt = """You are Dela's email analysis engine. Your role is to analyze emails and extract structured information.
-
-Focus on identifying:
-- Primary intent of the email (request, information, follow-up, etc.)
-- Key entities mentioned (people, organizations, products, etc.)
-- Any action items or requests
-- Priority level (high, medium, low)
-- Category (invoice, meeting, task, etc.)
-- Sentiment (positive, negative, neutral)
-
-If the email contains an invoice or payment request, extract:
-- Invoice number
-- Amount
-- Due date
-- Vendor/supplier name
-- Payment method requested (if any)
-
-Always return valid JSON only, no additional text or explanations."""
-
-        user_prompt = f"""Analyze this email and extract structured information:
-
-From: {email_data['from']}
-To: {email_data['to']}
-Subject: {email_data['subject']}
-Date: {email_data['date']}
-
-Content:
-{email_data['content']}
-
-Return a JSON object with the following structure:
-{{
-    "intent": "string",
-    "category": "string",
-    "priority": "string",
-    "sentiment": "string",
-    "entities": [
-        {{
-            "type": "string",
-            "name": "string",
-            "relevance": "string"
-        }}
-    ],
-    "action_items": [
-        {{
-            "description": "string",
-            "due_date": "string or null",
-            "assignee": "string or null"
-        }}
-    ],
-    "invoice_data": {{
-        "is_invoice": true/false,
-        "invoice_number": "string or null",
-        "amount": "string or null",
-        "currency": "string or null",
-        "due_date": "string or null",
-        "vendor": "string or null",
-        "payment_method": "string or null"
-    }},
-    "summary": "string"
-}}"""
+        cache_key = self._cache_key("analyse", email_data)
+        cached = _llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        user_prompt = _USER_TMPL_ANALYSE.substitute(
+            sender=email_data['from'],
+            to=email_data['to'],
+            subject=email_data['subject'],
+            date=email_data['date'],
+            content=truncate_to_tokens(email_data['content']),
+        )
 
         # create messages for the LLM   
         messages = [
-            SystemMessage(content=system_prompt.format()),
-            HumanMessage(content=user_prompt.format(email_json=json.dumps(email_data, indent=2)))
+            _SYSTEM_MESSAGE_ANALYSE,
+            HumanMessage(content=user_prompt)
         ]
         
-        # get response from LLM
-        response = await self.llm.ainvoke(messages)
-        
         try:
-            # extract and parse JSON from response
-            content = response.content
-            # handle potential formatting issues in the response
-            if isinstance(content, str):
-                # find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                analysis_result = json.loads(content)
-            else:
-                analysis_result = {}
-                
+            # get schema-validated response from LLM
+            analysis_result = await ainvoke_structured(self.llm, EmailAnalysis, messages)
+            _llm_cache.put(cache_key, analysis_result)
+            
             return analysis_result
-        except Exception as e:
-            logging.error(f"Error parsing analysis result: {e}", exc_info=True)
+        except ValueError as e:
+            logger.error("Error parsing analysis result: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {
                 "intent": "unknown",
                 "category": "unknown",
@@ -207,7 +411,73 @@ Return a JSON object with the following structure:
                 "summary": "Failed to analyze email content"
             }
     
-    async def detect_invoice(self, email_data: Dict[str, Any]) -> bool:
+    async def _analyse_contents_batch(self, emails_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Analyse the content of several emails in one LLM request.
+        
+        Cached emails are served from the cache; the rest are sent together.
+        Emails the model leaves out of its response are retried individually.
+        Batched results are cached under their own key, apart from those of
+        the single-email prompt.
+        
+        Args:
+            emails_data: List of dictionaries containing email data
+            
+        Returns:
+            List of analysis results in the same order as the input
+        """
+        results: List[Any] = [None] * len(emails_data)
+        cache_keys = [self._cache_key("analyse_batch", email_data) for email_data in emails_data]
+        
+        pending = []
+        for i, cache_key in enumerate(cache_keys):
+            cached = _llm_cache.get(cache_key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        # a single email gains nothing from the batch prompt
+        if len(pending) > 1:
+            entries = [
+                {
+                    "id": i,
+                    "from": emails_data[i]["from"],
+                    "to": emails_data[i]["to"],
+                    "subject": emails_data[i]["subject"],
+                    "date": emails_data[i]["date"],
+                    "content": truncate_to_tokens(emails_data[i]["content"]),
+                }
+                for i in pending
+            ]
+            user_prompt = _ANALYSE_BATCH_INSTRUCTIONS + "\n\n".join(
+                f"{n}. {_json.dumps(entry)}" for n, entry in enumerate(entries, 1)
+            )
+            
+            messages = [
+                _SYSTEM_MESSAGE_ANALYSE,
+                HumanMessage(content=user_prompt)
+            ]
+            
+            try:
+                batch_result = await ainvoke_structured(self.llm, EmailAnalysisBatch, messages)
+                for item in batch_result["results"]:
+                    i = item["id"]
+                    if i in pending and results[i] is None:
+                        results[i] = item["analysis"]
+                        _llm_cache.put(cache_keys[i], item["analysis"])
+            except ValueError as e:
+                logger.error("Error parsing batch analysis result: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        
+        missing = [i for i in pending if results[i] is None]
+        if missing:
+            retried = await asyncio.gather(*(self._analyse_content(emails_data[i]) for i in missing))
+            for i, analysis_result in zip(missing, retried):
+                results[i] = analysis_result
+        
+        return results
+    
+    def detect_invoice(self, email_data: Dict[str, Any]) -> bool:
         """
         Detect if an email contains an invoice based on analysis results.
         
@@ -225,16 +495,11 @@ Return a JSON object with the following structure:
         if email_data.get("category", "").lower() == "invoice":
             return True
             
-        # check subject and content for invoice-related keywords
-        invoice_keywords = ["invoice", "payment", "bill", "receipt", "due", "statement", "charge"]
-        subject = email_data.get("subject", "").lower()
-        content = email_data.get("content", "").lower()
-        
-        for keyword in invoice_keywords:
-            if keyword in subject or keyword in content:
-                return True
-                
-        return False
+        # check subject first so the (much larger) content is only scanned when needed
+        if _INVOICE_RE.search(email_data.get("subject", "")):
+            return True
+        
+        return _INVOICE_RE.search(email_data.get("content", "")) is not None
     
     async def extract_entities_for_kg(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -246,83 +511,26 @@ Return a JSON object with the following structure:
         Returns:
             Dictionary containing entities and relationships
         """
-        system_prompt = """You are Dela's knowledge graph extraction engine. Your role is to analyze email data and extract structured information for workflow automation.
-
-Focus on identifying workflow-relevant entities:
-- People (sender, recipients, mentioned individuals)
-- Organizations (companies, departments)
-- Documents (invoices, reports, attachments)
-- Systems (software, platforms mentioned)
-- Tasks (action items, requests)
-
-Extract relationships that show workflow dependencies:
-- SENT_BY (email SENT_BY person)
-- RECEIVED_BY (email RECEIVED_BY person)
-- MENTIONS (email MENTIONS person/org/system)
-- CONTAINS (email CONTAINS document/task)
-- REQUESTS (email REQUESTS action/information)
-- RELATED_TO (email RELATED_TO previous communication)
-
-Always return valid JSON only, no additional text or explanations."""
-
-        user_prompt = f"""Extract entities and relationships from this email data for Dela's knowledge graph:
-
-Email Data: {json.dumps(email_data, indent=2)}
-
-Return a JSON object with the following structure:
-{{
-    "entities": [
-        {{
-            "type": "string",
-            "properties": {{
-                "name": "string",
-                "id": "string",
-                "other_properties": "as needed"
-            }}
-        }}
-    ],
-    "relationships": [
-        {{
-            "from_type": "string",
-            "from_properties": {{
-                "identifying_property": "value"
-            }},
-            "to_type": "string",
-            "to_properties": {{
-                "identifying_property": "value"
-            }},
-            "type": "string",
-            "properties": {{
-                "optional_properties": "as needed"
-            }}
-        }}
-    ]
-}}"""
+        cache_key = self._cache_key("kg_extraction", email_data)
+        cached = _llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt_data = {**email_data, "content": truncate_to_tokens(email_data.get("content", ""))}
+        user_prompt = _KG_INSTRUCTIONS + _json.dumps(prompt_data)
 
         # create messages for the LLM
         messages = [
-            SystemMessage(content=system_prompt.format()),
-            HumanMessage(content=user_prompt.format(email_json=json.dumps(email_data, indent=2)))
+            _SYSTEM_MESSAGE_KG,
+            HumanMessage(content=user_prompt)
         ]
         
-        # get response from LLM
-        response = await self.llm.ainvoke(messages)
-        
         try:
-            # extract and parse JSON from response
-            content = response.content
-            # handle potential formatting issues in the response
-            if isinstance(content, str):
-                # find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                kg_data = json.loads(content)
-            else:
-                kg_data = {"entities": [], "relationships": []}
-                
+            # get schema-validated response from LLM
+            kg_data = await ainvoke_structured(self.llm, KGExtraction, messages)
+            _llm_cache.put(cache_key, kg_data)
+            
             return kg_data
-        except Exception as e:
-            logging.error(f"Error parsing KG extraction result: {e}", exc_info=True)
+        except ValueError as e:
+            logger.error("Error parsing KG extraction result: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {"entities": [], "relationships": []}
\ No newline at end of file
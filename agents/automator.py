@@ -1,13 +1,202 @@
-import json
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional, Callable
+import string
+from typing import Dict, Any, AsyncIterator, List, Optional, Callable, Tuple
 from datetime import datetime
-from email.message import Message
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
+from email.message import EmailMessage, Message
+from types import MappingProxyType
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from agents import _json, _llm_cache
+from agents._batching import BatchingLLMClient
+from agents._llm import ainvoke_structured, astream_json_fields, get_llm
+from agents._tokens import truncate_to_tokens
+from agents.schemas import InvoiceValidation, ReplyDraft
+
+logger = logging.getLogger(__name__)
+
+# bump when prompts change so cached responses are invalidated
+PROMPT_VERSION = "v2"
+
+# system prompts are kept byte-identical across calls so provider-side
+# prompt caching can reuse the prefix; per-email data goes at the tail
+_SYSTEM_REPLY = """You are Dela's email reply generator. Your role is to generate appropriate email replies based on the original email, user profile, and user preferences.
+
+Your replies should:
+- Match the user's communication style and tone
+- Address all questions or requests in the original email
+- Be concise and professional
+- Follow any specific preferences or rules from the user profile
+- Include appropriate greetings and sign-offs
+
+Always return valid JSON only with the following structure:
+{
+    "subject": "Reply subject line",
+    "body": "Full email body with greeting and sign-off",
+    "summary": "Brief summary of the reply"
+}"""
+
+_REPLY_INSTRUCTIONS = """Generate a reply that matches the user's style and addresses all points in the original email, based on the following:
+
+"""
+
+_USER_TMPL_REPLY = string.Template(_REPLY_INSTRUCTIONS + """Original Email:
+From: $sender
+To: $to
+Subject: $subject
+Content: $content
+
+Email Analysis:
+$analysis
+
+User Profile:
+$user_profile
+
+User Preferences:
+$user_preferences""")
+
+_SYSTEM_VALIDATE = """You are Dela's invoice validation engine. Your role is to validate invoices against user preferences.
+
+Check for:
+- Amount limits (is the invoice amount within acceptable limits?)
+- Approved vendors (is the vendor on the approved list?)
+- Payment terms (are the payment terms acceptable?)
+- Due date (is there enough time to process the payment?)
+- Required information (does the invoice have all required fields?)
+
+Always return valid JSON only with the following structure:
+{
+    "valid": true/false,
+    "reasons": ["reason1", "reason2", ...],
+    "confidence": float (0-1)
+}"""
+
+_VALIDATE_INSTRUCTIONS = """Validate this invoice against user preferences. Return a JSON object indicating whether the invoice is valid and any reasons for rejection.
+
+"""
+
+_USER_TMPL_VALIDATE = string.Template(_VALIDATE_INSTRUCTIONS + """Invoice Data:
+$invoice_data
+
+User Preferences:
+$user_preferences""")
+
+_SYSTEM_APPROVAL = """You are Dela's invoice approval reply generator. Your role is to generate appropriate approval replies for invoices.
+
+Your replies should:
+- Confirm receipt of the invoice
+- Confirm that the invoice has been approved for payment
+- Provide any relevant payment information
+- Be professional and concise
+- Match the user's communication style
+
+Always return valid JSON only with the following structure:
+{
+    "subject": "Reply subject line",
+    "body": "Full email body with greeting and sign-off",
+    "summary": "Brief summary of the reply"
+}"""
+
+_APPROVAL_INSTRUCTIONS = """Generate an invoice approval reply that confirms receipt and approval of the invoice, based on the following:
+
+"""
+
+_USER_TMPL_APPROVAL = string.Template(_APPROVAL_INSTRUCTIONS + """Original Email:
+From: $sender
+To: $to
+Subject: $subject
+
+Invoice Data:
+$invoice_data
+
+User Profile:
+$user_profile""")
+
+_SYSTEM_REJECTION = """You are Dela's invoice rejection reply generator. Your role is to generate appropriate rejection replies for invoices.
+
+Your replies should:
+- Confirm receipt of the invoice
+- Politely explain why the invoice cannot be approved
+- Provide clear instructions on what needs to be corrected
+- Be professional and helpful
+- Match the user's communication style
+
+Always return valid JSON only with the following structure:
+{
+    "subject": "Reply subject line",
+    "body": "Full email body with greeting and sign-off",
+    "summary": "Brief summary of the reply"
+}"""
+
+_REJECTION_INSTRUCTIONS = """Generate an invoice rejection reply that politely explains why the invoice cannot be approved and what needs to be corrected, based on the following:
+
+"""
+
+_USER_TMPL_REJECTION = string.Template(_REJECTION_INSTRUCTIONS + """Original Email:
+From: $sender
+To: $to
+Subject: $subject
+
+Invoice Data:
+$invoice_data
+
+Rejection Reasons:
+$reasons
+
+User Profile:
+$user_profile""")
+
+# analyser priorities whose replies are always generated fresh, never served from the cache
+_UNCACHED_PRIORITIES = frozenset({"high"})
+
+# rough response lengths in tokens, used to batch calls of similar length together
+_EST_OUTPUT_TOKENS = {
+    "general": 120,
+    "invoice_validation": 80,
+    "invoice_approval": 200,
+    "invoice_rejection": 400,
+}
+
+# canned replies used when the LLM output is unusable; callers add the subject
+_FALLBACK_REPLY = MappingProxyType({
+    "body": "I'll get back to you soon.",
+    "summary": "Generic reply"
+})
+_ERROR_REPLY = MappingProxyType({
+    "body": "I'll get back to you soon.",
+    "summary": "Error generating reply",
+    "error": "An error occurred while generating the reply."
+})
+_FALLBACK_APPROVAL = MappingProxyType({
+    "body": "We have received and approved your invoice for payment.",
+    "summary": "Invoice approval notification"
+})
+_ERROR_APPROVAL = MappingProxyType({
+    "body": "We have received and approved your invoice for payment.",
+    "summary": "Error generating approval",
+    "error": "An error occurred while generating approval reply."
+})
+_FALLBACK_REJECTION = MappingProxyType({
+    "body": "We have received your invoice but cannot approve it at this time.",
+    "summary": "Invoice rejection notification"
+})
+_ERROR_REJECTION = MappingProxyType({
+    "body": "We have received your invoice but cannot approve it at this time.",
+    "summary": "Error generating rejection",
+    "error": "An error occurred while generating rejection reply."
+})
+
+
+def _unfold(value: Any) -> str:
+    # headers parsed from raw mail keep their folding line breaks, which
+    # EmailMessage rejects; joining the lines also blocks header injection
+    return " ".join(str(value).splitlines())
+
+
+_SYSTEM_MESSAGE_REPLY = SystemMessage(content=_SYSTEM_REPLY)
+_SYSTEM_MESSAGE_VALIDATE = SystemMessage(content=_SYSTEM_VALIDATE)
+_SYSTEM_MESSAGE_APPROVAL = SystemMessage(content=_SYSTEM_APPROVAL)
+_SYSTEM_MESSAGE_REJECTION = SystemMessage(content=_SYSTEM_REJECTION)
 
 class Automator:
     """
@@ -16,19 +205,22 @@ class Automator:
     and automating repetitive tasks based on user preferences and knowledge graph.
     """
     
-    def __init__(self, observer, llm=None):
+    def __init__(self, observer, llm=None, speculative_approval: bool = True):
         """
         Initialize the Automator agent.
         
         Args:
             observer: Observer agent instance
             llm: LangChain language model instance (optional)
+            speculative_approval: Draft invoice approvals while validation runs,
+                trading tokens on rejected invoices for lower latency
         """
         self.observer = observer
-        self.llm = llm or ChatOpenAI(
-            temperature=0.2,
-            model="gpt-4o",
-        )
+        self.speculative_approval = speculative_approval
+        # concurrent emails share batched dispatch to the LLM
+        self.llm = BatchingLLMClient(llm or get_llm(temperature=0.2, model="gpt-4o"))
+        # replies to repeats of the same email; in memory only, since they quote email content
+        self._reply_cache = _llm_cache.LLMCache(cache_dir=None)
     
     async def generate_email_reply(self, email_data: Dict[str, Any], user_profile: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -41,91 +233,82 @@ class Automator:
         Returns:
             Dictionary containing generated reply
         """
-        # Get user preferences for this type of email
-        user_preferences = await self.observer.get_user_preferences({
-            "category": email_data.get("category", "general"),
-            "from": email_data.get("from", ""),
-            "subject": email_data.get("subject", "")
-        })
-        
-        # Generate reply using LLM
-        system_prompt = """You are Dela's email reply generator. Your role is to generate appropriate email replies based on the original email, user profile, and user preferences.
-
-Your replies should:
-- Match the user's communication style and tone
-- Address all questions or requests in the original email
-- Be concise and professional
-- Follow any specific preferences or rules from the user profile
-- Include appropriate greetings and sign-offs
-
-Always return valid JSON only with the following structure:
-{
-    "subject": "Reply subject line",
-    "body": "Full email body with greeting and sign-off",
-    "summary": "Brief summary of the reply"
-}"""
-
-        user_prompt = f"""Generate an email reply based on the following:
-
-Original Email:
-From: {email_data.get('from', '')}
-To: {email_data.get('to', '')}
-Subject: {email_data.get('subject', '')}
-Content: {email_data.get('content', '')}
-
-Email Analysis:
-{json.dumps(email_data, indent=2)}
-
-User Profile:
-{json.dumps(user_profile, indent=2)}
-
-User Preferences:
-{json.dumps(user_preferences, indent=2)}
-
-Generate a reply that matches the user's style and addresses all points in the original email."""
-
-        # Create messages for the LLM
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        # Get response from LLM
-        response = await self.llm.ainvoke(messages)
+        re_subject = f"Re: {email_data.get('subject', '')}"
         
         try:
-            # Extract and parse JSON from response
-            content = response.content
-            if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
+            preferences_task = asyncio.create_task(self.observer.get_user_preferences({
+                "category": email_data.get("category", "general"),
+                "from": email_data.get("from", ""),
+                "subject": email_data.get("subject", "")
+            }))
+            try:
+                # let the lookup send its request, then truncate and serialize the
+                # preference-independent parts of the prompt while it is in flight
+                await asyncio.sleep(0)
+                prompt_fields = self._reply_prompt_fields(email_data, user_profile)
+                user_preferences = await preferences_task
+            except BaseException:
+                preferences_task.cancel()
+                raise
+            
+            # only an exact repeat of an email, for the same profile and preferences,
+            # reuses a reply: near-duplicates can differ in amounts, dates or IDs.
+            # high-priority emails always get a fresh one
+            cache_key = self._cache_key("reply", {
+                "category": email_data.get("category", "general"),
+                "from": email_data.get("from", ""),
+                "to": email_data.get("to", ""),
+                "subject": email_data.get("subject", ""),
+                "content": email_data.get("content", ""),
+                "user_profile": user_profile,
+                "user_preferences": user_preferences,
+            })
+            uncached = str(email_data.get("priority", "")).lower() in _UNCACHED_PRIORITIES
+            reply_data = None if uncached else self._reply_cache.get(cache_key)
+            
+            # format the message as soon as the body has streamed in, while
+            # the remaining fields are still being generated
+            streamed: Dict[str, Any] = {}
+            
+            def on_field(field: str, value: Any) -> None:
+                streamed[field] = value
+                if field == "body" and isinstance(value, str):
+                    subject = streamed.get("subject", re_subject)
+                    streamed["message"] = self._format_email_reply(
+                        to=email_data.get("from", ""),
+                        from_addr=email_data.get("to", ""),
+                        subject=subject,
+                        body=value
+                    )
+                    streamed["message_fields"] = (subject, value)
+            
+            if reply_data is None:
+                messages = self._reply_messages(prompt_fields, user_preferences)
                 
+                # Get schema-validated reply from LLM
                 try:
-                    reply_data = self._extract_json_from_llm_response(response.content)
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.error(f"Error extracting JSON from LLM response: {e}", exc_info=True)
-                    reply_data = {
-                        "subject": f"Re: {email_data.get('subject', '')}",
-                        "body": "I'll get back to you soon.",
-                        "summary": "Generic reply"
-                    }
+                    reply_data = await ainvoke_structured(
+                        self.llm, ReplyDraft, messages, on_field=on_field,
+                        est_out_tokens=_EST_OUTPUT_TOKENS.get(email_data.get("category"), _EST_OUTPUT_TOKENS["general"])
+                    )
+                    self._reply_cache.put(cache_key, reply_data)
+                except ValueError as e:
+                    logger.error("Error getting structured reply from LLM: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                    reply_data = dict(_FALLBACK_REPLY, subject=re_subject)
+            
+            subject = reply_data.get("subject", re_subject)
+            body = reply_data.get("body", "")
+            
+            # Format as email message, unless it was already built from the stream
+            if streamed.get("message_fields") == (subject, body):
+                reply_message = streamed["message"]
             else:
-                reply_data = {
-                    "subject": f"Re: {email_data.get('subject', '')}",
-                    "body": "I'll get back to you soon.",
-                    "summary": "Generic reply"
-                }
-                
-            # Format as email message
-            reply_message = self._format_email_reply(
-                to=email_data.get("from", ""),
-                from_addr=email_data.get("to", ""),
-                subject=reply_data.get("subject", f"Re: {email_data.get('subject', '')}"),
-                body=reply_data.get("body", "")
-            )
+                reply_message = self._format_email_reply(
+                    to=email_data.get("from", ""),
+                    from_addr=email_data.get("to", ""),
+                    subject=subject,
+                    body=body
+                )
             
             # Add reply message to reply_data
             reply_data["message"] = reply_message
@@ -136,17 +319,78 @@ Generate a reply that matches the user's style and addresses all points in the o
             return reply_data
             
         except Exception as e:
-            logger.error(f"Error generating email reply: {e}", exc_info=True)
-            return {
-                "subject": f"Re: {email_data.get('subject', '')}",
-                "body": "I'll get back to you soon.",
-                "summary": "Error generating reply",
-                "error": "An error occurred while generating the reply."
-            }
+            logger.error("Error generating email reply: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return dict(_ERROR_REPLY, subject=re_subject)
     
-    def _format_email_reply(self, to: str, from_addr: str, subject: str, body: str) -> MIMEMultipart:
+    async def stream_email_reply(self, email_data: Dict[str, Any], user_profile: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
         """
-        Format an email reply as a MIME message.
+        Stream an email reply field by field as the LLM generates it.
+        
+        Intended for UI layers that want to show the subject before the
+        body has finished generating. The streamed fields are not schema
+        validated; use generate_email_reply for a complete, validated reply.
+        
+        Args:
+            email_data: Dictionary containing email data and analysis
+            user_profile: Dictionary containing user profile data
+            
+        Yields:
+            (field, value) pairs such as ("subject", "...") and ("body", "...")
+        """
+        user_preferences = await self.observer.get_user_preferences({
+            "category": email_data.get("category", "general"),
+            "from": email_data.get("from", ""),
+            "subject": email_data.get("subject", "")
+        })
+        messages = self._reply_messages(self._reply_prompt_fields(email_data, user_profile), user_preferences)
+        
+        async for field, value in astream_json_fields(self.llm, messages):
+            yield field, value
+    
+    def _reply_prompt_fields(self, email_data: Dict[str, Any], user_profile: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Prepare the parts of the reply prompt that do not depend on user preferences.
+        
+        Args:
+            email_data: Dictionary containing email data and analysis
+            user_profile: Dictionary containing user profile data
+            
+        Returns:
+            Template fields for the reply prompt, except user_preferences
+        """
+        # the content is quoted on its own, so leave it out of the analysis dump
+        analysis = {key: value for key, value in email_data.items() if key != "content"}
+        
+        return {
+            "sender": email_data.get('from', ''),
+            "to": email_data.get('to', ''),
+            "subject": email_data.get('subject', ''),
+            "content": truncate_to_tokens(email_data.get('content', '')),
+            "analysis": _json.dumps(analysis),
+            "user_profile": _json.dumps(user_profile),
+        }
+    
+    def _reply_messages(self, prompt_fields: Dict[str, str], user_preferences: Dict[str, Any]) -> List[BaseMessage]:
+        """
+        Build the LLM messages for an email reply.
+        
+        Args:
+            prompt_fields: Fields from _reply_prompt_fields
+            user_preferences: User preferences for this type of email
+            
+        Returns:
+            System and user messages for the reply prompt
+        """
+        user_prompt = _USER_TMPL_REPLY.substitute(prompt_fields, user_preferences=_json.dumps(user_preferences))
+
+        return [
+            _SYSTEM_MESSAGE_REPLY,
+            HumanMessage(content=user_prompt)
+        ]
+    
+    def _format_email_reply(self, to: str, from_addr: str, subject: str, body: str) -> EmailMessage:
+        """
+        Format an email reply as a plain-text message.
         
         Args:
             to: Recipient email address
@@ -157,14 +401,14 @@ Generate a reply that matches the user's style and addresses all points in the o
         Returns:
             Formatted email message
         """
-        # Create message
-        message = MIMEMultipart()
-        message["To"] = to
-        message["From"] = from_addr
-        message["Subject"] = subject
+        # Create message; replies have no attachments, so no multipart container
+        message = EmailMessage()
+        message["To"] = _unfold(to)
+        message["From"] = _unfold(from_addr)
+        message["Subject"] = _unfold(subject)
         
-        # Attach body
-        message.attach(MIMEText(body, "plain"))
+        # Set body
+        message.set_content(body)
         
         return message
     
@@ -188,16 +432,35 @@ Generate a reply that matches the user's style and addresses all points in the o
                 "message": "No invoice detected in email"
             }
         
-        # Get user preferences for invoice processing
-        user_preferences = await self.observer.get_user_preferences({
-            "category": "invoice",
-            "vendor": invoice_data.get("vendor", "")
-        })
-        
-        # Validate invoice against user preferences
-        validation_result = await self._validate_invoice(invoice_data, user_preferences)
-        
+        # Speculatively draft the approval reply while the preferences are fetched
+        # and the invoice is validated, since the approval prompt depends on neither
+        approval_task = None
+        if self.speculative_approval:
+            approval_task = asyncio.create_task(self.generate_invoice_approval(
+                email_data,
+                invoice_data,
+                user_profile
+            ))
+
+        try:
+            # Get user preferences for invoice processing
+            user_preferences = await self.observer.get_user_preferences({
+                "category": "invoice",
+                "vendor": invoice_data.get("vendor", "")
+            })
+            
+            # Validate invoice
+            validation_result = await self._validate_invoice(invoice_data, user_preferences)
+        except BaseException:
+            if approval_task is not None:
+                approval_task.cancel()
+            raise
+
         if not validation_result["valid"]:
+            # Discard the speculative approval
+            if approval_task is not None:
+                approval_task.cancel()
+
             # Generate rejection reply
             rejection_reply = await self.generate_invoice_rejection(
                 email_data, 
@@ -213,13 +476,16 @@ Generate a reply that matches the user's style and addresses all points in the o
                 "rejection_reply": rejection_reply
             }
         
-        # Generate approval reply
-        approval_reply = await self.generate_invoice_approval(
-            email_data,
-            invoice_data,
-            user_profile
-        )
-        
+        # Collect the approval reply drafted alongside validation
+        if approval_task is not None:
+            approval_reply = await approval_task
+        else:
+            approval_reply = await self.generate_invoice_approval(
+                email_data,
+                invoice_data,
+                user_profile
+            )
+
         return {
             "success": True,
             "message": "Invoice processed successfully",
@@ -227,6 +493,24 @@ Generate a reply that matches the user's style and addresses all points in the o
             "approval_reply": approval_reply
         }
     
+    def _cache_key(self, call_site: str, payload: Dict[str, Any]) -> str:
+        """
+        Build the LLM response cache key for a call site and its inputs.
+        
+        Args:
+            call_site: Name of the prompt being sent
+            payload: Inputs interpolated into the prompt
+            
+        Returns:
+            Content-addressable cache key
+        """
+        return _llm_cache.make_key(
+            PROMPT_VERSION,
+            getattr(self.llm, "model_name", type(self.llm).__name__),
+            call_site,
+            _json.dumps(payload, sort_keys=True),
+        )
+    
     async def _validate_invoice(self, invoice_data: Dict[str, Any], user_preferences: Dict[str, Any]) -> Dict[str, Any]:
         """
         Validate an invoice against user preferences.
@@ -238,63 +522,36 @@ Generate a reply that matches the user's style and addresses all points in the o
         Returns:
             Dictionary containing validation results
         """
-        system_prompt = """You are Dela's invoice validation engine. Your role is to validate invoices against user preferences.
-
-Check for:
-- Amount limits (is the invoice amount within acceptable limits?)
-- Approved vendors (is the vendor on the approved list?)
-- Payment terms (are the payment terms acceptable?)
-- Due date (is there enough time to process the payment?)
-- Required information (does the invoice have all required fields?)
-
-Always return valid JSON only with the following structure:
-{
-    "valid": true/false,
-    "reasons": ["reason1", "reason2", ...],
-    "confidence": float (0-1)
-}"""
-
-        user_prompt = f"""Validate this invoice against user preferences:
-
-Invoice Data:
-{json.dumps(invoice_data, indent=2)}
-
-User Preferences:
-{json.dumps(user_preferences, indent=2)}
-
-Return a JSON object indicating whether the invoice is valid and any reasons for rejection."""
+        cache_key = self._cache_key("validate_invoice", {
+            "invoice_data": invoice_data,
+            "user_preferences": user_preferences
+        })
+        cached = _llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        user_prompt = _USER_TMPL_VALIDATE.substitute(
+            invoice_data=_json.dumps(invoice_data),
+            user_preferences=_json.dumps(user_preferences),
+        )
 
         # Create messages for the LLM
         messages = [
-            SystemMessage(content=system_prompt),
+            _SYSTEM_MESSAGE_VALIDATE,
             HumanMessage(content=user_prompt)
         ]
         
-        # Get response from LLM
-        response = await self.llm.ainvoke(messages)
-        
         try:
-            # Extract and parse JSON from response
-            content = response.content
-            if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                validation_result = json.loads(content)
-            else:
-                validation_result = {
-                    "valid": False,
-                    "reasons": ["Unable to validate invoice"],
-                    "confidence": 0.0
-                }
+            # Get schema-validated response from LLM
+            validation_result = await ainvoke_structured(
+                self.llm, InvoiceValidation, messages, est_out_tokens=_EST_OUTPUT_TOKENS["invoice_validation"]
+            )
+            _llm_cache.put(cache_key, validation_result)
                 
             return validation_result
             
-        except Exception as e:
-            logger.error(f"Error validating invoice: {e}", exc_info=True)
+        except ValueError as e:
+            logger.error("Error validating invoice: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {
                 "valid": False,
                 "reasons": ["An error occurred while validating the invoice"],
@@ -313,92 +570,37 @@ Return a JSON object indicating whether the invoice is valid and any reasons for
         Returns:
             Dictionary containing approval reply
         """
-        system_prompt = """You are Dela's invoice approval reply generator. Your role is to generate appropriate approval replies for invoices.
-
-Your replies should:
-- Confirm receipt of the invoice
-- Confirm that the invoice has been approved for payment
-- Provide any relevant payment information
-- Be professional and concise
-- Match the user's communication style
-
-Always return valid JSON only with the following structure:
-{
-    "subject": "Reply subject line",
-    "body": "Full email body with greeting and sign-off",
-    "summary": "Brief summary of the reply"
-}"""
-
-        user_prompt = f"""Generate an invoice approval reply based on the following:
-
-Original Email:
-From: {email_data.get('from', '')}
-To: {email_data.get('to', '')}
-Subject: {email_data.get('subject', '')}
-
-Invoice Data:
-{json.dumps(invoice_data, indent=2)}
-
-User Profile:
-{json.dumps(user_profile, indent=2)}
-
-Generate a reply that confirms receipt and approval of the invoice."""
+        re_subject = f"Re: {email_data.get('subject', '')} - Invoice Approved"
+        
+        user_prompt = _USER_TMPL_APPROVAL.substitute(
+            sender=email_data.get('from', ''),
+            to=email_data.get('to', ''),
+            subject=email_data.get('subject', ''),
+            invoice_data=_json.dumps(invoice_data),
+            user_profile=_json.dumps(user_profile),
+        )
 
         # Create messages for the LLM
         messages = [
-            SystemMessage(content=system_prompt),
+            _SYSTEM_MESSAGE_APPROVAL,
             HumanMessage(content=user_prompt)
         ]
         
-        # Get response from LLM
-        response = await self.llm.ainvoke(messages)
-        
         try:
-            # Extract and parse JSON from response
-            content = response.content
-            if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                start = content.find('{')
-                if start != -1:
-                    brace_count = 0
-                    end = start
-                    for i in range(start, len(content)):
-                        if content[i] == '{':
-                            brace_count += 1
-                        elif content[i] == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                end = i + 1
-                                break
-                    if brace_count == 0:
-                        content = content[start:end]
-                        try:
-                            reply_data = json.loads(content)
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Error parsing JSON from LLM response: {e}", exc_info=True)
-                            reply_data = {
-                                "subject": f"Re: {email_data.get('subject', '')} - Invoice Approved",
-                                "body": "We have received and approved your invoice for payment.",
-                                "summary": "Invoice approval notification"
-                            }
-                    else:
-                        raise ValueError("Unbalanced JSON braces")
-                else:
-                    raise ValueError("No JSON content found")
-
-            else:
-                reply_data = {
-                    "subject": f"Re: {email_data.get('subject', '')} - Invoice Approved",
-                    "body": "We have received and approved your invoice for payment.",
-                    "summary": "Invoice approval notification"
-                }
+            # Get schema-validated reply from LLM
+            try:
+                reply_data = await ainvoke_structured(
+                    self.llm, ReplyDraft, messages, est_out_tokens=_EST_OUTPUT_TOKENS["invoice_approval"]
+                )
+            except ValueError as e:
+                logger.error("Error getting structured reply from LLM: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                reply_data = dict(_FALLBACK_APPROVAL, subject=re_subject)
                 
             # Format as email message
             reply_message = self._format_email_reply(
                 to=email_data.get("from", ""),
                 from_addr=email_data.get("to", ""),
-                subject=reply_data.get("subject", f"Re: {email_data.get('subject', '')} - Invoice Approved"),
+                subject=reply_data.get("subject", re_subject),
                 body=reply_data.get("body", "")
             )
             
@@ -408,13 +610,8 @@ Generate a reply that confirms receipt and approval of the invoice."""
             return reply_data
             
         except Exception as e:
-            logger.error(f"Error generating invoice approval: {e}", exc_info=True)
-            return {
-                "subject": f"Re: {email_data.get('subject', '')} - Invoice Approved",
-                "body": "We have received and approved your invoice for payment.",
-                "summary": "Error generating approval",
-                "error": "An error occurred while generating approval reply."
-            }
+            logger.error("Error generating invoice approval: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return dict(_ERROR_APPROVAL, subject=re_subject)
     
     async def generate_invoice_rejection(self, email_data: Dict[str, Any], invoice_data: Dict[str, Any], reasons: List[str], user_profile: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -429,80 +626,38 @@ Generate a reply that confirms receipt and approval of the invoice."""
         Returns:
             Dictionary containing rejection reply
         """
-        system_prompt = """You are Dela's invoice rejection reply generator. Your role is to generate appropriate rejection replies for invoices.
-
-Your replies should:
-- Confirm receipt of the invoice
-- Politely explain why the invoice cannot be approved
-- Provide clear instructions on what needs to be corrected
-- Be professional and helpful
-- Match the user's communication style
-
-Always return valid JSON only with the following structure:
-{
-    "subject": "Reply subject line",
-    "body": "Full email body with greeting and sign-off",
-    "summary": "Brief summary of the reply"
-}"""
-
-        user_prompt = f"""Generate an invoice rejection reply based on the following:
-
-Original Email:
-From: {email_data.get('from', '')}
-To: {email_data.get('to', '')}
-Subject: {email_data.get('subject', '')}
-
-Invoice Data:
-{json.dumps(invoice_data, indent=2)}
-
-Rejection Reasons:
-{json.dumps(reasons, indent=2)}
-
-User Profile:
-{json.dumps(user_profile, indent=2)}
-
-Generate a reply that politely explains why the invoice cannot be approved and what needs to be corrected."""
+        re_subject = f"Re: {email_data.get('subject', '')} - Invoice Requires Attention"
+        
+        user_prompt = _USER_TMPL_REJECTION.substitute(
+            sender=email_data.get('from', ''),
+            to=email_data.get('to', ''),
+            subject=email_data.get('subject', ''),
+            invoice_data=_json.dumps(invoice_data),
+            reasons=_json.dumps(reasons),
+            user_profile=_json.dumps(user_profile),
+        )
 
         # create messages for the LLM   
         messages = [
-            SystemMessage(content=system_prompt),
+            _SYSTEM_MESSAGE_REJECTION,
             HumanMessage(content=user_prompt)
         ]
         
-        # Get response from LLM
-        response = await self.llm.ainvoke(messages)
-        
         try:
-            # Extract and parse JSON from response
-            content = response.content
-            if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                try:
-                    reply_data = json.loads(content)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing JSON from LLM response: {e}", exc_info=True)
-                    reply_data = {
-                        "subject": f"Re: {email_data.get('subject', '')} - Invoice Requires Attention",
-                        "body": "We have received your invoice but cannot approve it at this time.",
-                        "summary": "Invoice rejection notification"
-                    }
-            else:
-                reply_data = {
-                    "subject": f"Re: {email_data.get('subject', '')} - Invoice Requires Attention",
-                    "body": "We have received your invoice but cannot approve it at this time.",
-                    "summary": "Invoice rejection notification"
-                }
+            # Get schema-validated reply from LLM
+            try:
+                reply_data = await ainvoke_structured(
+                    self.llm, ReplyDraft, messages, est_out_tokens=_EST_OUTPUT_TOKENS["invoice_rejection"]
+                )
+            except ValueError as e:
+                logger.error("Error getting structured reply from LLM: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                reply_data = dict(_FALLBACK_REJECTION, subject=re_subject)
                 
             # Format as email message
             reply_message = self._format_email_reply(
                 to=email_data.get("from", ""),
                 from_addr=email_data.get("to", ""),
-                subject=reply_data.get("subject", f"Re: {email_data.get('subject', '')} - Invoice Requires Attention"),
+                subject=reply_data.get("subject", re_subject),
                 body=reply_data.get("body", "")
             )
             
@@ -512,52 +667,6 @@ Generate a reply that politely explains why the invoice cannot be approved and w
             return reply_data
             
         except Exception as e:
-            logger.error(f"Error generating invoice rejection: {e}", exc_info=True)
-            return {
-                "subject": f"Re: {email_data.get('subject', '')} - Invoice Requires Attention",
-                "body": "We have received your invoice but cannot approve it at this time.",
-                "summary": "Error generating rejection",
-                "error": "An error occurred while generating rejection reply."
-            }
-    
-    def _extract_json_from_llm_response(self, response_content: str) -> Dict[str, Any]:
-        """
-        Extract JSON from LLM response content.
-        
-        Args:
-            response_content: Raw response content from LLM
-            
-        Returns:
-            Parsed JSON as dictionary
-            
-        Raises:
-            json.JSONDecodeError: If JSON parsing fails
-            ValueError: If no valid JSON found
-        """
-        # try direct JSON parsing first
-        try:
-            return json.loads(response_content)
-        except json.JSONDecodeError:
-            pass
-    
-        # try to find JSON by looking for balanced braces
-        start = response_content.find('{')
-        if start == -1:
-            raise ValueError("No JSON object found in response")
-    
-        brace_count = 0
-        end = start
-        for i in range(start, len(response_content)):
-            if response_content[i] == '{':
-                brace_count += 1
-            elif response_content[i] == '}':
-                brace_count -= 1
-            if brace_count == 0:
-                end = i + 1
-                break
-    
-            if brace_count != 0:
-                raise ValueError("Unbalanced JSON braces in response")
-    
-            json_str = response_content[start:end]
-            return json.loads(json_str)
\ No newline at end of file
+            logger.error("Error generating invoice rejection: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return dict(_ERROR_REJECTION, subject=re_subject)
+
@@ -1,134 +1,69 @@
 import asyncio
+import logging
 import json
 import re
 import email
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import email.utils
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
 # from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 
+from agents import _json, _llm_cache
+from agents._llm import get_llm
+from agents._llm_cache import LLMCache
+from agents._tokens import truncate_to_tokens
 
+logger = logging.getLogger(__name__)
 
-class EmailProcessor:
-    """
-    Handles the core email processing operations (reading, parsing, categorizing)
-    """
-    
-    def __init__(self):
-        """Initialize the email processor"""
-        pass
-    
-    async def parse_email(self, raw_email: str) -> Dict[str, Any]:
-        """Parse a raw email string into structured data"""
-        # parse the email using the email module
-        msg = email.message_from_string(raw_email)
-        
-        # extract basic email metadata
-        email_data = {
-            "subject": msg.get("Subject", ""),
-            "from": msg.get("From", ""),
-            "to": msg.get("To", ""),
-            "date": msg.get("Date", ""),
-            "cc": msg.get("Cc", ""),
-            "body": "",
-            "attachments": []
-        }
-        
-        # extract the body content
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                # extract text content
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    email_data["body"] += part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                
-                # track attachments
-                if "attachment" in content_disposition:
-                    filename = part.get_filename()
-                    if filename:
-                        email_data["attachments"].append(filename)
-        else:
-            email_data["body"] = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-        
-        return email_data
-    
-    async def categorize_email(self, email_data: Dict[str, Any]) -> str:
-        """Categorize an email based on its content (simple rule-based approach)"""
-        subject = email_data["subject"].lower()
-        # body = email_data["body"].lower()
-        
-        # simple rule-based categorization
-        if any(word in subject for word in ["invoice", "payment", "bill"]):
-            return "finance"
-        elif any(word in subject for word in ["meeting", "schedule", "calendar"]):
-            return "meeting"
-        elif any(word in subject for word in ["report", "update", "status"]):
-            return "report"
-        elif any(word in subject for word in ["question", "help", "support"]):
-            return "support"
-        else:
-            return "general"
-    
-    async def extract_action_items(self, email_data: Dict[str, Any]) -> List[str]:
-        """Extract action items from an email using simple heuristics"""
-        body = email_data["body"].lower()
-        
-        # simple pattern matching for action items
-        action_patterns = [
-            r"(?:please|kindly|can you|could you)[^.!?]*\?",
-            r"(?:need to|must|should|have to)[^.!?]*",
-            r"(?:action required|action item|to-do|todo)[^.!?]*"
-        ]
-        
-        action_items = []
-        for pattern in action_patterns:
-            matches = re.findall(pattern, body)
-            action_items.extend(matches)
-        
-        return action_items
+# bump whenever a prompt changes so stale cached responses are not reused
+PROMPT_VERSION = "v1"
 
+# shared parser; policy.default decodes headers and text parts to str
+_PARSER = BytesParser(policy=policy.default)
 
-class AsyncEmailAgent:
-    """
-    Async Email Agent that can read emails and generate appropriate replies
-    """
-    
-    def __init__(self, llm=None):
-        """Initialize the Email Agent with an LLM"""
-        # initialize email processor
-        self.email_processor = EmailProcessor()
-        
-        # initialize LLM if not provided
-        self.llm = llm or ChatOpenAI(temperature=0)
-    
-    async def process_email(self, raw_email: str) -> Dict[str, Any]:
-        """Process an email and extract structured information"""
-        # parse the email
-        email_data = await self.email_processor.parse_email(raw_email)
-        
-        # categorize the email
-        category = await self.email_processor.categorize_email(email_data)
-        email_data["category"] = category
-        
-        # extract action items
-        action_items = await self.email_processor.extract_action_items(email_data)
-        email_data["action_items"] = action_items
-        
-        # extract entities and relationships for knowledge graph
-        kg_data = await self.extract_email_entities(email_data)
-        email_data["knowledge_graph_data"] = kg_data
-        
-        return email_data
-    
-    async def extract_email_entities(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract entities and relationships from an email for the knowledge graph"""
-        system_prompt ="""You are Dela's email analysis engine. Your role is to extract structured information from emails for workflow automation.
+def _unfold(value: Any) -> str:
+    # raw headers keep their folding line breaks, which EmailMessage rejects
+    return " ".join(str(value).splitlines())
+
+def _text_content(part) -> str:
+    # get_content() raises LookupError for charsets Python does not know
+    try:
+        return part.get_content()
+    except LookupError:
+        return (part.get_payload(decode=True) or b"").decode("utf-8", "replace")
+
+# one pass over the body for all action-item cues; the bounded run keeps
+# unterminated sentences from scanning to the end of long emails
+_ACTION_ITEM_RE = re.compile(
+    r"\b(?:please|kindly|can you|could you|need to|must|should|have to|action (?:required|item)|to-?do)\b"
+    r"[^.!?]{0,300}[.!?]?",
+    re.IGNORECASE
+)
+
+# subject keywords per category, in priority order
+_CATEGORY_KEYWORDS = {
+    "finance": ("invoice", "payment", "bill"),
+    "meeting": ("meeting", "schedule", "calendar"),
+    "report": ("report", "update", "status"),
+    "support": ("question", "help", "support"),
+}
+_CATEGORY_PRIORITY = tuple(_CATEGORY_KEYWORDS)
+
+# all keywords in one alternation, so the subject is scanned once however
+# many keywords there are; longer keywords first so they win over prefixes
+_CATEGORY_RE = re.compile(
+    "|".join(
+        f"(?P<{category}>{'|'.join(map(re.escape, sorted(keywords, key=len, reverse=True)))})"
+        for category, keywords in _CATEGORY_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+_ENTITY_SYSTEM_PROMPT = """You are Dela's email analysis engine. Your role is to extract structured information from emails for workflow automation.
 
         Focus on identifying email-relevant entities:
         - People (sender, recipients, mentioned individuals)
@@ -142,7 +77,7 @@ class AsyncEmailAgent:
 
         Always return valid JSON only, no additional text or explanations."""
 
-        user_prompt = """Extract entities and relationships from this email for Dela's workflow automation:
+_ENTITY_USER_PROMPT = """Extract entities and relationships from this email for Dela's workflow automation:
 
         Email: {email_json}
 
@@ -175,26 +110,7 @@ class AsyncEmailAgent:
             ]
         }}"""
 
-        # create messages for the LLM
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt.format(email_json=json.dumps(email_data, indent=2)))
-        ]
-        
-        response = await self.llm.ainvoke(messages)
-        
-        # extract JSON from response
-        try:
-            extraction = json.loads(response.content)
-            return extraction
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}", exc_info=True)
-            # Fallback if JSON parsing fails
-            return {"entities": [], "relationships": []}
-    
-    async def generate_reply(self, email_data: Dict[str, Any], user_context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Generate an appropriate reply to an email"""
-        system_prompt ="""You are Dela's email assistant. Your role is to draft appropriate email replies based on the email content and user context.
+_REPLY_SYSTEM_PROMPT = """You are Dela's email assistant. Your role is to draft appropriate email replies based on the email content and user context.
 
         Follow these guidelines:
         1. Maintain a professional, friendly tone
@@ -213,31 +129,306 @@ class AsyncEmailAgent:
             "follow_up_needed": true/false
         }"""
 
-        user_prompt = """Generate an email reply for the following email:
+_REPLY_USER_PROMPT = """Generate an email reply for the following email:
 
         Original Email: {email_json}
 
         User Context: {user_context}
 
         Draft a reply that addresses all points in the original email and incorporates relevant information from the user context."""
+
+_SYSTEM_MESSAGE_ENTITY = SystemMessage(content=_ENTITY_SYSTEM_PROMPT)
+_SYSTEM_MESSAGE_REPLY = SystemMessage(content=_REPLY_SYSTEM_PROMPT)
+
+# emails per extract_email_entities_batch request in learn_from_emails
+_ENTITY_BATCH_SIZE = 16
+
+_ENTITY_BATCH_PROMPT = """Extract entities and relationships from each of the following emails independently for Dela's workflow automation:
+
+        Emails: {emails_json}
+
+        Return JSON of the form {{"results": [{{"id": <email id>, "entities": [...], "relationships": [...]}}, ...]}}
+        with exactly one entry per email, where entities and relationships use this format:
+        {{
+            "entities": [
+                {{
+                    "type": "entity_type",
+                    "properties": {{
+                        "name": "entity_name",
+                        "category": "email_category",
+                        "importance": "high/medium/low",
+                        "automation_potential": "high/medium/low"
+                    }}
+                }}
+            ],
+            "relationships": [
+                {{
+                    "from_type": "entity_type1",
+                    "from_props": {{"name": "entity_name1"}},
+                    "rel_type": "RELATIONSHIP_TYPE",
+                    "to_type": "entity_type2",
+                    "to_props": {{"name": "entity_name2"}},
+                    "rel_props": {{
+                        "confidence": "high/medium/low",
+                        "context": "relationship_context",
+                        "automation_ready": "true/false"
+                    }}
+                }}
+            ]
+        }}"""
+
+
+class EmailProcessor:
+    """
+    Handles the core email processing operations (reading, parsing, categorizing)
+    """
+    
+    def __init__(self):
+        """Initialize the email processor"""
+        pass
+    
+    def parse_email(self, raw_email: Union[bytes, str]) -> Dict[str, Any]:
+        """Parse a raw email (bytes or string) into structured data"""
+        # parse the email using the email module
+        if isinstance(raw_email, str):
+            raw_email = raw_email.encode('utf-8', 'surrogateescape')
+        msg = _PARSER.parsebytes(raw_email)
+        
+        # extract basic email metadata
+        email_data = {
+            "subject": str(msg.get("Subject", "")),
+            "from": str(msg.get("From", "")),
+            "to": str(msg.get("To", "")),
+            "date": str(msg.get("Date", "")),
+            "cc": str(msg.get("Cc", "")),
+            "body": "",
+            "attachments": []
+        }
+        
+        # extract the body content
+        if msg.is_multipart():
+            body_parts = []
+            for part in msg.walk():
+                # track attachments from their headers alone; their payloads are never decoded
+                if part.get_content_disposition() == "attachment":
+                    filename = part.get_filename()
+                    if filename:
+                        email_data["attachments"].append(filename)
+                    continue
+                
+                # extract text content
+                if part.get_content_type() == "text/plain":
+                    body_parts.append(_text_content(part))
+            email_data["body"] = "".join(body_parts)
+        elif msg.get_content_maintype() == "text":
+            email_data["body"] = _text_content(msg)
+        else:
+            email_data["body"] = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
+        
+        return email_data
+    
+    def categorize_email(self, email_data: Dict[str, Any]) -> str:
+        """Categorize an email based on its content (simple rule-based approach)"""
+        # body = email_data["body"].lower()
+        
+        # simple rule-based categorization: one scan, highest-priority category wins
+        found = {match.lastgroup for match in _CATEGORY_RE.finditer(email_data["subject"])}
+        return next((category for category in _CATEGORY_PRIORITY if category in found), "general")
+    
+    def extract_action_items(self, email_data: Dict[str, Any]) -> List[str]:
+        """Extract action items from an email using simple heuristics"""
+        return [match.group() for match in _ACTION_ITEM_RE.finditer(email_data["body"])]
+
+
+class AsyncEmailAgent:
+    """
+    Async Email Agent that can read emails and generate appropriate replies
+    """
+    
+    def __init__(self, llm=None, cache: Optional[LLMCache] = None):
+        """Initialize the Email Agent with an LLM and an optional response cache"""
+        # initialize email processor
+        self.email_processor = EmailProcessor()
+        
+        # initialize LLM if not provided
+        self.llm = llm or get_llm(temperature=0, model="gpt-4o")
+        
+        # LLM responses are cached in the process-wide cache unless one is given
+        self.cache = cache
+        
+        # entity extractions reused for emails whose body repeats an earlier one's
+        self._entity_cache = LLMCache(cache_dir=None)
+    
+    async def _ainvoke_json(self, call_site: str, messages: List[BaseMessage]) -> Dict[str, Any]:
+        """Invoke the LLM and parse its JSON response, reusing cached responses to identical prompts"""
+        cache_key = _llm_cache.make_key(
+            PROMPT_VERSION,
+            getattr(self.llm, "model_name", type(self.llm).__name__),
+            call_site,
+            *(m.content for m in messages)
+        )
+        cached = self.cache.get(cache_key) if self.cache is not None else _llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        response = await self.llm.ainvoke(messages)
+        result = _json.loads(response.content)
+        
+        # only successfully parsed responses are cached
+        if self.cache is not None:
+            self.cache.put(cache_key, result)
+        else:
+            _llm_cache.put(cache_key, result)
+        return result
+    
+    async def process_email(self, raw_email: Union[bytes, str]) -> Dict[str, Any]:
+        """Process an email and extract structured information"""
+        email_data = self._prepare_email(raw_email)
+        
+        # extract entities and relationships for knowledge graph
+        kg_data = await self.extract_email_entities(email_data)
+        email_data["knowledge_graph_data"] = kg_data
+        
+        return email_data
+    
+    def _prepare_email(self, raw_email: Union[bytes, str]) -> Dict[str, Any]:
+        """Parse, categorize and extract action items from an email (everything but the LLM step)"""
+        # parse the email
+        email_data = self.email_processor.parse_email(raw_email)
+        
+        # categorize the email
+        category = self.email_processor.categorize_email(email_data)
+        email_data["category"] = category
+        
+        # extract action items
+        action_items = self.email_processor.extract_action_items(email_data)
+        email_data["action_items"] = action_items
+        
+        return email_data
+    
+    async def extract_email_entities(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract entities and relationships from an email for the knowledge graph"""
+        # emails from the same domain and category with the same body differ only in
+        # their headers; reuse the extraction with the header names substituted.
+        # Any difference in the body (amounts, dates, IDs) means a fresh extraction
+        cache_key, names = self._entity_fingerprint(email_data)
+        cached = self._entity_cache.get(cache_key)
+        if cached is not None:
+            return self._rewrite_entities(cached["extraction"], cached["names"], names)
         
         # create messages for the LLM
         messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt.format(
-                email_json=json.dumps(email_data, indent=2),
-                user_context=json.dumps(user_context or {}, indent=2)
-            ))
+            _SYSTEM_MESSAGE_ENTITY,
+            HumanMessage(content=_ENTITY_USER_PROMPT.format(email_json=_json.dumps(self._prompt_email(email_data))))
         ]
         
-        response = await self.llm.ainvoke(messages)
+        # extract JSON from response
+        try:
+            extraction = await self._ainvoke_json("extract_entities", messages)
+        except json.JSONDecodeError as e:
+            logger.error("JSON parsing error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            # Fallback if JSON parsing fails
+            return {"entities": [], "relationships": []}
+        
+        self._entity_cache.put(cache_key, {"names": names, "extraction": extraction})
+        return extraction
+    
+    async def extract_email_entities_batch(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract entities and relationships from several emails in one LLM request"""
+        # a single email gains nothing from the batch prompt
+        if len(emails) < 2:
+            return [await self.extract_email_entities(email_data) for email_data in emails]
+        
+        messages = [
+            _SYSTEM_MESSAGE_ENTITY,
+            HumanMessage(content=_ENTITY_BATCH_PROMPT.format(emails_json=_json.dumps(
+                [{"id": i, "email": self._prompt_email(email_data)} for i, email_data in enumerate(emails)]
+            )))
+        ]
+        
+        results: List[Any] = [None] * len(emails)
+        try:
+            batch = await self._ainvoke_json("extract_entities_batch", messages)
+            for item in batch.get("results", []):
+                # skip malformed entries so one bad entry does not discard the rest
+                if not isinstance(item, dict):
+                    continue
+                i = item.get("id")
+                if isinstance(i, int) and 0 <= i < len(emails) and results[i] is None:
+                    results[i] = {
+                        "entities": item.get("entities", []),
+                        "relationships": item.get("relationships", [])
+                    }
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error("JSON parsing error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        
+        # emails the model left out are retried individually
+        missing = [i for i, result in enumerate(results) if result is None]
+        retried = await asyncio.gather(*(self.extract_email_entities(emails[i]) for i in missing))
+        for i, result in zip(missing, retried):
+            results[i] = result
+        
+        return results
+    
+    @staticmethod
+    def _prompt_email(email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Email data as sent to the LLM: body capped to a token budget, no previous extraction"""
+        trimmed = {key: value for key, value in email_data.items() if key != "knowledge_graph_data"}
+        trimmed["body"] = truncate_to_tokens(email_data.get("body", ""))
+        return trimmed
+    
+    @staticmethod
+    def _entity_fingerprint(email_data: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """Entity cache key (sender domain, category, attachments and full body) and identifying names for an email"""
+        sender = email_data.get("from", "")
+        cache_key = _llm_cache.make_key(
+            PROMPT_VERSION,
+            email_data.get("category", "general"),
+            sender.rpartition("@")[2].strip(" >").lower(),
+            _json.dumps(email_data.get("attachments", [])),
+            email_data.get("body", ""),
+        )
+        names = {field: email_data.get(field, "") for field in ("from", "to", "subject")}
+        return cache_key, names
+    
+    @staticmethod
+    def _rewrite_entities(extraction: Dict[str, Any], old_names: Dict[str, str], new_names: Dict[str, str]) -> Dict[str, Any]:
+        """Adapt a cached extraction to a new email by substituting its identifying names"""
+        substitutions = {
+            old: new_names[field]
+            for field, old in old_names.items()
+            if old and old != new_names[field]
+        }
+        if not substitutions:
+            return extraction
+        
+        def rewrite(value: Any) -> Any:
+            if isinstance(value, str):
+                return substitutions.get(value, value)
+            if isinstance(value, dict):
+                return {k: rewrite(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [rewrite(v) for v in value]
+            return value
+        
+        return rewrite(extraction)
+    
+    async def generate_reply(self, email_data: Dict[str, Any], user_context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Generate an appropriate reply to an email"""
+        # create messages for the LLM
+        messages = [
+            _SYSTEM_MESSAGE_REPLY,
+            HumanMessage(content=_REPLY_USER_PROMPT.format(
+                email_json=_json.dumps(email_data),
+                user_context=_json.dumps(user_context or {})
+            ))
+        ]
         
         # extract JSON from response
         try:
-            reply_data = json.loads(response.content)
-            return reply_data
+            return await self._ainvoke_json("generate_reply", messages)
         except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}", exc_info=True)
+            logger.error("JSON parsing error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             # fallback if JSON parsing fails
             return {
                 "subject": f"Re: {email_data.get('subject', '')}",
@@ -247,30 +438,42 @@ class AsyncEmailAgent:
                 "follow_up_needed": True
             }
     
-    async def format_email_reply(self, reply_data: Dict[str, Any], email_data: Dict[str, Any]) -> str:
+    def format_email_reply(self, reply_data: Dict[str, Any], email_data: Dict[str, Any]) -> str:
         """Format the reply data into a proper email"""
-        # create a new email message
-        msg = MIMEMultipart()
+        # create a new email message; a plain-text reply needs no multipart container
+        msg = EmailMessage()
         
         # set the email headers
-        msg["Subject"] = reply_data.get("subject", f"Re: {email_data.get('subject', '')}")
-        msg["From"] = email_data.get("to", "")  # The original recipient is now the sender
-        msg["To"] = email_data.get("from", "")  # The original sender is now the recipient
+        msg["Subject"] = _unfold(reply_data.get("subject", f"Re: {email_data.get('subject', '')}"))
+        msg["From"] = _unfold(email_data.get("to", ""))  # The original recipient is now the sender
+        msg["To"] = _unfold(email_data.get("from", ""))  # The original sender is now the recipient
         msg["Date"] = email.utils.formatdate()
         
         # add the email body
-        body = reply_data.get("body", "")
-        msg.attach(MIMEText(body, "plain"))
+        msg.set_content(reply_data.get("body", ""))
         
         # return the formatted email
         return msg.as_string()
     
-    async def learn_from_emails(self, emails: List[str]) -> List[Dict[str, Any]]:
-        """Learn from a batch of emails"""
-        results = []
-        # process emails concurrently for better performance
-        email_tasks = [self.process_email(email) for email in emails]
-        results = await asyncio.gather(*email_tasks)
+    async def learn_from_emails(self, emails: List[Union[bytes, str]], max_concurrent: int = 8) -> List[Dict[str, Any]]:
+        """Learn from a batch of emails, with at most max_concurrent LLM requests in flight"""
+        # parse emails up front (CPU only), then extract entities in batched
+        # LLM requests, with the batches themselves running concurrently
+        results = [self._prepare_email(email) for email in emails]
+        
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def extract_batch(batch: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                extractions = await self.extract_email_entities_batch(batch)
+            for email_data, kg_data in zip(batch, extractions):
+                email_data["knowledge_graph_data"] = kg_data
+        
+        await asyncio.gather(*(
+            extract_batch(results[i:i + _ENTITY_BATCH_SIZE])
+            for i in range(0, len(results), _ENTITY_BATCH_SIZE)
+        ))
+        
         return results
 
 
@@ -319,7 +522,7 @@ class AsyncEmailAgent:
 #     reply = await email_agent.generate_reply(email_data, user_context)
     
 #     # Format the reply as an email
-#     formatted_reply = await email_agent.format_email_reply(reply, email_data)
+#     formatted_reply = email_agent.format_email_reply(reply, email_data)
     
 #     print("Processed Email Data:")
 #     print(json.dumps(email_data, indent=2))
@@ -1,10 +1,22 @@
-import json
 import asyncio
-from typing import Dict, Any
+import logging
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, List
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from agents import _json
+from agents._llm import get_llm
+
+logger = logging.getLogger(__name__)
+
+# interactions kept for pattern analysis; older ones are dropped
+_HISTORY_SIZE = 256
+
+# interactions sent to the LLM per pattern analysis
+_RECENT_INTERACTIONS = 5
+
 class Observer:
     """
     Observer agent that monitors patterns, updates the knowledge graph, and learns from interactions.
@@ -21,11 +33,8 @@ class Observer:
             llm: LangChain language model instance (optional)
         """
         self.kg_agent = kg_agent
-        self.llm = llm or ChatOpenAI(
-            temperature=0.1,
-            model="gpt-4o",
-        )
-        self.interaction_history = []
+        self.llm = llm or get_llm(temperature=0.1, model="gpt-4o")
+        self.interaction_history = deque(maxlen=_HISTORY_SIZE)
         
     async def observe_email_interaction(self, email_data: Dict[str, Any], response_data: Dict[str, Any] = None):
         """
@@ -43,13 +52,13 @@ class Observer:
         }
         self.interaction_history.append(interaction)
         
-        # Extract entities and relationships for knowledge graph
-        if "kg_data" not in email_data:
+        # Extract entities and relationships for knowledge graph; the Analyser
+        # stores them as "kg_data", AsyncEmailAgent as "knowledge_graph_data"
+        kg_data = email_data.get("kg_data", email_data.get("knowledge_graph_data"))
+        if kg_data is None:
             # If kg_data is not already in email_data, we need to extract it
             # This would typically be done by the Analyser, but we handle it here as a fallback
             kg_data = await self._extract_kg_data(email_data)
-        else:
-            kg_data = email_data["kg_data"]
         
         # Update knowledge graph with extracted data
         await self.kg_agent.process_task({"email_interaction": email_data, "kg_data": kg_data})
@@ -57,6 +66,39 @@ class Observer:
         # Learn from interaction
         await self._learn_from_interaction(interaction)
         
+    async def observe_email_interactions(self, emails: List[Dict[str, Any]]):
+        """
+        Observe several email interactions and update the knowledge graph in one batch.
+        
+        Args:
+            emails: Dictionaries containing email data and analysis
+        """
+        interactions = []
+        for email_data in emails:
+            interaction = {
+                "timestamp": datetime.now().isoformat(),
+                "email_data": email_data,
+                "response_data": None,
+            }
+            self.interaction_history.append(interaction)
+            interactions.append(interaction)
+        
+        # extract KG data only for emails the Analyser didn't already cover
+        kg_data = [email_data.get("kg_data", email_data.get("knowledge_graph_data")) for email_data in emails]
+        missing = [i for i, data in enumerate(kg_data) if data is None]
+        extracted = await asyncio.gather(*(self._extract_kg_data(emails[i]) for i in missing))
+        for i, data in zip(missing, extracted):
+            kg_data[i] = data
+        
+        # Update knowledge graph with batched extraction and writes
+        await self.kg_agent.learn_from_tasks([
+            {"email_interaction": email_data, "kg_data": data} for email_data, data in zip(emails, kg_data)
+        ])
+        
+        # pattern analysis looks at recent history, so once per batch is enough
+        if interactions:
+            await self._learn_from_interaction(interactions[-1])
+        
     async def _extract_kg_data(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extract knowledge graph data from email data.
@@ -88,7 +130,7 @@ Always return valid JSON only, no additional text or explanations."""
 
         user_prompt = f"""Extract entities and relationships from this email data for Dela's knowledge graph:
 
-Email Data: {json.dumps(email_data, indent=2)}
+Email Data: {_json.dumps(email_data)}
 
 Return a JSON object with the following structure:
 {{
@@ -123,29 +165,24 @@ Return a JSON object with the following structure:
         # create messages for the LLM   
         messages = [
             SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt.format(email_json=json.dumps(email_data, indent=2)))
+            HumanMessage(content=user_prompt)
         ]
         
         # Get response from LLM
-        response = await self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages)
         
         try:
             # Extract and parse JSON from response
             content = response.content
             if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                kg_data = json.loads(content)
+                # tolerates extra text around the JSON object
+                kg_data = _json.parse_llm_json(content)
             else:
                 kg_data = {"entities": [], "relationships": []}
                 
             return kg_data
         except Exception as e:
-            logging.error(f"Error parsing KG extraction result: {e}", exc_info=True)
+            logger.error("Error parsing KG extraction result: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {"entities": [], "relationships": []}
     
     async def _learn_from_interaction(self, interaction: Dict[str, Any]):
@@ -172,11 +209,11 @@ Focus on identifying:
 Always return valid JSON only, no additional text or explanations."""
 
         # Get the last 5 interactions or all if less than 5
-        recent_interactions = self.interaction_history[-5:]
+        recent_interactions = list(islice(reversed(self.interaction_history), _RECENT_INTERACTIONS))[::-1]
         
         user_prompt = f"""Analyze these recent email interactions and identify patterns:
 
-Recent Interactions: {json.dumps(recent_interactions, indent=2)}
+Recent Interactions: {_json.dumps(recent_interactions)}
 
 Return a JSON object with the following structure:
 {{
@@ -208,7 +245,7 @@ Return a JSON object with the following structure:
         # Create messages for the LLM
         messages = [
             SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt.format(email_json=json.dumps(recent_interactions, indent=2)))
+            HumanMessage(content=user_prompt)
         ]
         
         # Get response from LLM
@@ -218,13 +255,8 @@ Return a JSON object with the following structure:
             # Extract and parse JSON from response
             content = response.content
             if isinstance(content, str):
-                import re
-                # Find JSON content (in case there's additional text)
-                json_match = re.search(r'({.*})', content.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    content = json_match.group(1)
-                
-                pattern_data = json.loads(content)
+                # tolerates extra text around the JSON object
+                pattern_data = _json.parse_llm_json(content)
                 
                 # Create a task for the knowledge graph agent to process
                 task = {
@@ -236,7 +268,7 @@ Return a JSON object with the following structure:
                 await self.kg_agent.process_task(task)
             
         except Exception as e:
-            logging.error(f"Error processing pattern analysis: {e}", exc_info=True)
+            logger.error("Error processing pattern analysis: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
     
     async def get_user_preferences(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -258,5 +290,5 @@ Return a JSON object with the following structure:
             
             return result
         except Exception as e:
-            logging.error(f"Error getting user preferences: {e}", exc_info=True)
+            logger.error("Error getting user preferences: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {}
\ No newline at end of file
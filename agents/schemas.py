@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+
+class AnalysedEntity(BaseModel):
+    """An entity mentioned in an email"""
+    type: str
+    name: str
+    relevance: Optional[str] = None
+
+
+class ActionItem(BaseModel):
+    """An action item or request found in an email"""
+    description: str
+    due_date: Optional[str] = None
+    assignee: Optional[str] = None
+
+
+class InvoiceData(BaseModel):
+    """Invoice details extracted from an email"""
+    is_invoice: bool = False
+    invoice_number: Optional[str] = None
+    amount: Optional[Union[float, str]] = None
+    currency: Optional[str] = None
+    due_date: Optional[str] = None
+    vendor: Optional[str] = None
+    payment_method: Optional[str] = None
+
+
+class EmailAnalysis(BaseModel):
+    """Structured analysis of an email's intent and content"""
+    intent: str
+    category: str
+    priority: str
+    sentiment: str
+    entities: List[AnalysedEntity] = Field(default_factory=list)
+    action_items: List[ActionItem] = Field(default_factory=list)
+    invoice_data: InvoiceData = Field(default_factory=InvoiceData)
+    summary: str = ""
+
+
+class EmailAnalysisBatchItem(BaseModel):
+    """Analysis of one email within a batched request"""
+    id: int
+    analysis: EmailAnalysis
+
+
+class EmailAnalysisBatch(BaseModel):
+    """Analyses for several emails returned from a single request"""
+    results: List[EmailAnalysisBatchItem] = Field(default_factory=list)
+
+
+class KGEntity(BaseModel):
+    """A knowledge graph node"""
+    type: str
+    properties: Dict[str, Any] = Field(default_factory=dict)
+
+
+class KGRelationship(BaseModel):
+    """A knowledge graph edge between two nodes"""
+    from_type: str
+    from_properties: Dict[str, Any] = Field(default_factory=dict)
+    to_type: str
+    to_properties: Dict[str, Any] = Field(default_factory=dict)
+    type: str
+    properties: Dict[str, Any] = Field(default_factory=dict)
+
+
+class KGExtraction(BaseModel):
+    """Entities and relationships extracted for the knowledge graph"""
+    entities: List[KGEntity] = Field(default_factory=list)
+    relationships: List[KGRelationship] = Field(default_factory=list)
+
+
+class InvoiceValidation(BaseModel):
+    """Result of validating an invoice against user preferences"""
+    valid: bool
+    reasons: List[str] = Field(default_factory=list)
+    confidence: float = 0.0
+
+
+class ReplyDraft(BaseModel):
+    """A drafted email reply"""
+    subject: str
+    body: str
+    summary: str = ""
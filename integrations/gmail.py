@@ -1,20 +1,161 @@
 import asyncio
+import base64
+import logging
 import email
 import imaplib
+import quopri
 # import json
 import os
-# import re
-from datetime import datetime
+import re
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email import policy
 from email.header import decode_header
-from typing import Dict, List, Any, Optional, Set
+from email.message import EmailMessage, Message
+from email.parser import BytesParser
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import takewhile
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
+# UID data item of a UID FETCH response item, e.g. b"12 (UID 3456 BODY[] {3421}"
+_FETCH_UID_RE = re.compile(rb"\bUID (\d+)")
+
+# shared parser; policy.default decodes headers and text parts to str
+_PARSER = BytesParser(policy=policy.default)
+
+# processed message IDs remembered by a long-running monitor before the oldest are forgotten
+_MAX_PROCESSED_EMAILS = 50_000
+
+# invoice terms, matched case-insensitively in one pass over the subject or body
+_INVOICE_RE = re.compile(r"invoice|bill|payment|receipt|amount due|total due", re.IGNORECASE)
+
+# invoice terms in attachment names, plus PDFs (the common format for invoices)
+_INVOICE_FN_RE = re.compile(r"invoice|bill|payment|receipt|\.pdf$", re.IGNORECASE)
+
+# servers may drop an IDLE after 30 minutes, so it is re-issued a little sooner
+_IDLE_TIMEOUT = 29 * 60
+
+# seconds per IDLE command, so a wake or stop request is noticed within one slice
+_IDLE_SLICE = 10
+
+# imaplib only supports IDLE itself from Python 3.14; earlier versions poll
+_HAS_IDLE = hasattr(imaplib.IMAP4, "idle")
+
+# tokens of an IMAP response: parentheses, quoted strings, literal markers and atoms
+_IMAP_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\s*$|([^\s()"]+))', re.DOTALL)
+_IMAP_ESCAPE_RE = re.compile(rb"\\(.)")
+_OPEN, _CLOSE = object(), object()
+
+
+def _imap_tokens(data: List[Any]) -> Iterator[Any]:
+    """Tokenize imaplib response data, substituting each literal's bytes for its {n} marker"""
+    for item in data:
+        text, literal = item if isinstance(item, tuple) else (item, None)
+        pos = 0
+        while True:
+            match = _IMAP_TOKEN_RE.match(text, pos)
+            if not match:
+                break
+            pos = match.end()
+            open_paren, close_paren, quoted, literal_marker, atom = match.groups()
+            if open_paren:
+                yield _OPEN
+            elif close_paren:
+                yield _CLOSE
+            elif quoted is not None:
+                yield _IMAP_ESCAPE_RE.sub(rb"\1", quoted).decode("utf-8", errors="replace")
+            elif literal_marker is not None:
+                yield literal
+            else:
+                yield None if atom.upper() == b"NIL" else atom.decode("ascii", errors="replace")
+
+
+def _imap_list(tokens: Iterator[Any]) -> List[Any]:
+    """Read tokens up to the closing parenthesis of the current list"""
+    items = []
+    for token in tokens:
+        if token is _CLOSE:
+            break
+        items.append(_imap_list(tokens) if token is _OPEN else token)
+    return items
+
+
+def _parse_fetch_response(data: List[Any]) -> Dict[bytes, Dict[str, Any]]:
+    """Map each message in a FETCH response to its data items, keyed by UID when the response has one"""
+    messages: Dict[bytes, Dict[str, Any]] = {}
+    tokens = _imap_tokens(data)
+    for token in tokens:
+        if isinstance(token, str) and token.isdigit() and next(tokens, None) is _OPEN:
+            items = _imap_list(tokens)
+            fields = messages.setdefault(token.encode(), {})
+            for key, value in zip(items[::2], items[1::2]):
+                if isinstance(key, str):
+                    fields[key.upper()] = value
+    return {
+        fields["UID"].encode() if isinstance(fields.get("UID"), str) else number: fields
+        for number, fields in messages.items()
+    }
+
+
+def _bodystructure_parts(node: List[Any], number: str = "") -> Iterator[Tuple[str, List[Any]]]:
+    """Yield (part number, structure) for every leaf part of a BODYSTRUCTURE"""
+    if node and isinstance(node[0], list):
+        # multipart: child parts come first, followed by the subtype and extensions
+        for i, child in enumerate(takewhile(lambda item: isinstance(item, list), node), 1):
+            yield from _bodystructure_parts(child, f"{number}.{i}" if number else str(i))
+    else:
+        yield number or "1", node
+
+
+def _imap_params(params: Any) -> Dict[str, Any]:
+    if not isinstance(params, list):
+        return {}
+    return {str(key).upper(): value for key, value in zip(params[::2], params[1::2])}
+
+
+def _decode_part(payload: Any, encoding: str, charset: Optional[str]) -> str:
+    """Decode a fetched body part according to its transfer encoding and charset"""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8", errors="surrogateescape")
+    if not payload:
+        return ""
+    if encoding == "BASE64":
+        payload = base64.b64decode(payload)
+    elif encoding == "QUOTED-PRINTABLE":
+        payload = quopri.decodestring(payload)
+    try:
+        return payload.decode(charset or "utf-8", errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
+
+
+def email_message(email_data: Dict[str, Any]) -> EmailMessage:
+    """Rebuild a plain-text message from fetched email data, for consumers that expect a Message"""
+    message = EmailMessage()
+    for header, key in (("From", "from"), ("To", "to"), ("Subject", "subject")):
+        # decoded header values may keep folding line breaks, which EmailMessage rejects
+        message[header] = " ".join(str(email_data.get(key) or "").splitlines())
+    try:
+        message["Date"] = format_datetime(datetime.fromisoformat(email_data["date"]))
+    except (KeyError, TypeError, ValueError):
+        pass
+    message.set_content(email_data.get("body") or "")
+    return message
+
+
 class GmailMonitor:
     """
     GmailMonitor is a monitor that uses IMAP to check for new emails. 
     """
-    def __init__(self, email_address: str = None, password: str = None):
+    def __init__(self, email_address: str = None, password: str = None, fetch_batch_size: int = 100, pool_size: int = 4):
 
         """Initialize the gmail monitor with credentials"""
 
@@ -23,7 +164,24 @@ class GmailMonitor:
         self.email_address = email_address or os.getenv("GMAIL_EMAIL")
         self.password = password or os.getenv("GMAIL_PASSWORD")
         self.imap_server = "imap.gmail.com"
-        self.processed_emails: Set[str] = set()  # track processed email IDs
+        # one TLS context, with the CA bundle loaded once, for every pooled connection and reconnect
+        self._ssl_context = ssl.create_default_context()
+        # track processed email UIDs as returned by UID SEARCH (bytes), oldest first
+        self.processed_emails: "OrderedDict[bytes, None]" = OrderedDict()
+        # UIDVALIDITY of the folder the processed UIDs belong to
+        self._uidvalidity: Optional[bytes] = None
+        self.fetch_batch_size = fetch_batch_size  # message IDs per FETCH command
+        self.pool_size = pool_size  # IMAP connections used to fetch batches concurrently
+        self._pool: List[imaplib.IMAP4_SSL] = []
+        # dedicated threads for blocking imaplib calls, one per pooled connection
+        self._imap_exec: Optional[ThreadPoolExecutor] = None
+        # folder currently selected on the pooled connections
+        self._selected_folder: Optional[str] = None
+        # while monitor_inbox owns the main connection, UIDs to flag \Seen wait here for it
+        self._monitoring = False
+        self._pending_seen: List[str] = []
+        # set to end a wait for new mail early: on a queued mark_as_read, or when monitoring stops
+        self._wake = threading.Event()
 
 
     async def connect(self) -> None:
@@ -31,112 +189,269 @@ class GmailMonitor:
         if hasattr(self, 'mail'):
             raise ValueError("Already connected to IMAP server")
         else:
-            self.mail = await asyncio.to_thread(self._connect_sync)
+            self._imap_exec = ThreadPoolExecutor(max_workers=max(1, self.pool_size), thread_name_prefix="gmail-imap")
+            # the first connection handles search/store; all of them fetch
+            self._pool = list(await asyncio.gather(
+                *(self._run_imap(self._connect_sync) for _ in range(max(1, self.pool_size)))
+            ))
+            self.mail = self._pool[0]
+
+    async def _run_imap(self, fn, *args) -> Any:
+        """Run a blocking imaplib call on the IMAP executor"""
+        return await asyncio.get_running_loop().run_in_executor(self._imap_exec, fn, *args)
 
     def _connect_sync(self) -> imaplib.IMAP4_SSL:
         """Synchronous connection to Gmail IMAP server"""
-        mail = imaplib.IMAP4_SSL(self.imap_server)
+        mail = imaplib.IMAP4_SSL(self.imap_server, ssl_context=self._ssl_context)
         mail.login(self.email_address, self.password)
         return mail
 
     async def disconnect(self) -> None:
         """Disconnect from the IMAP server"""
         if hasattr(self, 'mail'):
-            await asyncio.to_thread(self.mail.logout)
+            await asyncio.gather(*(self._run_imap(mail.logout) for mail in self._pool), return_exceptions=True)
+            self._pool = []
+            del self.mail
+            self._imap_exec.shutdown(wait=False)
+            self._imap_exec = None
+            self._selected_folder = None
         else:
             raise ValueError("Not connected to IMAP server")
     
     async def fetch_emails(self, folder: str = "INBOX", search_criteria: str = "UNSEEN") -> List[Dict[str, Any]]:
         """Fetch emails from the specified folder that match the search criteria"""
-        # select the mailbox/folder
-        await asyncio.to_thread(self.mail.select, folder)
+        # select the mailbox/folder on every pooled connection, unless it already is
+        if self._selected_folder != folder:
+            await asyncio.gather(*(self._run_imap(mail.select, folder) for mail in self._pool))
+            self._selected_folder = folder
 
-        # search for emails that matches the criteria
-        status, messages = await asyncio.to_thread(self.mail.search, None, search_criteria)
+            # UIDs only identify the same messages while UIDVALIDITY is unchanged
+            uidvalidity = self.mail.response("UIDVALIDITY")[1][-1]
+            if uidvalidity != self._uidvalidity:
+                self.processed_emails.clear()
+                self._uidvalidity = uidvalidity
+
+        # search for emails that matches the criteria, by UID so IDs survive expunges
+        status, messages = await self._run_imap(self.mail.uid, "SEARCH", None, search_criteria)
         
         if status !="OK":
             print(f"Error searching for emails: {status}")
             return []
         
-        # get the list of email IDs
+        # get the list of email UIDs
         email_ids = messages[0].split()
         
-        # fetch the emails
+        # skip already processed emails
+        email_ids = [email_id for email_id in email_ids if email_id not in self.processed_emails]
+        
+        # fetch the emails in batches, one FETCH round-trip per batch, with
+        # each pooled connection working through one batch at a time
+        connections: asyncio.Queue = asyncio.Queue()
+        for mail in self._pool:
+            connections.put_nowait(mail)
+
+        async def fetch_batch(batch: List[bytes]) -> List[Dict[str, Any]]:
+            mail = await connections.get()
+            try:
+                return await self._fetch_email_batch(batch, mail)
+            finally:
+                connections.put_nowait(mail)
+
+        batches = await asyncio.gather(*(
+            fetch_batch(email_ids[i:i + self.fetch_batch_size])
+            for i in range(0, len(email_ids), self.fetch_batch_size)
+        ))
+
+        emails = []
+        for batch in batches:
+            for email_data in batch:
+                emails.append(email_data)
+                self.processed_emails[email_data["id"].encode()] = None
+
+        # bound memory for long-running monitors
+        while len(self.processed_emails) > _MAX_PROCESSED_EMAILS:
+            self.processed_emails.popitem(last=False)
+        
+        return emails
+
+    async def _fetch_email_batch(self, email_ids: List[bytes], mail: imaplib.IMAP4_SSL) -> List[Dict[str, Any]]:
+        """
+        Fetch several emails on the given connection without downloading attachments.
+
+        Headers and BODYSTRUCTURE are fetched first; only the text/plain parts
+        are then downloaded, one FETCH per distinct part number. Attachment
+        names and sizes come from BODYSTRUCTURE. PEEK leaves messages unread.
+        Messages whose structure cannot be used are fetched whole instead.
+        """
+        try:
+            status, data = await self._run_imap(mail.uid, "FETCH", b",".join(email_ids), '(BODY.PEEK[HEADER] BODYSTRUCTURE)')
+        except Exception as e:
+            print(f"Error fetching emails: {e}")
+            return []
+
+        if status != "OK":
+            print(f"Error fetching emails: {status}")
+            return []
+
+        # plan which parts to download for each message
+        plans = {}
+        fallback = []
+        for email_id, fields in _parse_fetch_response(data).items():
+            try:
+                plans[email_id] = (fields["BODY[HEADER]"], *self._plan_parts(fields["BODYSTRUCTURE"]))
+            except Exception:
+                fallback.append(email_id)
+
+        # download the text parts, grouping messages that need the same part number
+        by_part: Dict[str, List[bytes]] = {}
+        for email_id, (_, text_parts, _) in plans.items():
+            for number, _, _ in text_parts:
+                by_part.setdefault(number, []).append(email_id)
+
+        payloads: Dict[Tuple[bytes, str], Any] = {}
+        for number, part_ids in by_part.items():
+            try:
+                status, data = await self._run_imap(mail.uid, "FETCH", b",".join(part_ids), f'(BODY.PEEK[{number}])')
+            except Exception as e:
+                print(f"Error fetching email bodies: {e}")
+                continue
+            if status != "OK":
+                print(f"Error fetching email bodies: {status}")
+                continue
+            for email_id, fields in _parse_fetch_response(data).items():
+                payloads[email_id, number] = fields.get(f"BODY[{number}]")
+
         emails = []
         for email_id in email_ids:
-            # skip already processed emails
-            if email_id in self.processed_emails:
+            if email_id not in plans:
                 continue
-            
-            email_data = await self._fetch_email(email_id)
+            headers, text_parts, attachments = plans[email_id]
+            if isinstance(headers, str):
+                headers = headers.encode("utf-8", errors="surrogateescape")
+            body = "".join(
+                _decode_part(payloads.get((email_id, number)), encoding, charset)
+                for number, encoding, charset in text_parts
+            )
+            email_data = self._email_data(email_id, email.message_from_bytes(headers or b""), body, attachments)
             if email_data:
                 emails.append(email_data)
-                self.processed_emails.add(email_id.decode())
-        
+
+        if fallback:
+            emails.extend(await self._fetch_email_batch_rfc822(fallback, mail))
+
+        return emails
+
+    def _plan_parts(self, structure: List[Any]) -> Tuple[List[Tuple[str, str, Optional[str]]], List[Dict[str, Any]]]:
+        """Find the text/plain parts to download and the attachments in a BODYSTRUCTURE"""
+        text_parts = []
+        attachments = []
+        for number, part in _bodystructure_parts(structure):
+            content_type = f"{part[0]}/{part[1]}".lower()
+            params = _imap_params(part[2])
+            encoding = str(part[5] or "7BIT").upper()
+            size = int(part[6]) if str(part[6]).isdigit() else 0
+
+            # the disposition follows the type-specific fields
+            if content_type.startswith("text/"):
+                disposition_index = 9
+            elif content_type == "message/rfc822":
+                disposition_index = 11
+            else:
+                disposition_index = 8
+            disposition = part[disposition_index] if len(part) > disposition_index else None
+            disposition_type = str(disposition[0]).lower() if isinstance(disposition, list) and disposition else ""
+
+            if "attachment" in disposition_type:
+                filename = _imap_params(disposition[1]).get("FILENAME") or params.get("NAME")
+                if filename:
+                    attachments.append({
+                        "filename": self._decode_header(filename),
+                        "content_type": content_type,
+                        # BODYSTRUCTURE reports the encoded size
+                        "size": size * 3 // 4 if encoding == "BASE64" else size
+                    })
+            elif content_type == "text/plain":
+                text_parts.append((number, encoding, params.get("CHARSET")))
+
+        return text_parts, attachments
+
+    async def _fetch_email_batch_rfc822(self, email_ids: List[bytes], mail: imaplib.IMAP4_SSL) -> List[Dict[str, Any]]:
+        """Fetch several emails whole with a single FETCH command on the given connection"""
+        try:
+            status, data = await self._run_imap(mail.uid, "FETCH", b",".join(email_ids), '(BODY.PEEK[])')
+        except Exception as e:
+            print(f"Error fetching emails: {e}")
+            return []
+
+        if status != "OK":
+            print(f"Error fetching emails: {status}")
+            return []
+
+        # the response interleaves (header, payload) tuples with b")" separators
+        emails = []
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            match = _FETCH_UID_RE.search(item[0])
+            if not match:
+                continue
+            email_data = self._parse_email_bytes(match.group(1), item[1])
+            if email_data:
+                emails.append(email_data)
+
         return emails
 
     async def _fetch_email(self, email_id: bytes) ->  Optional[Dict[str, Any]]:
-        """Fetch a single email by ID"""
+        """Fetch a single email by UID"""
+        emails = await self._fetch_email_batch([email_id], self.mail)
+        return emails[0] if emails else None
+
+    def _parse_email_bytes(self, email_id: bytes, raw_email: bytes) -> Optional[Dict[str, Any]]:
+        """Parse a fetched RFC822 message into email data"""
         try:
-            # fetch the email data
-            status, data = await asyncio.to_thread(self.mail.fetch, email_id, '(RFC822)')
+            msg = _PARSER.parsebytes(raw_email)
 
-            if status != "OK":
-                print(f"Error fetching email: {status}")
-                return None
+            # extract the body: the preferred text/plain part, decoded once
+            body_part = msg.get_body(preferencelist=("plain",))
+            body = body_part.get_content() if body_part is not None else ""
+
+            # extract attachments without decoding their payloads
+            attachments = []
+            for part in msg.iter_attachments():
+                if part.get_content_disposition() != "attachment":
+                    continue
+                filename = part.get_filename()
+                if filename:
+                    payload = part.get_payload(decode=False)
+                    size = len(payload) if isinstance(payload, (str, bytes)) else 0
+                    attachments.append({
+                        "filename": filename,
+                        "content_type": part.get_content_type(),
+                        # estimate the decoded size from the encoded payload
+                        "size": size * 3 // 4 if part.get("Content-Transfer-Encoding", "").lower() == "base64" else size
+                    })
+
+            return self._email_data(email_id, msg, body, attachments)
 
-            # parse the email data
-            email_data = data[0][1]
-            msg = email.message_from_bytes(email_data)
+        except Exception as e:
+            print(f"Error parsing email: {e}")
+            return None
 
+    def _email_data(self, email_id: bytes, msg: Message, body: str, attachments: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Build the email data dictionary from a message's headers, body and attachments"""
+        try:
             # extract email metadata
-            subject = self._decode_header(msg['Subject'])
-            from_addr = self._decode_header(msg['From'])
-            to_addr = self._decode_header(msg['To'])
-            date_str = self._decode_header(msg['Date'])
+            subject = self._decode_header(str(msg['Subject'] or ""))
+            from_addr = self._decode_header(str(msg['From'] or ""))
+            to_addr = self._decode_header(str(msg['To'] or ""))
+            date_str = self._decode_header(str(msg['Date'] or ""))
 
             # parse the date
             try:
-                date = email.utils.parsedate_to_datetime(date_str)
-            except Exception as e:
-                date = datetime.now()
-
-            # extract the body
-            body = ""
-            attachments = []
-
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = part.get_content_disposition() or ""
-
-                    # extract the content
-                    if content_type == "text/plain" and "attachment" not in content_disposition:
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            body += payload.decode("utf-8", errors="ignore")
-                    
-                    # extract attachments
-                    if "attachment" in content_disposition:
-                        filename = part.get_filename()
-                        if filename:
-                            # decode the filename if needed
-                            filename = self._decode_header(filename)
-                            
-                            # get attachment data
-                            attachment_data = part.get_payload(decode=True)
-                            
-                            attachments.append({
-                                "filename": filename,
-                                "content_type": content_type,
-                                "size": len(attachment_data) if attachment_data else 0
-                            })
-            
-            else:
-                # not multipart - get the content directly
-                payload = msg.get_payload(decode=True)
-                if payload:
-                    body = payload.decode("utf-8", errors="ignore")
+                date = parsedate_to_datetime(date_str)
+            except (TypeError, ValueError):
+                # missing or malformed Date header
+                date = datetime.now(timezone.utc)
 
             # create the email data dictionary
             email_data = {
@@ -153,7 +468,7 @@ class GmailMonitor:
             return email_data
 
         except Exception as e:
-            print(f"Error fetching email: {e}")
+            print(f"Error parsing email: {e}")
             return None
 
     def _decode_header(self, header: str) -> str:
@@ -161,49 +476,69 @@ class GmailMonitor:
         if not header:
             return ""
         
-        decoded_header = decode_header(header)
+        # no RFC 2047 encoded words, nothing to decode
+        if "=?" not in header:
+            return header
+        
         header_parts = []
+        append = header_parts.append
 
-        for content, encoding in decoded_header:
+        for content, encoding in decode_header(header):
             if isinstance(content, bytes):
                 # if the encoding is specified, use it; otherwise, try utf-8
-                if encoding:
-                    header_parts.append(content.decode(encoding, errors="ignore"))
-                else:
-                    header_parts.append(content.decode("utf-8", errors="ignore"))
+                try:
+                    append(content.decode(encoding or "utf-8", errors="ignore"))
+                except LookupError:
+                    append(content.decode("utf-8", errors="ignore"))
             else:
-                header_parts.append(content)
+                append(content)
         
         return "".join(header_parts)
         
         
     def _check_for_invoice(self, subject: str, body: str, attachments: List[Dict[str, Any]]) -> bool:
         """Check if the email contains an invoice"""
-        # check the subject
-        subject_lower = subject.lower()
-        if any(keyword in subject_lower for keyword in ["invoice", "bill", "payment", "receipt"]):
-            return True
-        
-        # check the body
-        body_lower = body.lower()
-        if any(keyword in body_lower for keyword in ["invoice", "bill", "payment", "receipt", "amount due", "total due"]):
-            return True
-        
-        # check attachments
-        for attachment in attachments:
-            filename = attachment["filename"].lower()
-            if any(keyword in filename for keyword in ["invoice", "bill", "payment", "receipt"]):
-                return True
-            
-            # check for PDF files (common format for invoices)
-            if filename.endswith(".pdf"):
-                return True
-        
-        return False
+        # one case-insensitive pass per field, without lowercased copies
+        return bool(
+            _INVOICE_RE.search(subject)
+            or _INVOICE_RE.search(body)
+            or any(_INVOICE_FN_RE.search(attachment["filename"]) for attachment in attachments)
+        )
 
     async def mark_as_read(self, email_id: str) -> None:
-        """Mark an email as read"""
-        await asyncio.to_thread(self.mail.store, email_id, "+FLAGS", "\\Seen")
+        """
+        Mark an email as read, by the UID reported in its email data
+
+        Emails are fetched with BODY.PEEK, so they stay unseen until processed;
+        call this once an email has been handled so it is not fetched again
+        after a restart. While monitor_inbox is running, the flag is set by the
+        monitor between checks rather than on the connection it is using.
+        """
+        if self._monitoring:
+            self._pending_seen.append(email_id)
+            self._wake.set()
+        else:
+            await self._run_imap(self.mail.uid, "STORE", email_id, "+FLAGS", "\\Seen")
+
+    async def handle_email(self, email_data: Dict[str, Any], handler) -> Any:
+        """
+        Run a handler on a fetched email, then mark the email as read
+
+        The handler receives the email as a Message (see email_message). If it
+        raises, the email stays unread so it is fetched again, and the
+        exception propagates to the caller.
+        """
+        result = await handler(email_message(email_data))
+        await self.mark_as_read(email_data["id"])
+        return result
+
+    async def _flush_seen(self) -> None:
+        """Flag the emails queued by mark_as_read as \\Seen, in one STORE"""
+        if self._pending_seen:
+            # keep the UIDs queued until the STORE succeeds, so a dropped connection retries them
+            email_ids = self._pending_seen[:]
+            await self._run_imap(self.mail.uid, "STORE", ",".join(email_ids), "+FLAGS", "\\Seen")
+            del self._pending_seen[:len(email_ids)]
     
     async def send_email(self, to_email: str, subject: str, body: str) -> bool:
         """
@@ -244,21 +579,68 @@ class GmailMonitor:
             print(f"Error sending email: {e}")
             return False
     
+    def _idle_sync(self, timeout: float = _IDLE_TIMEOUT) -> bool:
+        """
+        Idle on the main connection until new mail arrives, timeout elapses or _wake is set
+
+        IDLE is issued in _IDLE_SLICE-second slices through imaplib's own idle()
+        support, so the blocking executor thread checks _wake between slices.
+
+        Returns:
+            True if the server announced new messages, False otherwise
+        """
+        deadline = time.monotonic() + timeout
+        while not self._wake.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self.mail.idle(duration=min(remaining, _IDLE_SLICE)) as idler:
+                if any(response_type == "EXISTS" for response_type, _ in idler):
+                    return True
+        return False
+
+    async def _poll_wait(self, interval: float) -> None:
+        """Sleep for interval seconds, or until _wake is set"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + interval
+        while not self._wake.is_set():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, 1))
+
     async def monitor_inbox(self, callback, interval: int = 60, folder: str = "INBOX") -> None:
         """
-        Monitor the inbox for new emails at regular intervals
+        Monitor the inbox for new emails over a single long-lived connection
+
+        New mail is awaited with IMAP IDLE where the server and imaplib (Python 3.14+) support it; otherwise
+        the inbox is polled every interval seconds. The connection is re-established
+        if the server drops it.
         
         Args:
             callback: Async function to call with new emails
-            interval: Check interval in seconds
+            interval: Poll interval in seconds, used when IDLE is unavailable
             folder: Email folder to monitor
         """
+        self._monitoring = True
+        self._wake.clear()
+        try:
+            await self._monitor_inbox(callback, interval, folder)
+        finally:
+            self._monitoring = False
+            # let an IDLE still running on the executor end after its current slice
+            self._wake.set()
+
+    async def _monitor_inbox(self, callback, interval: int, folder: str) -> None:
+        """Check loop of monitor_inbox"""
         while True:
             try:
-                # connect to Gmail
-                await self.connect()
+                # connect once and keep the connection open between checks
+                if not hasattr(self, 'mail'):
+                    await self.connect()
                 
                 # fetch new emails
+                self._wake.clear()
                 emails = await self.fetch_emails(folder=folder)
                 
                 # filter for invoice emails
@@ -268,11 +650,22 @@ class GmailMonitor:
                     # process the emails with the callback
                     await callback(invoice_emails)
                 
-                # disconnect
-                await self.disconnect()
+                # flag emails processed since the last check, on the selected folder
+                await self._flush_seen()
                 
+                # wait for the server to announce new mail, re-issuing IDLE before it times out,
+                # until then or until processed emails are waiting to be flagged
+                if _HAS_IDLE and "IDLE" in self.mail.capabilities:
+                    while not await self._run_imap(self._idle_sync) and not self._wake.is_set():
+                        pass
+                else:
+                    await self._poll_wait(interval)
+                
+            except (imaplib.IMAP4.abort, OSError) as e:
+                logger.warning("IMAP connection lost, reconnecting: %s", e)
+                if hasattr(self, 'mail'):
+                    await self.disconnect()
+                await asyncio.sleep(min(interval, 5))
             except Exception as e:
-                logger.error(f"Error monitoring inbox: {e}", exc_info=True)
-            
-            # wait for the next check
-            await asyncio.sleep(interval)
\ No newline at end of file
+                logger.error("Error monitoring inbox: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                await asyncio.sleep(interval)
@@ -2,15 +2,140 @@ import asyncio
 import json
 from langchain.agents import AgentExecutor
 from langchain.agents.agent_types import AgentType
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain.tools import Tool
+from langchain.tools import StructuredTool
 import neo4j
-from typing import List, Dict, Any
+from typing import AsyncIterator, Awaitable, List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel, Field
 import re
 # import os
 
+from agents import _json
+from agents._llm import get_llm
+
+# Neo4j labels and relationship types are interpolated into Cypher, so only
+# allow ASCII letters, digits and underscores, starting with a letter
+_LABEL_RE = re.compile(r'[A-Za-z][A-Za-z0-9_]*\Z')
+
+# workflow entity types the extraction prompt asks for; entities and relationship
+# endpoints are matched on name, so each gets a name index
+_NAMED_ENTITY_TYPES = ("Application", "DataSource", "Action", "Output", "Trigger", "Organization", "Document", "System")
+
+# everything that does not depend on the task lives in the system prompt, so every
+# extraction request starts with the same prefix and can hit the provider's prompt cache
+_EXTRACTION_SYSTEM_PROMPT = """You are Dela's knowledge graph extraction engine. Your role is to analyze user tasks and extract structured information for workflow automation.
+
+        Focus on identifying workflow-relevant entities:
+        - Applications/Systems (Salesforce, QuickBooks, Email clients, etc.)
+        - Data Sources (reports, files, databases, APIs)
+        - Actions/Operations (generate, process, analyze, send, approve)
+        - Outputs (reports, notifications, files, decisions)
+        - Triggers (time-based, event-based, conditional)
+        - People/Roles (recipients, approvers, stakeholders)
+
+        Extract relationships that show workflow dependencies:
+        - USES, GENERATES, TRIGGERS, DEPENDS_ON, SENDS_TO, PROCESSES
+
+        Describe each task's entities and relationships in this exact format:
+        {
+            "entities": [
+                {
+                    "type": "entity_type",
+                    "properties": {
+                        "name": "entity_name",
+                        "category": "workflow_category",
+                        "frequency": "how_often_used",
+                        "automation_potential": "high/medium/low"
+                    }
+                }
+            ],
+            "relationships": [
+                {
+                    "from_type": "entity_type1",
+                    "from_props": {"name": "entity_name1"},
+                    "rel_type": "RELATIONSHIP_TYPE",
+                    "to_type": "entity_type2",
+                    "to_props": {"name": "entity_name2"},
+                    "rel_props": {
+                        "sequence_order": "step_number",
+                        "conditions": "when_this_happens",
+                        "automation_ready": "true/false"
+                    }
+                }
+            ]
+        }
+
+        Always return valid JSON only, no additional text or explanations."""
+
+_EXTRACTION_USER_PROMPT = """Extract entities and relationships from this task for Dela's workflow automation:
+
+        Task: {task}
+
+        Return a single JSON object with "entities" and "relationships" in the format above."""
+
+_SYSTEM_MESSAGE_EXTRACTION = SystemMessage(content=_EXTRACTION_SYSTEM_PROMPT)
+
+# tasks packed into one extraction prompt by learn_from_tasks
+_TASK_BATCH_SIZE = 8
+
+_EXTRACTION_BATCH_PROMPT = """Extract entities and relationships from each of the following tasks independently for Dela's workflow automation:
+
+        Tasks: {tasks_json}
+
+        Return JSON of the form {{"results": [{{"task_index": <task index>, "entities": [...], "relationships": [...]}}, ...]}}
+        with exactly one entry per task, where entities and relationships use the format above."""
+
+_AGENT_SYSTEM_PROMPT = """You are Dela's Knowledge Graph Agent that automatically builds and maintains a knowledge graph.
+        
+        Your capabilities:
+        - Create entities and relationships in the knowledge graph
+        - Query the graph for information
+        - Find related entities and patterns
+        - Answer questions based on the knowledge graph data
+        
+        Always be precise and structured in your responses."""
+
+# required fields of extracted entities and relationships, with their expected types
+_ENTITY_FIELDS = (("type", str), ("properties", dict))
+_RELATIONSHIP_FIELDS = (("from_type", str), ("rel_type", str), ("to_type", str), ("from_props", dict), ("to_props", dict))
+
+
+def _invalid_fields(item: Any, fields: Tuple[Tuple[str, type], ...]) -> List[str]:
+    """Names of the required fields an extracted item is missing or has with the wrong type"""
+    if not isinstance(item, dict):
+        return [name for name, _ in fields]
+    return [name for name, expected in fields if not isinstance(item.get(name), expected)]
+
+
+class CreateEntityArgs(BaseModel):
+    """Arguments of the create_entity tool"""
+    entity_type: str
+    properties: Dict[str, Any] = Field(default_factory=dict)
+
+
+class CreateRelationshipArgs(BaseModel):
+    """Arguments of the create_relationship tool"""
+    from_type: str
+    from_props: Dict[str, Any]
+    rel_type: str
+    to_type: str
+    to_props: Dict[str, Any]
+    rel_props: Optional[Dict[str, Any]] = None
+
+
+class QueryGraphArgs(BaseModel):
+    """Arguments of the query_graph tool"""
+    query: str
+    params: Optional[Dict[str, Any]] = None
+
+
+class GetRelatedEntitiesArgs(BaseModel):
+    """Arguments of the get_related_entities tool"""
+    entity_type: str
+    properties: Dict[str, Any]
+    depth: int = 1
+
 
 class AsyncKnowledgeGraph:
     """
@@ -24,24 +149,20 @@ class AsyncKnowledgeGraph:
         )
 
     def _validate_label(self, label: str) -> None:
-        # Only allow ASCII letters, digits and underscores, and must start with a letter
-        if not re.match(r'^[A-Za-z][A-Za-z0-9_]*$', label):
+        if not _LABEL_RE.match(label):
             raise ValueError(f"Invalid entity type: {label}")
     
     async def create_entity(self, entity_type: str, properties: Dict[str, Any]):
         """Create a new entity node in the knowledge graph"""
         self._validate_label(entity_type)
         async with self.driver.session() as session:
-            # convert properties to cypher parameters
-            props_string = ", ".join([f"{k}: ${k}" for k in properties.keys()])
-            
-            # create the entity
+            # pass the properties as one map so the query text depends only on the label
             result = await session.run(
-                f"CREATE (e:{entity_type} {{{props_string}}}) RETURN e",
-                **properties
+                f"CREATE (e:{entity_type} $props) RETURN elementId(e) AS id",
+                props=properties
             )
             record = await result.single()
-            return f"Created {entity_type} entity with ID: {record['e'].id}"
+            return f"Created {entity_type} entity with ID: {record['id']}"
     
     async def get_entity(self, entity_type: str, properties: Dict[str, Any]):
         """Get an entity from the knowledge graph"""
@@ -68,27 +189,23 @@ class AsyncKnowledgeGraph:
         """Create a relationship between two entities"""
         self._validate_label(from_type)
         self._validate_label(to_type)
+        if not from_props or not to_props:
+            raise ValueError("Relationship endpoints must be matched on at least one property")
         async with self.driver.session() as session:
             # build match clauses for the entities
             from_props_str = " AND ".join([f"a.{k} = $from_{k}" for k in from_props])
             to_props_str = " AND ".join([f"b.{k} = $to_{k}" for k in to_props])
             
-            # build properties for the relationship
-            rel_props_str = ""
-            if rel_props:
-                rel_props_str = " {" + ", ".join([f"{k}: $rel_{k}" for k in rel_props]) + "}"
-            
-            # combine all parameters
+            # combine all parameters; relationship properties go in as one map
             params = {f"from_{k}": v for k, v in from_props.items()}
             params.update({f"to_{k}": v for k, v in to_props.items()})
-            if rel_props:
-                params.update({f"rel_{k}": v for k, v in rel_props.items()})
+            params["rel_props"] = rel_props or {}
             
             # create the relationship
             query = f"""
             MATCH (a:{from_type}), (b:{to_type})
             WHERE {from_props_str} AND {to_props_str}
-            CREATE (a)-[r:{rel_type}{rel_props_str}]->(b)
+            CREATE (a)-[r:{rel_type} $rel_props]->(b)
             RETURN a, r, b
             """
             
@@ -96,12 +213,82 @@ class AsyncKnowledgeGraph:
             await result.consume()
             return f"Created relationship: ({from_type})-[{rel_type}]->({to_type})"
     
-    async def query_graph(self, query: str, params: Dict[str, Any] = None):
-        """Run a Cypher query against the knowledge graph"""
+    async def create_entities(self, entity_type: str, rows: List[Dict[str, Any]]) -> List[Any]:
+        """Create or update several entity nodes with the same label, merging named ones on their name"""
+        async with self.driver.session() as session:
+            return await self._create_entities(session, entity_type, rows)
+    
+    async def _create_entities(self, session, entity_type: str, rows: List[Dict[str, Any]]) -> List[Any]:
+        """Create or update several entity nodes with the same label on an open session or transaction"""
+        self._validate_label(entity_type)
+        # named entities are merged so repeated mentions (and the name uniqueness
+        # constraints) reuse one node; unnamed ones can only be created
+        named = [row for row in rows if row.get("name") is not None]
+        unnamed = [row for row in rows if row.get("name") is None]
+        
+        ids = []
+        if named:
+            result = await session.run(
+                f"UNWIND $rows AS row MERGE (e:{entity_type} {{name: row.name}}) SET e += row RETURN elementId(e) AS id",
+                rows=named
+            )
+            ids += [record["id"] async for record in result]
+        if unnamed:
+            result = await session.run(
+                f"UNWIND $rows AS row CREATE (e:{entity_type}) SET e = row RETURN elementId(e) AS id",
+                rows=unnamed
+            )
+            ids += [record["id"] async for record in result]
+        return ids
+    
+    async def create_relationships(self, from_type: str, rel_type: str, to_type: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Create several relationships of the same type in one query, merging
+        with any existing relationship of that type between the same nodes.
+        
+        Each row holds "from_props", "to_props" and optional "rel_props" maps;
+        all rows must use the same from_props and to_props keys.
+        """
+        async with self.driver.session() as session:
+            await self._create_relationships(session, from_type, rel_type, to_type, rows)
+    
+    async def _create_relationships(self, session, from_type: str, rel_type: str, to_type: str, rows: List[Dict[str, Any]]) -> None:
+        """Create several relationships of the same type on an open session or transaction"""
+        self._validate_label(from_type)
+        self._validate_label(rel_type)
+        self._validate_label(to_type)
+        from_keys = list(rows[0]["from_props"])
+        to_keys = list(rows[0]["to_props"])
+        # an unconstrained MATCH would MERGE an edge between every pair of nodes
+        if not from_keys or not to_keys:
+            raise ValueError("Relationship endpoints must be matched on at least one property")
+        for key in (*from_keys, *to_keys):
+            self._validate_label(key)
+        
+        # build match clauses for the entities
+        conditions = [f"a.{k} = row.from_props.{k}" for k in from_keys]
+        conditions += [f"b.{k} = row.to_props.{k}" for k in to_keys]
+        
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (a:{from_type}), (b:{to_type})
+        WHERE {' AND '.join(conditions)}
+        MERGE (a)-[r:{rel_type}]->(b)
+        SET r += row.rel_props
+        """
+        
+        result = await session.run(query, rows=[
+            {"from_props": row["from_props"], "to_props": row["to_props"], "rel_props": row.get("rel_props") or {}}
+            for row in rows
+        ])
+        await result.consume()
+    
+    async def query_graph(self, query: str, params: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run a Cypher query against the knowledge graph, yielding each row as it arrives"""
         async with self.driver.session() as session:
             result = await session.run(query, params or {})
-            records = await result.fetch_all()
-            return [dict(record) for record in records]
+            async for record in result:
+                yield record.data()
     
     async def get_related_entities(self, entity_type: str, properties: Dict[str, Any], depth: int = 1):
         """Get entities related to a specific entity up to a certain depth"""
@@ -132,6 +319,9 @@ class AsyncKnowledgeGraph:
             # create indexes
             await session.run("CREATE INDEX IF NOT EXISTS FOR (t:Task) ON (t.task_type)")
             await session.run("CREATE INDEX IF NOT EXISTS FOR (t:Task) ON (t.status)")
+            # Person and Tool names are already indexed by their uniqueness constraints
+            for entity_type in _NAMED_ENTITY_TYPES:
+                await session.run(f"CREATE INDEX IF NOT EXISTS FOR (e:{entity_type}) ON (e.name)")
             
             return "Schema initialized with constraints and indexes"
     
@@ -145,12 +335,21 @@ class AsyncKnowledgeGraphAgent:
     Async Knowledge Graph Agent uses the KnowledgeGraph and adds the agent capabilities with non-blocking operations
     """
     
-    def __init__(self, knowledge_graph, llm=None):
+    # agent prompt template, built once and shared by every instance
+    _agent_prompt = None
+    
+    def __init__(self, knowledge_graph, llm=None, max_concurrency: int = 8):
         """Initialize the KG Agent with a KnowledgeGraph instance and LLM"""
         self.kg = knowledge_graph
         
+        # tasks processed at once by learn_from_tasks
+        self.max_concurrency = max_concurrency
+        
         # Initialize LLM if not provided
-        self.llm = llm or ChatOpenAI(temperature=0)
+        self.llm = llm or get_llm(temperature=0, model="gpt-4o")
+        
+        # extraction calls use JSON mode, so the model always returns a parseable object
+        self.llm_json = self.llm.bind(response_format={"type": "json_object"})
         
         # Create tools for the agent
         self.tools = self._create_tools()
@@ -158,7 +357,7 @@ class AsyncKnowledgeGraphAgent:
         # Create the agent executor
         self.agent = self._create_agent()
     
-    async def _create_tools(self):
+    def _create_tools(self):
         """Create tools for the KG Agent to use"""
         # Create async tool wrappers
         async def create_entity_wrapper(entity_type, properties):
@@ -168,60 +367,56 @@ class AsyncKnowledgeGraphAgent:
             return await self.kg.create_relationship(from_type, from_props, rel_type, to_type, to_props, rel_props)
             
         async def query_graph_wrapper(query, params=None):
-            return await self.kg.query_graph(query, params)
+            return [row async for row in self.kg.query_graph(query, params)]
             
         async def get_related_entities_wrapper(entity_type, properties, depth=1):
             return await self.kg.get_related_entities(entity_type, properties, depth)
         
+        # explicit argument schemas spare LangChain from inferring them from the wrappers
         tools = [
-            Tool(
+            StructuredTool.from_function(
+                coroutine=create_entity_wrapper,
                 name="create_entity",
-                func=create_entity_wrapper,
-                description="Create a new entity node in the knowledge graph"
+                description="Create a new entity node in the knowledge graph",
+                args_schema=CreateEntityArgs
             ),
-            Tool(
+            StructuredTool.from_function(
+                coroutine=create_relationship_wrapper,
                 name="create_relationship",
-                func=create_relationship_wrapper,
-                description="Create a relationship between two entities in the knowledge graph"
+                description="Create a relationship between two entities in the knowledge graph",
+                args_schema=CreateRelationshipArgs
             ),
-            Tool(
+            StructuredTool.from_function(
+                coroutine=query_graph_wrapper,
                 name="query_graph",
-                func=query_graph_wrapper,
-                description="Query the knowledge graph for information"
+                description="Query the knowledge graph for information",
+                args_schema=QueryGraphArgs
             ),
-            Tool(
+            StructuredTool.from_function(
+                coroutine=get_related_entities_wrapper,
                 name="get_related_entities",
-                func=get_related_entities_wrapper,
-                description="Get entities related to a specific entity in the knowledge graph"
+                description="Get entities related to a specific entity in the knowledge graph",
+                args_schema=GetRelatedEntitiesArgs
             )
         ]
         return tools
     
     def _create_agent(self):
-        """Create the agent executor"""
+        """Create the agent executor; called once per instance from __init__"""
         from langchain.agents import create_openai_functions_agent
         from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
         
-        system_message = """You are Dela's Knowledge Graph Agent that automatically builds and maintains a knowledge graph.
-        
-        Your capabilities:
-        - Create entities and relationships in the knowledge graph
-        - Query the graph for information
-        - Find related entities and patterns
-        - Answer questions based on the knowledge graph data
-        
-        Always be precise and structured in your responses."""
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            ("user", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])  
+        if AsyncKnowledgeGraphAgent._agent_prompt is None:
+            AsyncKnowledgeGraphAgent._agent_prompt = ChatPromptTemplate.from_messages([
+                ("system", _AGENT_SYSTEM_PROMPT),
+                ("user", "{input}"),
+                MessagesPlaceholder(variable_name="agent_scratchpad")
+            ])
         
         agent = create_openai_functions_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt
+            prompt=AsyncKnowledgeGraphAgent._agent_prompt
         )
         
         return AgentExecutor(agent=agent, tools=self.tools, verbose=True)
@@ -229,109 +424,124 @@ class AsyncKnowledgeGraphAgent:
     async def extract_entities_from_task(self, task: Dict[str, Any]):
         """Extract entities and relationships from a task using system and user prompts"""
         
-        system_prompt = """You are Dela's knowledge graph extraction engine. Your role is to analyze user tasks and extract structured information for workflow automation.
-
-        Focus on identifying workflow-relevant entities:
-        - Applications/Systems (Salesforce, QuickBooks, Email clients, etc.)
-        - Data Sources (reports, files, databases, APIs)
-        - Actions/Operations (generate, process, analyze, send, approve)
-        - Outputs (reports, notifications, files, decisions)
-        - Triggers (time-based, event-based, conditional)
-        - People/Roles (recipients, approvers, stakeholders)
-
-        Extract relationships that show workflow dependencies:
-        - USES, GENERATES, TRIGGERS, DEPENDS_ON, SENDS_TO, PROCESSES
-
-        Always return valid JSON only, no additional text or explanations."""
-
-        user_prompt = """Extract entities and relationships from this task for Dela's workflow automation:
-
-        Task: {json.dumps(task, indent=2)}
-
-        Return JSON in this exact format:
-        {{
-            "entities": [
-                {{
-                    "type": "entity_type",
-                    "properties": {{
-                        "name": "entity_name",
-                        "category": "workflow_category",
-                        "frequency": "how_often_used",
-                        "automation_potential": "high/medium/low"
-                    }}
-                }}
-            ],
-            "relationships": [
-                {{
-                    "from_type": "entity_type1",
-                    "from_props": {{"name": "entity_name1"}},
-                    "rel_type": "RELATIONSHIP_TYPE",
-                    "to_type": "entity_type2",
-                    "to_props": {{"name": "entity_name2"}},
-                    "rel_props": {{
-                        "sequence_order": "step_number",
-                        "conditions": "when_this_happens",
-                        "automation_ready": "true/false"
-                    }}
-                }}
-            ]
-        }}"""
-
         # create messages for the LLM
         messages = [
-            SystemMessage(content=system_prompt.format()),
-            HumanMessage(content=user_prompt.format(task=json.dumps(task, indent=2)))
+            _SYSTEM_MESSAGE_EXTRACTION,
+            HumanMessage(content=_EXTRACTION_USER_PROMPT.format(task=_json.dumps(task)))
         ]
         
-        response = await self.llm.ainvoke(messages)
+        response = await self.llm_json.ainvoke(messages)
         
         # extract JSON from response
         try:
-            extraction = json.loads(response.content)
+            extraction = _json.loads(response.content)
             return extraction
         except json.JSONDecodeError as e:
             print(f"JSON parsing error: {e}")
             # fallback if JSON parsing fails
             return {"entities": [], "relationships": []}
     
+    async def extract_entities_from_tasks_batch(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract entities and relationships from several tasks in one LLM request"""
+        # a single task gains nothing from the batch prompt
+        if len(tasks) < 2:
+            return [await self.extract_entities_from_task(task) for task in tasks]
+        
+        messages = [
+            _SYSTEM_MESSAGE_EXTRACTION,
+            HumanMessage(content=_EXTRACTION_BATCH_PROMPT.format(tasks_json=_json.dumps(
+                [{"task_index": i, "task": task} for i, task in enumerate(tasks)]
+            )))
+        ]
+        
+        response = await self.llm_json.ainvoke(messages)
+        
+        results: List[Any] = [None] * len(tasks)
+        try:
+            batch = _json.loads(response.content)
+            for item in batch.get("results", []):
+                # validate each entry on its own so one malformed entry does not discard the rest
+                if not isinstance(item, dict):
+                    continue
+                i = item.get("task_index")
+                if isinstance(i, int) and 0 <= i < len(tasks) and results[i] is None:
+                    results[i] = {
+                        "entities": item.get("entities", []),
+                        "relationships": item.get("relationships", [])
+                    }
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"JSON parsing error: {e}")
+        
+        # tasks the model left out are retried individually
+        missing = [i for i, result in enumerate(results) if result is None]
+        retried = await asyncio.gather(*(self.extract_entities_from_task(tasks[i]) for i in missing))
+        for i, result in zip(missing, retried):
+            results[i] = result
+        
+        return results
+    
     async def process_task(self, task: Dict[str, Any]):
         """Process a task to extract entities and relationships for the knowledge graph"""
         # extract entities and relationships
         if not task:
             raise ValueError("Task cannot be empty")
         
-        errors = []
-        
         # Extract entities and relationships
         extraction = await self.extract_entities_from_task(task)
         
-        # Create entities
-        created_entities = []
+        return await self._store_extraction(extraction)
+    
+    async def _store_extraction(self, extraction: Dict[str, Any]):
+        """Write an extraction's entities and relationships to the knowledge graph"""
+        errors = []
+        
+        # group entities, one query per entity type
+        entity_groups: Dict[str, List[Dict[str, Any]]] = {}
         for entity in extraction.get("entities", []):
-            try:
-                # Validate entity structure
-                if "type" not in entity or "properties" not in entity:
-                    errors.append(f"Invalid entity structure: {entity}")
-                    continue
-                    
-                result = await self.kg.create_entity(entity["type"], entity["properties"])
-                created_entities.append(result)
-            except Exception as e:
-                errors.append(f"Error creating entity {entity}: {str(e)}")
+            # Validate entity structure
+            invalid = _invalid_fields(entity, _ENTITY_FIELDS)
+            if invalid:
+                errors.append(f"Invalid entity structure ({', '.join(invalid)}): {entity}")
+                continue
+            entity_groups.setdefault(entity["type"], []).append(entity["properties"])
         
-        # create relationships
-        created_relationships = []
+        # group relationships, one query per relationship shape
+        rel_groups: Dict[tuple, List[Dict[str, Any]]] = {}
         for rel in extraction.get("relationships", []):
-            try:
-                result = await self.kg.create_relationship(
-                    rel["from_type"], rel["from_props"],
-                    rel["rel_type"],
-                    rel["to_type"], rel["to_props"],
-                    rel.get("rel_props")
-                )
-                created_relationships.append(result)
-            except Exception as e:
-                errors.append(f"Error creating relationship {rel}: {str(e)}")
+            # Validate relationship structure
+            invalid = _invalid_fields(rel, _RELATIONSHIP_FIELDS)
+            if invalid:
+                errors.append(f"Invalid relationship structure ({', '.join(invalid)}): {rel}")
+                continue
+            # without properties an endpoint would match every node of its type
+            if not rel["from_props"] or not rel["to_props"]:
+                errors.append(f"Invalid relationship structure (empty from_props or to_props): {rel}")
+                continue
+            key = (
+                rel["from_type"], rel["rel_type"], rel["to_type"],
+                tuple(rel["from_props"]), tuple(rel["to_props"])
+            )
+            rel_groups.setdefault(key, []).append(rel)
+        
+        created_entities = []
+        created_relationships = []
+        # run every write for this task on one session
+        async with self.kg.driver.session() as session:
+            for entity_type, rows in entity_groups.items():
+                try:
+                    ids = await self.kg._create_entities(session, entity_type, rows)
+                    created_entities.extend(f"Created {entity_type} entity with ID: {entity_id}" for entity_id in ids)
+                except Exception as e:
+                    errors.append(f"Error creating {entity_type} entities {rows}: {str(e)}")
+            
+            for (from_type, rel_type, to_type, _, _), rels in rel_groups.items():
+                try:
+                    await self.kg._create_relationships(session, from_type, rel_type, to_type, rels)
+                    created_relationships.extend(
+                        f"Created relationship: ({from_type})-[{rel_type}]->({to_type})" for _ in rels
+                    )
+                except Exception as e:
+                    errors.append(f"Error creating {rel_type} relationships {rels}: {str(e)}")
         
         return {
             "created_entities": created_entities,
@@ -340,12 +550,39 @@ class AsyncKnowledgeGraphAgent:
         }
     
     async def learn_from_tasks(self, tasks: List[Dict[str, Any]]):
-        """Learn from a batch of tasks"""
-        results = []
-        # process tasks concurrently for better performance
-        tasks_to_process = [self.process_task(task) for task in tasks]
-        results = await asyncio.gather(*tasks_to_process)
-        return results
+        """Learn from a batch of tasks, with at most max_concurrency requests in flight"""
+        batches = await asyncio.gather(*self._learning_batches(tasks))
+        return [result for batch in batches for _, result in batch]
+    
+    async def learn_from_tasks_iter(self, tasks: List[Dict[str, Any]]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Learn from a batch of tasks, yielding (task index, result) as each batch of tasks completes"""
+        for batch in asyncio.as_completed(self._learning_batches(tasks)):
+            for index, result in await batch:
+                yield index, result
+    
+    def _learning_batches(self, tasks: List[Dict[str, Any]]) -> List[Awaitable[List[Tuple[int, Dict[str, Any]]]]]:
+        """Build one coroutine per batch of tasks, sharing a semaphore that bounds the requests in flight"""
+        if not all(tasks):
+            raise ValueError("Task cannot be empty")
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def process_batch(start: int):
+            # one extraction request per batch of tasks, then the writes for each task
+            async with semaphore:
+                extractions = await self.extract_entities_from_tasks_batch(tasks[start:start + _TASK_BATCH_SIZE])
+            results = []
+            for offset, extraction in enumerate(extractions):
+                async with semaphore:
+                    results.append((start + offset, await self._store_extraction(extraction)))
+            return results
+        
+        # batches run concurrently, bounded so a large backlog does not flood the LLM and Neo4j
+        return [process_batch(start) for start in range(0, len(tasks), _TASK_BATCH_SIZE)]
+    
+    async def initialize_schema(self):
+        """Create the knowledge graph's constraints and indexes; safe to run on every start"""
+        return await self.kg.initialize_schema()
     
     async def answer_question(self, question: str):
         """Answer a question using the knowledge graph"""
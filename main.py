@@ -1,25 +1,20 @@
 import os
 import asyncio
-import json
+import copy
 from datetime import datetime
 from email.message import Message
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.panel import Panel
-from rich.table import Table
-from rich import box
-from rich.live import Live
-from rich.layout import Layout
 # from rich.progress import Progress, SpinnerColumn, TextColumn
-from langchain.chat_models import ChatOpenAI
 
 # Import our agents
+from agents import _json
+from agents._llm import aclose_http_client, get_llm
 from agents.analyser import Analyser
 from agents.observer import Observer
 from agents.automator import Automator
-from knowledge_graph.kg_agent import AsyncKnowledgeGraphAgent
+from knowledge_graph.kg_agent import AsyncKnowledgeGraph, AsyncKnowledgeGraphAgent
 from integrations.gmail_integration import AsyncGmailMonitor
 
 # Load environment variables
@@ -28,6 +23,47 @@ load_dotenv()
 # Rich console for pretty output
 console = Console()
 
+# knowledge graph write-behind: queued email interactions are written in batches
+# of up to this many, or whatever has arrived this many seconds after the first
+_KG_FLUSH_BATCH_SIZE = 64
+_KG_FLUSH_INTERVAL = 1.0
+
+# body of the demo's sample invoice email
+_SAMPLE_EMAIL_BODY = """Hello Alex,
+
+Please find attached our invoice #INV-2023-456 for your recent office supplies order.
+
+Invoice Details:
+- Invoice Number: INV-2023-456
+- Amount: $425.75
+- Due Date: August 15, 2025
+- Payment Terms: Net 30
+
+Please let me know if you have any questions.
+
+Best regards,
+Sarah Johnson
+Office Supplies Inc.
+"""
+
+_SAMPLE_EMAIL_TEMPLATE = None
+
+
+def _sample_email_template():
+    """Build the demo's sample email once; callers copy it and add the per-run headers"""
+    global _SAMPLE_EMAIL_TEMPLATE
+    if _SAMPLE_EMAIL_TEMPLATE is None:
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
+        template = MIMEMultipart()
+        template["From"] = "vendor@example.com"
+        template["Subject"] = "Invoice #INV-2023-456 for Office Supplies"
+        template.attach(MIMEText(_SAMPLE_EMAIL_BODY, "plain"))
+        _SAMPLE_EMAIL_TEMPLATE = template
+    return _SAMPLE_EMAIL_TEMPLATE
+
+
 class DelaApp:
     """
     Main application class for Dela POC that orchestrates all components.
@@ -35,18 +71,16 @@ class DelaApp:
     
     def __init__(self):
         """Initialize the Dela application"""
-        # Initialize components
-        self.llm = ChatOpenAI(
-            temperature=0.1,
-            model="gpt-4o",
-        )
+        # Initialize components; every agent shares this LLM and its pooled HTTP client
+        self.llm = get_llm(temperature=0.1, model="gpt-4o")
         
-        # Create knowledge graph agent
-        self.kg_agent = AsyncKnowledgeGraphAgent(
+        # Create knowledge graph agent over a single Neo4j driver (and its connection pool)
+        self.knowledge_graph = AsyncKnowledgeGraph(
             uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
             user=os.getenv("NEO4J_USER", "neo4j"),
             password=os.getenv("NEO4J_PASSWORD", "password")
         )
+        self.kg_agent = AsyncKnowledgeGraphAgent(knowledge_graph=self.knowledge_graph, llm=self.llm)
         
         # Create agents
         self.analyser = Analyser(llm=self.llm)
@@ -62,6 +96,50 @@ class DelaApp:
         # User profile (mock data)
         self.user_profile = self._load_user_profile()
         
+        # seconds to pause between demo steps so each can be read; 0 skips the pauses
+        self.demo_pause = 0.0
+        
+        # analysed emails waiting to be written to the knowledge graph
+        self._kg_queue = asyncio.Queue()
+        self._kg_flusher_task = None
+        
+    async def close(self):
+        """Finish pending knowledge graph writes, then release the Neo4j driver"""
+        if self._kg_flusher_task is not None:
+            await self._kg_queue.join()
+            self._kg_flusher_task.cancel()
+            self._kg_flusher_task = None
+        await self.knowledge_graph.close()
+    
+    def _queue_kg_update(self, email_data):
+        """Queue an analysed email for the background knowledge graph writer"""
+        if self._kg_flusher_task is None:
+            self._kg_flusher_task = asyncio.create_task(self._kg_flusher())
+        self._kg_queue.put_nowait(email_data)
+    
+    async def _kg_flusher(self):
+        """Write queued emails to the knowledge graph in batches"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._kg_queue.get()]
+            deadline = loop.time() + _KG_FLUSH_INTERVAL
+            while len(batch) < _KG_FLUSH_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._kg_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.observer.observe_email_interactions(batch)
+            except Exception as e:
+                console.print(f"[red]Error updating knowledge graph: {e}[/red]")
+            finally:
+                for _ in batch:
+                    self._kg_queue.task_done()
+    
     def _load_user_profile(self):
         """Load mock user profile data"""
         # In a real app, this would load from a database or file
@@ -95,15 +173,26 @@ class DelaApp:
         """
         # Create layout for live display
         if demo_mode:
+            # demo-only UI components, not loaded when running the monitor
+            from rich import box
+            from rich.live import Live
+            from rich.table import Table
+            
             layout = self._create_demo_layout()
             
-            with Live(layout, refresh_per_second=4, console=console):
-                # Step 1: Analyse email
-                layout["main"].update(Panel("Step 1: Analysing email...", title="Dela AI"))
-                email_data = await self.analyser.analyse_email(email_message)
+            # redraw only when a step changes what is shown, rather than polling the layout
+            with Live(layout, auto_refresh=False, console=console) as live:
+                def show(renderable):
+                    layout["main"].update(renderable)
+                    live.refresh()
+                
+                # Step 1: Analyse email and extract knowledge graph data
+                show(Panel("Step 1: Analysing email...", title="Dela AI"))
+                email_data = await self.analyser.analyse_email_full(email_message)
+                kg_data = email_data["kg_data"]
                 
                 # Update display
-                layout["main"].update(Panel(
+                show(Panel(
                     f"Email from: {email_data.get('from')}\n"
                     f"Subject: {email_data.get('subject')}\n\n"
                     f"Intent: {email_data.get('intent')}\n"
@@ -113,74 +202,62 @@ class DelaApp:
                 ))
                 
                 # Pause for demo effect
-                await asyncio.sleep(2)
+                if self.demo_pause:
+                    await asyncio.sleep(self.demo_pause)
                 
                 # Step 2: Check if it's an invoice
-                is_invoice = await self.analyser.detect_invoice(email_data)
+                is_invoice = self.analyser.detect_invoice(email_data)
                 
-                # Step 3: Extract entities for knowledge graph
-                layout["main"].update(Panel("Step 2: Extracting knowledge graph data...", title="Dela AI"))
-                kg_data = await self.analyser.extract_entities_for_kg(email_data)
-                email_data["kg_data"] = kg_data
-                
-                # Display extracted entities
+                # Step 3: Display entities extracted for knowledge graph
                 entity_table = Table(title="Extracted Entities", box=box.ROUNDED)
                 entity_table.add_column("Type")
                 entity_table.add_column("Properties")
                 
                 for entity in kg_data.get("entities", [])[:5]:  # Show first 5 entities
                     entity_type = entity.get("type", "Unknown")
-                    props = json.dumps(entity.get("properties", {}), indent=2)
+                    props = _json.dumps(entity.get("properties", {}), indent=True)
                     entity_table.add_row(entity_type, props)
                 
-                layout["main"].update(entity_table)
+                show(entity_table)
                 
                 # Pause for demo effect
-                await asyncio.sleep(2)
+                if self.demo_pause:
+                    await asyncio.sleep(self.demo_pause)
                 
-                # Step 4: Update knowledge graph
-                layout["main"].update(Panel("Step 3: Updating knowledge graph...", title="Dela AI"))
-                await self.observer.observe_email_interaction(email_data)
+                # Step 4: Update knowledge graph, in the background since the reply doesn't depend on it
+                show(Panel("Step 3: Updating knowledge graph...", title="Dela AI"))
+                self._queue_kg_update(email_data)
                 
                 # Pause for demo effect
-                await asyncio.sleep(2)
+                if self.demo_pause:
+                    await asyncio.sleep(self.demo_pause)
                 
                 # Step 5: Generate reply
-                layout["main"].update(Panel("Step 4: Generating reply...", title="Dela AI"))
-                
-                if is_invoice:
-                    # Process as invoice
-                    result = await self.automator.process_invoice(email_data, self.user_profile)
-                    if result.get("success", False):
-                        reply_data = result.get("approval_reply", {})
-                    else:
-                        reply_data = result.get("rejection_reply", {})
-                else:
-                    # Generate normal reply
-                    reply_data = await self.automator.generate_email_reply(email_data, self.user_profile)
+                show(Panel("Step 4: Generating reply...", title="Dela AI"))
+                reply_data = await self._generate_reply(email_data, is_invoice)
                 
-                # Display reply
-                layout["main"].update(Panel(
+                # Display reply while it is sent
+                show(Panel(
                     f"Subject: {reply_data.get('subject')}\n\n"
                     f"{reply_data.get('body')}",
-                    title="Generated Reply"
+                    title="Generated Reply - Step 5: Sending reply..."
                 ))
                 
                 # Step 6: Send reply (if enabled)
-                layout["main"].update(Panel("Step 5: Sending reply...", title="Dela AI"))
                 
                 if send_reply:
                     # Actually send the email
-                    success = await self.gmail_monitor.send_email(reply_data["message"])
+                    success = await self._send_reply(reply_data)
                     status = "✅ Sent successfully!" if success else "❌ Failed to send"
                 else:
                     status = "⚠️ Sending disabled (demo mode)"
                 
                 # Pause for demo effect
-                await asyncio.sleep(2)
+                if self.demo_pause:
+                    await asyncio.sleep(self.demo_pause)
                 
                 # Final summary
-                layout["main"].update(Panel(
+                show(Panel(
                     f"Email processing complete!\n\n"
                     f"- Email from {email_data.get('from')} was processed\n"
                     f"- Category: {email_data.get('category')}\n"
@@ -194,30 +271,45 @@ class DelaApp:
                 return reply_data
         else:
             # Non-demo mode, just process without the visual effects
-            email_data = await self.analyser.analyse_email(email_message)
-            is_invoice = await self.analyser.detect_invoice(email_data)
-            kg_data = await self.analyser.extract_entities_for_kg(email_data)
-            email_data["kg_data"] = kg_data
-            await self.observer.observe_email_interaction(email_data)
+            email_data = await self.analyser.analyse_email_full(email_message)
+            is_invoice = self.analyser.detect_invoice(email_data)
             
-            if is_invoice:
-                result = await self.automator.process_invoice(email_data, self.user_profile)
-                if result.get("success", False):
-                    reply_data = result.get("approval_reply", {})
-                else:
-                    reply_data = result.get("rejection_reply", {})
-            else:
-                reply_data = await self.automator.generate_email_reply(email_data, self.user_profile)
+            # the knowledge graph is updated in the background while the reply is generated
+            self._queue_kg_update(email_data)
+            reply_data = await self._generate_reply(email_data, is_invoice)
             
             # Send reply if enabled
             if send_reply:
-                await self.gmail_monitor.send_email(reply_data["message"])
+                # a failed send fails the email, so the monitor leaves it unread for a retry
+                if not await self._send_reply(reply_data):
+                    raise RuntimeError(f"Failed to send reply: {reply_data.get('subject')}")
                 console.print(f"[green]Reply sent: {reply_data.get('subject')}[/green]")
             
             return reply_data
     
+    async def _send_reply(self, reply_data):
+        """Send a generated reply; False if there is no formatted message or sending failed"""
+        message = reply_data.get("message")
+        if message is None:
+            return False
+        return await self.gmail_monitor.send_email(message["To"], message["Subject"], message.get_content())
+    
+    async def _generate_reply(self, email_data, is_invoice):
+        """Generate the reply for an analysed email, via the invoice workflow for invoices"""
+        if is_invoice:
+            # Process as invoice
+            result = await self.automator.process_invoice(email_data, self.user_profile)
+            if result.get("success", False):
+                return result.get("approval_reply", {})
+            return result.get("rejection_reply", {})
+        
+        # Generate normal reply
+        return await self.automator.generate_email_reply(email_data, self.user_profile)
+    
     def _create_demo_layout(self):
         """Create layout for demo mode"""
+        from rich.layout import Layout
+        
         layout = Layout()
         layout.split(
             Layout(name="header", size=3),
@@ -242,54 +334,62 @@ class DelaApp:
         """
         console.print(Panel("Starting Dela AI Email Automation Demo", style="bold green"))
         
-        # Create a sample email
-        sample_email = MIMEMultipart()
-        sample_email["From"] = "vendor@example.com"
+        # Create a sample email from the shared template; only the recipient,
+        # date and message ID differ between runs
+        sample_email = copy.deepcopy(_sample_email_template())
         sample_email["To"] = self.user_profile["email"]
-        sample_email["Subject"] = "Invoice #INV-2023-456 for Office Supplies"
         sample_email["Date"] = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0000")
         sample_email["Message-ID"] = f"<{datetime.now().timestamp()}@example.com>"
         
-        # Email body
-        body = """Hello Alex,
-
-Please find attached our invoice #INV-2023-456 for your recent office supplies order.
-
-Invoice Details:
-- Invoice Number: INV-2023-456
-- Amount: $425.75
-- Due Date: August 15, 2025
-- Payment Terms: Net 30
-
-Please let me know if you have any questions.
-
-Best regards,
-Sarah Johnson
-Office Supplies Inc.
-"""
-        sample_email.attach(MIMEText(body, "plain"))
-        
-        # Process the sample email
+        # Process the sample email, pausing between steps for demo effect
+        self.demo_pause = 2.0
         await self.process_email(sample_email, demo_mode=True, send_reply=send_reply)
     
-    async def run_email_monitor(self, send_replies=True):
+    async def run_email_monitor(self, send_replies=True, workers=4, queue_size=32):
         """
         Run the email monitor to process real emails
         
         Args:
             send_replies: Whether to actually send reply emails
+            workers: Number of emails processed concurrently
+            queue_size: Maximum number of received emails waiting to be processed
         """
         console.print(Panel("Starting Dela AI Email Monitor", style="bold green"))
         console.print(f"[yellow]{'✓' if send_replies else '✗'} Auto-reply is {'ENABLED' if send_replies else 'DISABLED'}[/yellow]")
         
+        # new emails are queued for a pool of workers, so monitoring doesn't wait on each
+        # email's LLM pipeline; the bounded queue holds the monitor back during a burst
+        queue = asyncio.Queue(maxsize=queue_size)
+        
+        async def worker():
+            while True:
+                email_data = await queue.get()
+                try:
+                    # the monitor delivers email data dicts; the pipeline takes a Message, and
+                    # the email is only marked read once it has been processed successfully
+                    await self.gmail_monitor.handle_email(
+                        email_data,
+                        lambda email_message: self.process_email(email_message, send_reply=send_replies)
+                    )
+                except Exception as e:
+                    console.print(f"[red]Error processing email: {e}[/red]")
+                finally:
+                    queue.task_done()
+        
         # Define callback for new emails
-        async def email_callback(email_message):
-            console.print(Panel(f"New email received: {email_message['Subject']}", style="bold blue"))
-            await self.process_email(email_message, send_reply=send_replies)
+        async def email_callback(email_messages):
+            for email_message in email_messages:
+                console.print(Panel(f"New email received: {email_message['subject']}", style="bold blue"))
+                await queue.put(email_message)
         
-        # Start monitoring
-        await self.gmail_monitor.connect()
-        await self.gmail_monitor.monitor_inbox(callback=email_callback)
+        worker_tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            # Start monitoring
+            await self.gmail_monitor.connect()
+            await self.gmail_monitor.monitor_inbox(callback=email_callback)
+        finally:
+            for task in worker_tasks:
+                task.cancel()
 
 
 async def main():
@@ -297,27 +397,41 @@ async def main():
     # Create app
     app = DelaApp()
     
-    # Check command line arguments
-    import sys
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--monitor":
-            # Run email monitor (read-only mode)
-            await app.run_email_monitor(send_replies=False)
-        elif sys.argv[1] == "--monitor-send":
-            # Run email monitor with auto-reply enabled
-            console.print(Panel("⚠️ WARNING: Auto-reply is ENABLED. Dela will send real emails.", style="bold red"))
-            await asyncio.sleep(3)  # Give user time to cancel if needed
-            await app.run_email_monitor(send_replies=True)
-        elif sys.argv[1] == "--demo-send":
-            # Run demo with real email sending
-            console.print(Panel("⚠️ WARNING: Demo will send a real email reply.", style="bold red"))
-            await asyncio.sleep(3)  # Give user time to cancel if needed
+    try:
+        # make sure knowledge graph lookups by name are index seeks, not label scans
+        await app.kg_agent.initialize_schema()
+        
+        # Check command line arguments
+        import sys
+        if len(sys.argv) > 1:
+            if sys.argv[1] == "--monitor":
+                # Run email monitor (read-only mode)
+                await app.run_email_monitor(send_replies=False)
+            elif sys.argv[1] == "--monitor-send":
+                # Run email monitor with auto-reply enabled
+                console.print(Panel("⚠️ WARNING: Auto-reply is ENABLED. Dela will send real emails.", style="bold red"))
+                await asyncio.sleep(3)  # Give user time to cancel if needed
+                await app.run_email_monitor(send_replies=True)
+            elif sys.argv[1] == "--demo-send":
+                # Run demo with real email sending
+                console.print(Panel("⚠️ WARNING: Demo will send a real email reply.", style="bold red"))
+                await asyncio.sleep(3)  # Give user time to cancel if needed
+                await app.demo_with_sample_email(send_reply=True)
+        else:
+            # Run demo without sending emails
             await app.demo_with_sample_email(send_reply=True)
-    else:
-        # Run demo without sending emails
-        await app.demo_with_sample_email(send_reply=True)
+    finally:
+        await app.close()
+
+
+async def run():
+    """Run the app, then release the shared LLM connection pool"""
+    try:
+        await main()
+    finally:
+        await aclose_http_client()
 
 
 if __name__ == "__main__":
     # Run the async main function
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run())
\ No newline at end of file
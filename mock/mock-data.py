@@ -3,8 +3,13 @@ from datetime import datetime, timedelta
 import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # mock user tasks that Lumora could learn to automate
-TASK_TYPES = [
+TASK_TYPES = (
     "email_response",
     "data_entry",
     "report_generation",
@@ -15,56 +20,59 @@ TASK_TYPES = [
     "data_analysis",
     "social_media_posting",
     "meeting_notes"
-]
+)
 
-# mock task attributes
-PRIORITIES = ["high", "medium", "low"]
-STATUSES = ["pending", "in_progress", "completed", "automated"]
-FREQUENCY = ["daily", "weekly", "monthly", "quarterly", "ad_hoc"]
-DEPARTMENTS = ["marketing", "sales", "finance", "hr", "engineering", "customer_support"]
+# mock task attributes; the category lists are never mutated, so they are tuples
+PRIORITIES = ("high", "medium", "low")
+STATUSES = ("pending", "in_progress", "completed", "automated")
+FREQUENCY = ("daily", "weekly", "monthly", "quarterly", "ad_hoc")
+DEPARTMENTS = ("marketing", "sales", "finance", "hr", "engineering", "customer_support")
 
 # mock task steps for different task types
 TASK_STEPS = {
-    "email_response": [
+    "email_response": (
         "open_email_client", "read_message", "categorize_email", "draft_response", "review_response", "send_response"
-    ],
-    "data_entry": [
+    ),
+    "data_entry": (
         "open_data_source", "extract_data", "validate_data", "format_data", "enter_data", "verify_entry"
-    ],
-    "report_generation": [
+    ),
+    "report_generation": (
         "gather_data", "analyze_data", "create_charts", "write_summary", "format_report", "distribute_report"
-    ],
-    "calendar_scheduling": [
+    ),
+    "calendar_scheduling": (
         "check_availability", "select_time_slot", "create_event", "add_participants", "set_reminders", "send_invites"
-    ],
-    "document_filing": [
+    ),
+    "document_filing": (
         "receive_document", "categorize_document", "name_file", "select_storage_location", "save_document", "update_index"
-    ],
-    "invoice_processing": [
+    ),
+    "invoice_processing": (
         "receive_invoice", "verify_details", "match_with_purchase_order", "approve_payment", "record_transaction", "archive_invoice"
-    ],
-    "customer_support_ticket": [
+    ),
+    "customer_support_ticket": (
         "receive_ticket", "categorize_issue", "research_solution", "draft_response", "resolve_ticket", "follow_up"
-    ],
-    "data_analysis": [
+    ),
+    "data_analysis": (
         "collect_data", "clean_data", "analyze_trends", "create_visualizations", "interpret_results", "prepare_findings"
-    ],
-    "social_media_posting": [
+    ),
+    "social_media_posting": (
         "plan_content", "create_media", "write_caption", "select_hashtags", "schedule_post", "monitor_engagement"
-    ],
-    "meeting_notes": [
+    ),
+    "meeting_notes": (
         "prepare_template", "record_key_points", "note_action_items", "organize_notes", "distribute_to_participants", "follow_up_on_actions"
-    ]
+    )
 }
 
 # entities that might appear in tasks (for knowledge graph construction)
 ENTITIES = {
-    "people": ["John Smith", "Maria Garcia", "Wei Chen", "Aisha Patel", "Robert Johnson", "Emma Williams"],
-    "tools": ["Outlook", "Excel", "Salesforce", "Jira", "Slack", "Google Docs", "Asana", "Tableau", "Zoom", "QuickBooks"],
-    "documents": ["Invoice", "Report", "Presentation", "Contract", "Proposal", "Specification", "Manual"],
-    "systems": ["CRM", "ERP", "HRIS", "CMS", "Accounting System", "Project Management Tool", "Ticketing System"]
+    "people": ("John Smith", "Maria Garcia", "Wei Chen", "Aisha Patel", "Robert Johnson", "Emma Williams"),
+    "tools": ("Outlook", "Excel", "Salesforce", "Jira", "Slack", "Google Docs", "Asana", "Tableau", "Zoom", "QuickBooks"),
+    "documents": ("Invoice", "Report", "Presentation", "Contract", "Proposal", "Specification", "Manual"),
+    "systems": ("CRM", "ERP", "HRIS", "CMS", "Accounting System", "Project Management Tool", "Ticketing System")
 }
 
+# reference time for the learned automations' last run dates
+_IMPORT_NOW = datetime.now()
+
 # define learned automation patterns (what Lumora has already learned)
 LEARNED_AUTOMATIONS = [
     {
@@ -81,7 +89,7 @@ LEARNED_AUTOMATIONS = [
         ],
         "success_rate": 0.95,
         "times_executed": 12,
-        "last_executed": (datetime.now() - timedelta(days=random.randint(1, 7))).strftime("%Y-%m-%d"),
+        "last_executed": (_IMPORT_NOW - timedelta(days=random.randint(1, 7))).strftime("%Y-%m-%d"),
         "average_time_saved": 45  # minutes
     },
     {
@@ -99,7 +107,7 @@ LEARNED_AUTOMATIONS = [
         ],
         "success_rate": 0.88,
         "times_executed": 23,
-        "last_executed": (datetime.now() - timedelta(days=random.randint(1, 5))).strftime("%Y-%m-%d"),
+        "last_executed": (_IMPORT_NOW - timedelta(days=random.randint(1, 5))).strftime("%Y-%m-%d"),
         "average_time_saved": 32  # minutes
     },
     {
@@ -115,7 +123,7 @@ LEARNED_AUTOMATIONS = [
         ],
         "success_rate": 0.92,
         "times_executed": 156,
-        "last_executed": (datetime.now() - timedelta(hours=random.randint(1, 24))).strftime("%Y-%m-%d %H:%M:%S"),
+        "last_executed": (_IMPORT_NOW - timedelta(hours=random.randint(1, 24))).strftime("%Y-%m-%d %H:%M:%S"),
         "average_time_saved": 8  # minutes
     },
     {
@@ -131,11 +139,21 @@ LEARNED_AUTOMATIONS = [
         ],
         "success_rate": 0.85,
         "times_executed": 18,
-        "last_executed": (datetime.now() - timedelta(days=random.randint(1, 10))).strftime("%Y-%m-%d"),
+        "last_executed": (_IMPORT_NOW - timedelta(days=random.randint(1, 10))).strftime("%Y-%m-%d"),
         "average_time_saved": 25  # minutes
     }
 ]
 
+# learning statistics over LEARNED_AUTOMATIONS, which never changes after import
+_TOTAL_TIME_SAVED = sum(a["average_time_saved"] * a["times_executed"] for a in LEARNED_AUTOMATIONS)
+_AVG_SUCCESS_RATE = (sum(a["success_rate"] * a["times_executed"] for a in LEARNED_AUTOMATIONS) /
+                     sum(a["times_executed"] for a in LEARNED_AUTOMATIONS))
+
+# learned automations grouped by the task type they handle
+_AUTOMATIONS_BY_TYPE = {}
+for _automation in LEARNED_AUTOMATIONS:
+    _AUTOMATIONS_BY_TYPE.setdefault(_automation["task_type"], []).append(_automation)
+
 # user preferences that Lumora has learned
 USER_PREFERENCES = {
     "communication": {
@@ -163,56 +181,80 @@ USER_PREFERENCES = {
     }
 }
 
-def generate_mock_task(task_id, include_automation_status=True):
-    """Generate a single mock task with realistic attributes"""
-    task_type = random.choice(TASK_TYPES)
+# per-task-type steps and preferred priority, indexed like TASK_TYPES
+_STEPS_BY_TYPE_IDX = tuple(TASK_STEPS.get(t, ("generic_step_1", "generic_step_2", "generic_step_3")) for t in TASK_TYPES)
+_PRIORITY_BY_TYPE_IDX = tuple(USER_PREFERENCES["task_priorities"].get(t) for t in TASK_TYPES)
+
+def _format_timestamp(ts):
+    """Format a datetime as "%Y-%m-%d %H:%M:%S" without going through strftime"""
+    return f"{ts.year:04d}-{ts.month:02d}-{ts.day:02d} {ts.hour:02d}:{ts.minute:02d}:{ts.second:02d}"
+
+def generate_mock_task(task_id, include_automation_status=True, now=None, task_type_idx=None, days_ago=None, frequency=None, department=None,
+                       entity_counts=None, rng=None, detail_probability=1.0):
+    """
+    Generate a single mock task with realistic attributes, with timestamps relative to now; fields left as None are drawn from rng.
+    With probability 1 - detail_probability, recorded steps are summarized as a steps_count instead of listed.
+    """
+    rng = rng or random
+    if task_type_idx is None:
+        task_type_idx = rng.randrange(len(TASK_TYPES))
+    task_type = TASK_TYPES[task_type_idx]
     
-    # create date within last 30 days
-    days_ago = random.randint(0, 30)
-    created_date = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    # create date within last 30 days; all of the task's timestamps derive from it
+    if days_ago is None:
+        days_ago = rng.randint(0, 30)
+    created = (now or datetime.now()) - timedelta(days=days_ago)
+    created_date = created.date().isoformat()
     
     # generate steps performed based on task type
     steps_performed = []
-    if random.random() > 0.3:  # 70% of tasks have recorded steps
-        available_steps = TASK_STEPS.get(task_type, ["generic_step_1", "generic_step_2", "generic_step_3"])
-        num_steps = min(len(available_steps), random.randint(2, len(available_steps)))
+    steps_count = None
+    if rng.random() > 0.3:  # 70% of tasks have recorded steps
+        available_steps = _STEPS_BY_TYPE_IDX[task_type_idx]
+        num_steps = min(len(available_steps), rng.randint(2, len(available_steps)))
         selected_steps = available_steps[:num_steps]  # take steps in order
         
+        # only draw when sampling is on, so the default leaves seeded output unchanged
+        if detail_probability < 1.0 and rng.random() >= detail_probability:
+            steps_count = num_steps
+            selected_steps = ()
+        
         for i, step_name in enumerate(selected_steps):
             steps_performed.append({
                 "step_id": i+1,
                 "action": step_name,
-                "timestamp": (datetime.now() - timedelta(days=days_ago, 
-                                                        hours=random.randint(0, 23),
-                                                        minutes=random.randint(0, 59))).strftime("%Y-%m-%d %H:%M:%S"),
-                "result": random.choice(["success", "partial", "failed"]) if random.random() > 0.8 else "success"
+                "timestamp": _format_timestamp(created - timedelta(hours=rng.randint(0, 23),
+                                                                   minutes=rng.randint(0, 59))),
+                "result": rng.choice(["success", "partial", "failed"]) if rng.random() > 0.8 else "success"
             })
     
-    # Add relevant entities to the task
+    # Add relevant entities to the task; entity_counts holds the people, tools, documents and systems sample sizes
+    if entity_counts is None:
+        entity_counts = (rng.randint(0, 2), rng.randint(1, 3), rng.randint(0, 2), rng.randint(0, 2))
+    num_people, num_tools, num_documents, num_systems = entity_counts
     task_entities = {
-        "people": random.sample(ENTITIES["people"], random.randint(0, 2)),
-        "tools": random.sample(ENTITIES["tools"], random.randint(1, 3)),
-        "documents": random.sample(ENTITIES["documents"], random.randint(0, 2)) if random.random() > 0.5 else [],
-        "systems": random.sample(ENTITIES["systems"], random.randint(0, 2)) if random.random() > 0.5 else []
+        "people": rng.sample(ENTITIES["people"], num_people),
+        "tools": rng.sample(ENTITIES["tools"], num_tools),
+        "documents": rng.sample(ENTITIES["documents"], num_documents) if rng.random() > 0.5 else [],
+        "systems": rng.sample(ENTITIES["systems"], num_systems) if rng.random() > 0.5 else []
     }
     
     # determine if this task was automated
-    was_automated = random.random() > 0.7 if include_automation_status else False
-    status = "automated" if was_automated else random.choice(["pending", "in_progress", "completed"])
+    was_automated = rng.random() > 0.7 if include_automation_status else False
+    status = "automated" if was_automated else rng.choice(["pending", "in_progress", "completed"])
     
     # if automated, link to one of the learned automations
     automation_info = None
-    if was_automated and LEARNED_AUTOMATIONS:
-        matching_automations = [a for a in LEARNED_AUTOMATIONS if a["task_type"] == task_type]
+    if was_automated:
+        matching_automations = _AUTOMATIONS_BY_TYPE.get(task_type)
         if matching_automations:
-            selected_automation = random.choice(matching_automations)
+            selected_automation = rng.choice(matching_automations)
             automation_info = {
                 "automation_id": selected_automation["automation_id"],
                 "name": selected_automation["name"],
-                "execution_time": (datetime.now() - timedelta(days=days_ago-1, 
-                                                            hours=random.randint(0, 12))).strftime("%Y-%m-%d %H:%M:%S"),
-                "success": random.random() < selected_automation["success_rate"],
-                "time_saved": selected_automation["average_time_saved"] * (0.8 + random.random() * 0.4)  # +/- 20%
+                "execution_time": _format_timestamp(created + timedelta(days=1) - timedelta(hours=rng.randint(0, 12))),
+                "success": rng.random() < selected_automation["success_rate"],
+                "time_saved": selected_automation["average_time_saved"] * (0.8 + rng.random() * 0.4)  # +/- 20%
             }
     
     # generate task metadata
@@ -220,20 +262,20 @@ def generate_mock_task(task_id, include_automation_status=True):
         "task_id": task_id,
         "task_type": task_type,
         "title": f"{task_type.replace('_', ' ').title()} Task {task_id}",
-        "description": f"This is a {task_type.replace('_', ' ')} task that requires processing {random.choice(task_entities['documents'] if task_entities['documents'] else ['data'])} using {', '.join(task_entities['tools'][:1])}.",
+        "description": f"This is a {task_type.replace('_', ' ')} task that requires processing {rng.choice(task_entities['documents'] if task_entities['documents'] else ['data'])} using {', '.join(task_entities['tools'][:1])}.",
         "created_date": created_date,
-        "priority": USER_PREFERENCES["task_priorities"].get(task_type, random.choice(PRIORITIES)),
+        "priority": _PRIORITY_BY_TYPE_IDX[task_type_idx] or rng.choice(PRIORITIES),
         "status": status,
-        "frequency": random.choice(FREQUENCY),
-        "department": random.choice(DEPARTMENTS),
+        "frequency": frequency or rng.choice(FREQUENCY),
+        "department": department or rng.choice(DEPARTMENTS),
         "steps_performed": steps_performed,
-        "time_spent_minutes": 0 if was_automated else random.randint(5, 120),
-        "automation_candidate": True if was_automated else random.random() > 0.5,
+        "time_spent_minutes": 0 if was_automated else rng.randint(5, 120),
+        "automation_candidate": True if was_automated else rng.random() > 0.5,
         "entities": task_entities,
         "metadata": {
-            "source_system": random.choice(["email", "slack", "jira", "salesforce", "internal_tool"]),
-            "complexity": random.choice(["simple", "moderate", "complex"]),
-            "dependencies": random.sample(TASK_TYPES, random.randint(0, 3)) if random.random() > 0.7 else []
+            "source_system": rng.choice(["email", "slack", "jira", "salesforce", "internal_tool"]),
+            "complexity": rng.choice(["simple", "moderate", "complex"]),
+            "dependencies": rng.sample(TASK_TYPES, rng.randint(0, 3)) if rng.random() > 0.7 else []
         }
     }
     
@@ -241,36 +283,60 @@ def generate_mock_task(task_id, include_automation_status=True):
     if automation_info:
         task["automation"] = automation_info
     
+    # steps that were recorded but not listed
+    if steps_count is not None:
+        task["steps_count"] = steps_count
+    
     return task
 
-def generate_task_patterns():
+def generate_task_patterns(rng=None):
     """Generate patterns of tasks that are frequently performed together"""
+    rng = rng or random
     patterns = []
     
     # create 3-5 common patterns
-    num_patterns = random.randint(3, 5)
+    num_patterns = rng.randint(3, 5)
     for i in range(num_patterns):
-        pattern_tasks = random.sample(TASK_TYPES, random.randint(2, 4))
+        pattern_tasks = rng.sample(TASK_TYPES, rng.randint(2, 4))
         patterns.append({
             "pattern_id": i+1,
             "name": f"Common Pattern {i+1}",
             "tasks": pattern_tasks,
-            "frequency": random.choice(FREQUENCY),
-            "typical_sequence": True if random.random() > 0.3 else False,
-            "automation_potential": random.randint(1, 10) / 10,  # Score between 0.1 and 1.0
-            "confidence": random.randint(70, 95) / 100  # Confidence in this pattern
+            "frequency": rng.choice(FREQUENCY),
+            "typical_sequence": True if rng.random() > 0.3 else False,
+            "automation_potential": rng.randint(1, 10) / 10,  # Score between 0.1 and 1.0
+            "confidence": rng.randint(70, 95) / 100  # Confidence in this pattern
         })
     
     return patterns
 
-def generate_mock_dataset(num_tasks=50):
-    """Generate a set of mock tasks"""
-    tasks = []
-    for i in range(1, num_tasks+1):
-        tasks.append(generate_mock_task(i))
+def generate_mock_dataset(num_tasks=50, seed=None, detail_probability=1.0):
+    """
+    Generate a set of mock tasks; the same seed gives the same tasks and patterns, up to their timestamps relative to now.
+    Lower detail_probability to list steps for only that fraction of tasks and shrink the output.
+    """
+    rng = random.Random(seed)
+    
+    # one clock read for the whole dataset
+    now = datetime.now()
+    
+    # draw the per-task categorical fields for the whole dataset at once
+    task_type_indices = rng.choices(range(len(TASK_TYPES)), k=num_tasks)
+    days_ago = rng.choices(range(31), k=num_tasks)
+    frequencies = rng.choices(FREQUENCY, k=num_tasks)
+    departments = rng.choices(DEPARTMENTS, k=num_tasks)
+    entity_counts = zip(rng.choices(range(3), k=num_tasks), rng.choices(range(1, 4), k=num_tasks),
+                        rng.choices(range(3), k=num_tasks), rng.choices(range(3), k=num_tasks))
+    
+    tasks = [
+        generate_mock_task(i, now=now, task_type_idx=task_type_idx, days_ago=days, frequency=frequency, department=department,
+                           entity_counts=counts, rng=rng, detail_probability=detail_probability)
+        for i, task_type_idx, days, frequency, department, counts
+        in zip(range(1, num_tasks+1), task_type_indices, days_ago, frequencies, departments, entity_counts)
+    ]
     
     # generate task patterns
-    patterns = generate_task_patterns()
+    patterns = generate_task_patterns(rng)
     
     # create a dataset that represents what Lumora has already learned
     dataset = {
@@ -279,27 +345,33 @@ def generate_mock_dataset(num_tasks=50):
         "learned_automations": LEARNED_AUTOMATIONS,
         "user_preferences": USER_PREFERENCES,
         "learning_statistics": {
-            "total_tasks_observed": num_tasks + random.randint(100, 500),
+            "total_tasks_observed": num_tasks + rng.randint(100, 500),
             "total_tasks_automated": sum(1 for task in tasks if task.get("status") == "automated"),
-            "total_time_saved_minutes": sum(a["average_time_saved"] * a["times_executed"] for a in LEARNED_AUTOMATIONS),
-            "automation_success_rate": sum(a["success_rate"] * a["times_executed"] for a in LEARNED_AUTOMATIONS) / 
-                                      sum(a["times_executed"] for a in LEARNED_AUTOMATIONS),
+            "total_time_saved_minutes": _TOTAL_TIME_SAVED,
+            "automation_success_rate": _AVG_SUCCESS_RATE,
             "learning_period_days": 90
         },
-        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "generated_at": now.strftime("%Y-%m-%d %H:%M:%S")
     }
     
     return dataset
 
-def save_mock_data(filename="mock_tasks.json", num_tasks=50):
+def save_mock_data(filename="mock_tasks.json", num_tasks=50, seed=None, detail_probability=1.0):
     """Generate and save mock data to a JSON file"""
-    data = generate_mock_dataset(num_tasks)
+    data = generate_mock_dataset(num_tasks, seed=seed, detail_probability=detail_probability)
     
-    # create directory if it doesn't exist
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # create directory if it doesn't exist; a bare filename goes in the working directory
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
     
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    # orjson serializes straight to bytes; the stdlib fallback streams to the file
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
     print(f"Generated {num_tasks} mock tasks and saved to {filename}")
     return data
 
@@ -1,11 +1,34 @@
 # rag/graph_rag.py
 from langchain_community.vectorstores import Milvus
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.retrievers import BaseRetriever
 from langchain.schema import Document
-from typing import List, Dict, Any
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+import copy
+import math
+import operator
+import re
+import time
 import neo4j
 
+# node labels and property keys are interpolated into Cypher, so they must be plain identifiers
+_IDENTIFIER_RE = re.compile(r'[A-Za-z][A-Za-z0-9_]*\Z')
+
+# hybrid search results kept for exact repeats of (query, k_vector, graph_depth)
+_EXACT_CACHE_SIZE = 256
+
+# seconds a cached hybrid search result is served; the graph keeps changing under it
+_CACHE_TTL = 60.0
+
+# recent query embeddings compared against for near-duplicate queries, when enabled
+_SEMANTIC_CACHE_SIZE = 64
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Scale a vector to unit length, so a dot product is its cosine similarity"""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
 class GraphRAG:
     """
     GraphRAG implementation that combines vector similarity search with
@@ -14,11 +37,18 @@ class GraphRAG:
     
     def __init__(self, milvus_host, milvus_port, collection_name, 
                  neo4j_uri, neo4j_user, neo4j_password, 
-                 embedding_model=None):
-        """Initialize GraphRAG with Milvus and Neo4j connections"""
+                 embedding_model=None, cache_ttl: float = _CACHE_TTL,
+                 semantic_threshold: Optional[float] = None):
+        """
+        Initialize GraphRAG with Milvus and Neo4j connections
+        
+        hybrid_search results are cached for cache_ttl seconds (0 disables the cache).
+        Setting semantic_threshold also lets a query reuse the result of a recent
+        query whose embedding has at least that cosine similarity; queries that
+        differ only in an entity or date can score above 0.95, so keep it close to 1.
+        """
         # Initialize embedding model
         self.embeddings = embedding_model or OpenAIEmbeddings()
-        self.retriever = BaseRetriever()
         
         # Initialize Milvus vector store
         self.vector_store = Milvus(
@@ -27,78 +57,142 @@ class GraphRAG:
             connection_args={"host": milvus_host, "port": milvus_port}
         )
         
-        # Initialize Neo4j connection
-        self.driver = neo4j.GraphDatabase.driver(
+        # Initialize Neo4j connection; the async driver pools connections across concurrent searches
+        self.driver = neo4j.AsyncGraphDatabase.driver(
             neo4j_uri, auth=(neo4j_user, neo4j_password)
         )
+        
+        # hybrid search caches: exact LRU of (expiry, result), and
+        # (unit embedding, k_vector, graph_depth, expiry, result) entries
+        self.cache_ttl = cache_ttl
+        self.semantic_threshold = semantic_threshold
+        self._exact_cache = OrderedDict()
+        self._semantic_cache = deque(maxlen=_SEMANTIC_CACHE_SIZE)
+        
+        # Cypher text by (entity_type, depth, property keys), so repeats reuse Neo4j's plan cache
+        self._cypher_cache = {}
     
     def add_documents(self, documents: List[Document]):
         """Add documents to both vector store and knowledge graph"""
         # Add to vector store
         self.vector_store.add_documents(documents)
         
+        # new documents can change any cached search result
+        self.invalidate_cache()
+        
         # Extract entities and relationships for knowledge graph
         # This would typically be handled by the KG Agent
         return f"Added {len(documents)} documents to vector store"
     
-    def vector_search(self, query: str, k: int = 5):
+    async def vector_search(self, query: str, k: int = 5):
         """Perform vector similarity search"""
-        return self.vector_store.similarity_search(query, k=k, retriever=self.retriever)
+        return await self.vector_store.asimilarity_search(query, k=k)
     
-    def graph_search(self, entity_type: str, properties: Dict[str, Any], depth: int = 2):
+    async def graph_search(self, entity_type: str, properties: Dict[str, Any], depth: int = 2):
         """Perform graph-based search starting from an entity"""
-        with self.driver.session() as session:
+        key = (entity_type, depth, tuple(sorted(properties)))
+        query = self._cypher_cache.get(key)
+        if query is None:
+            for name in (entity_type, *properties):
+                if not _IDENTIFIER_RE.match(name):
+                    raise ValueError(f"Invalid Cypher identifier: {name}")
+            
             # Build match clause for the starting entity
-            props_str = " AND ".join([f"e.{k} = ${k}" for k in properties.keys()])
+            props_str = " AND ".join([f"e.{k} = ${k}" for k in key[2]])
             
             # Query to find connected entities up to specified depth
-            query = f"""
-            MATCH path = (e:{entity_type})-[*1..{depth}]-(connected)
+            query = self._cypher_cache[key] = f"""
+            MATCH path = (e:{entity_type})-[*1..{int(depth)}]-(connected)
             WHERE {props_str}
             RETURN path
             """
+        
+        async with self.driver.session() as session:
+            result = await session.run(query, **properties)
+            return [dict(record) async for record in result]
+    
+    async def task_graph_search(self, task_ids: List[Any], depth: int = 2):
+        """Perform graph-based search starting from several tasks in one round-trip"""
+        if not task_ids:
+            return []
+        
+        async with self.driver.session() as session:
+            # depth can't be a query parameter, only the ids are
+            query = f"""
+            UNWIND $task_ids AS task_id
+            MATCH path = (e:Task {{task_id: task_id}})-[*1..{int(depth)}]-(connected)
+            RETURN path
+            """
             
-            result = session.run(query, **properties)
-            return [dict(record) for record in result]
+            result = await session.run(query, task_ids=task_ids)
+            return [dict(record) async for record in result]
     
-    def hybrid_search(self, query: str, k_vector: int = 3, graph_depth: int = 2):
+    async def hybrid_search(self, query: str, k_vector: int = 3, graph_depth: int = 2):
         """
         Perform hybrid search combining vector similarity and graph traversal
         1. Find relevant documents via vector search
         2. Extract entities from those documents
         3. Use graph traversal to find related entities
         4. Combine and rank results
+        
+        Results are cached for cache_ttl seconds (see __init__); each call
+        gets its own copy.
         """
-        # Step 1: Vector similarity search
-        vector_results = self.vector_search(query, k=k_vector)
-        
-        # Step 2: Extract entities from vector results
-        entities = []
-        for doc in vector_results:
-            if 'task_id' in doc.metadata:
-                entities.append({
-                    'type': 'Task',
-                    'properties': {'task_id': doc.metadata['task_id']}
-                })
-        
-        # Step 3: Graph traversal for each entity
-        graph_results = []
-        for entity in entities:
-            graph_results.extend(
-                self.graph_search(
-                    entity['type'], 
-                    entity['properties'],
-                    depth=graph_depth
-                )
-            )
+        now = time.monotonic()
+        key = (query, k_vector, graph_depth)
+        cached = self._exact_cache.get(key)
+        if cached is not None:
+            expires, results = cached
+            if expires > now:
+                self._exact_cache.move_to_end(key)
+                return copy.deepcopy(results)
+            del self._exact_cache[key]
+        
+        query_embedding = await self.embeddings.aembed_query(query)
+        # the normalized embedding is only needed by the opt-in semantic tier
+        embedding = _normalize(query_embedding) if self.semantic_threshold is not None else None
+        if embedding is not None:
+            for cached_embedding, cached_k, cached_depth, expires, results in self._semantic_cache:
+                if expires > now and (cached_k, cached_depth) == (k_vector, graph_depth) and \
+                        sum(map(operator.mul, embedding, cached_embedding)) >= self.semantic_threshold:
+                    self._cache_result(key, expires, results)
+                    return copy.deepcopy(results)
+        
+        # Step 1: Vector similarity search, reusing the embedding computed for the cache lookup
+        vector_results = await self.vector_store.asimilarity_search_by_vector(query_embedding, k=k_vector)
+        
+        # Step 2: Extract task ids from vector results; chunks of one document share an id, so traverse each once
+        task_ids = list(dict.fromkeys(doc.metadata['task_id'] for doc in vector_results if 'task_id' in doc.metadata))
+        
+        # Step 3: Graph traversal for all tasks in one query
+        graph_results = await self.task_graph_search(task_ids, depth=graph_depth)
         
         # Step 4: Combine and rank results
         # For simplicity, we'll just return both sets of results
-        return {
+        results = {
             'vector_results': vector_results,
             'graph_results': graph_results
         }
+        
+        if self.cache_ttl > 0:
+            expires = now + self.cache_ttl
+            self._cache_result(key, expires, copy.deepcopy(results))
+            if embedding is not None:
+                self._semantic_cache.append((embedding, k_vector, graph_depth, expires, self._exact_cache[key][1]))
+        return results
+    
+    def _cache_result(self, key, expires, results):
+        """Store a hybrid search result in the exact cache, evicting the least recently used"""
+        self._exact_cache[key] = (expires, results)
+        self._exact_cache.move_to_end(key)
+        if len(self._exact_cache) > _EXACT_CACHE_SIZE:
+            self._exact_cache.popitem(last=False)
+    
+    def invalidate_cache(self):
+        """Drop all cached hybrid search results, e.g. after writing to the graph"""
+        self._exact_cache.clear()
+        self._semantic_cache.clear()
     
-    def close(self):
+    async def close(self):
         """Close connections"""
-        self.driver.close()
\ No newline at end of file
+        await self.driver.close()
\ No newline at end of file
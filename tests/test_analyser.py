@@ -0,0 +1,92 @@
+import asyncio
+import email
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+
+from agents import _llm_cache
+from agents.analyser import Analyser
+
+
+def _analysis(summary):
+    return {"intent": "pay", "category": "invoice", "priority": "high", "sentiment": "neutral", "summary": summary}
+
+
+class _BatchLLM:
+    model_name = "fake"
+
+    def __init__(self):
+        self.prompts = []
+
+    def with_structured_output(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        return SimpleNamespace(content=json.dumps({"results": [
+            {"id": 0, "analysis": _analysis("batched 0")},
+            {"id": 1, "analysis": _analysis("batched 1")},
+        ]}))
+
+
+def _email(n):
+    return {"from": f"vendor{n}@example.com", "to": "me@example.com", "subject": f"Invoice {n}",
+            "date": "Mon, 1 Jan 2024 00:00:00 +0000", "content": f"Amount due: {n}00"}
+
+
+def test_batched_analyses_are_cached_apart_from_single_ones(monkeypatch):
+    store = {}
+    monkeypatch.setattr(_llm_cache, "get", store.get)
+    monkeypatch.setattr(_llm_cache, "put", store.__setitem__)
+    llm = _BatchLLM()
+    analyser = Analyser(llm=llm)
+    emails = [_email(0), _email(1)]
+
+    results = asyncio.run(analyser._analyse_contents_batch(emails))
+
+    assert [r["summary"] for r in results] == ["batched 0", "batched 1"]
+    assert "me@example.com" in llm.prompts[0]
+    assert analyser._cache_key("analyse_batch", emails[0]) in store
+    assert analyser._cache_key("analyse", emails[0]) not in store
+
+
+def test_analyse_many_bounds_concurrency_and_keeps_order():
+    analyser = Analyser(llm=_BatchLLM())
+    inflight = []
+    peak = []
+
+    async def analyse_email(email_message):
+        inflight.append(email_message)
+        peak.append(len(inflight))
+        await asyncio.sleep(0.01)
+        inflight.remove(email_message)
+        return {"id": email_message}
+
+    analyser.analyse_email = analyse_email
+
+    results = asyncio.run(analyser.analyse_many(list(range(10)), max_concurrent=3))
+
+    assert [r["id"] for r in results] == list(range(10))
+    assert max(peak) == 3
+
+
+def test_metadata_only_skips_the_body_and_still_detects_invoices():
+    analyser = Analyser(llm=_BatchLLM())
+    message = email.message_from_bytes(
+        b"From: vendor@example.com\r\nTo: me@example.com\r\nSubject: Invoice 42\r\n\r\nAmount due: 100\r\n"
+    )
+
+    def no_body(email_message):
+        raise AssertionError("body decoded")
+
+    analyser._extract_email_content = no_body
+
+    metadata = analyser.analyse_email_metadata_only(message)
+
+    assert metadata["subject"] == "Invoice 42"
+    assert "content" not in metadata
+    assert analyser.detect_invoice(metadata)
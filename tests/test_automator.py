@@ -0,0 +1,112 @@
+import asyncio
+import email
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from agents.automator import Automator
+
+
+def test_format_email_reply_accepts_folded_headers():
+    # message_from_bytes keeps the folding line break in long header values
+    original = email.message_from_bytes(
+        b"From: Accounts Payable Department of Example Corporation\r\n <ap@example.com>\r\n"
+        b"To: me@example.org\r\n"
+        b"Subject: Invoice\r\n"
+        b"\r\n"
+        b"Please see attached.\r\n"
+    )
+    assert "\n" in original["From"]
+
+    reply = Automator._format_email_reply(None, to=original["From"], from_addr=original["To"],
+                                          subject="Re: Invoice", body="Thanks, received.")
+
+    assert reply["To"].addresses[0].addr_spec == "ap@example.com"
+    assert reply["From"] == "me@example.org"
+    assert reply.get_content().strip() == "Thanks, received."
+
+
+class _Observer:
+    async def get_user_preferences(self, context):
+        return {}
+
+
+class _StreamingLLM:
+    async def astream(self, messages):
+        for chunk in ['{"subject": "Re: In', 'voice", "bo', 'dy": "Thanks {received}."}']:
+            yield SimpleNamespace(content=chunk)
+
+
+def test_stream_email_reply_yields_fields_as_they_complete():
+    automator = Automator(_Observer(), llm=_StreamingLLM())
+    email_data = {"from": "ap@example.com", "to": "me@example.org", "subject": "Invoice", "content": "Please pay."}
+
+    async def collect():
+        return [field async for field in automator.stream_email_reply(email_data, {})]
+
+    assert asyncio.run(collect()) == [("subject", "Re: Invoice"), ("body", "Thanks {received}.")]
+
+
+class _ReplyLLM:
+    def with_structured_output(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def ainvoke(self, messages):
+        return SimpleNamespace(content='{"subject": "Re: Invoice", "body": "Thanks.", "summary": "ack"}')
+
+
+def test_generate_email_reply_builds_prompt_while_preferences_load():
+    events = []
+
+    class Observer:
+        async def get_user_preferences(self, context):
+            events.append("lookup started")
+            await asyncio.sleep(0.01)
+            events.append("lookup done")
+            return {"tone": "formal"}
+
+        async def observe_email_interaction(self, email_data, reply_data):
+            pass
+
+    automator = Automator(Observer(), llm=_ReplyLLM())
+    build = automator._reply_prompt_fields
+
+    def reply_prompt_fields(email_data, user_profile):
+        events.append("prompt built")
+        return build(email_data, user_profile)
+
+    automator._reply_prompt_fields = reply_prompt_fields
+    email_data = {"from": "ap@example.com", "to": "me@example.org", "subject": "Invoice", "content": "Please pay."}
+
+    reply = asyncio.run(automator.generate_email_reply(email_data, {}))
+
+    assert reply["body"] == "Thanks."
+    assert events == ["lookup started", "prompt built", "lookup done"]
+
+
+@pytest.mark.parametrize("priority, calls", [("low", 1), ("High", 2)])
+def test_high_priority_replies_bypass_the_reply_cache(priority, calls):
+    class Observer:
+        async def get_user_preferences(self, context):
+            return {}
+
+        async def observe_email_interaction(self, email_data, reply_data):
+            pass
+
+    class LLM(_ReplyLLM):
+        invocations = 0
+
+        async def ainvoke(self, messages):
+            LLM.invocations += 1
+            return await super().ainvoke(messages)
+
+    automator = Automator(Observer(), llm=LLM())
+    email_data = {"from": "ap@example.com", "to": "me@example.org", "subject": "Invoice",
+                  "content": "Please pay.", "priority": priority}
+
+    for _ in range(2):
+        asyncio.run(automator.generate_email_reply(dict(email_data), {}))
+
+    assert LLM.invocations == calls
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from agents._batching import AsyncBatcher, BatchingLLMClient
+
+
+def _batcher(calls, max_batch_size=3, max_wait_ms=10_000):
+    async def batch_fn(items):
+        calls.append(list(items))
+        return [item * 10 if item >= 0 else ValueError(item) for item in items]
+
+    return AsyncBatcher(batch_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+def test_batcher_flushes_when_the_batch_is_full():
+    calls = []
+
+    async def run():
+        batcher = _batcher(calls)
+        # max_wait_ms is far off, so only the size limit can flush these
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3))), timeout=1)
+
+    assert asyncio.run(run()) == [0, 10, 20]
+    assert calls == [[0, 1, 2]]
+
+
+def test_batcher_flushes_after_the_wait():
+    calls = []
+
+    async def run():
+        batcher = _batcher(calls, max_batch_size=8, max_wait_ms=10)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2))
+
+    assert asyncio.run(run()) == [10, 20]
+    assert calls == [[1, 2]]
+
+
+def test_batcher_reports_item_errors_to_their_caller_only():
+    async def run():
+        batcher = _batcher([], max_batch_size=2)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(-1), return_exceptions=True)
+
+    ok, failed = asyncio.run(run())
+    assert ok == 10
+    assert isinstance(failed, ValueError)
+
+
+def test_batcher_reports_batch_errors_to_every_caller():
+    async def batch_fn(items):
+        raise RuntimeError("provider down")
+
+    async def run():
+        batcher = AsyncBatcher(batch_fn, max_batch_size=2)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+
+def _client():
+    return BatchingLLMClient(llm=object(), max_batch=8, max_wait_ms=5)
+
+
+def test_client_starts_short_bins_first_and_high_priority_first():
+    started = []
+
+    def call(name, delay=0):
+        async def run():
+            started.append(name)
+            await asyncio.sleep(delay)
+            return name
+        return run
+
+    async def run():
+        client = _client()
+        return await asyncio.gather(
+            client.submit(call("long"), est_out_tokens=1000),
+            client.submit(call("short-low"), priority=0, est_out_tokens=50),
+            client.submit(call("short-high"), priority=5, est_out_tokens=50),
+            client.submit(call("medium"), est_out_tokens=200),
+        )
+
+    assert asyncio.run(run()) == ["long", "short-low", "short-high", "medium"]
+    assert started == ["short-high", "short-low", "medium", "long"]
+
+
+def test_client_delivers_short_results_before_long_calls_finish():
+    async def run():
+        client = _client()
+        release = asyncio.Event()
+
+        async def long_call():
+            await release.wait()
+            return "long"
+
+        async def short_call():
+            return "short"
+
+        long_result = asyncio.ensure_future(client.submit(long_call, est_out_tokens=1000))
+        short_result = await asyncio.wait_for(client.submit(short_call, est_out_tokens=10), timeout=1)
+        assert not long_result.done()
+        release.set()
+        return short_result, await long_result
+
+    assert asyncio.run(run()) == ("short", "long")
+
+
+def test_client_propagates_errors_and_cancellation_to_their_caller_only():
+    async def fails():
+        raise ValueError("bad request")
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        client = _client()
+        return await asyncio.gather(client.submit(fails), client.submit(cancelled), client.submit(ok),
+                                    return_exceptions=True)
+
+    failed, cancelled_result, ok_result = asyncio.run(run())
+    assert isinstance(failed, ValueError)
+    assert isinstance(cancelled_result, asyncio.CancelledError)
+    assert ok_result == "ok"
@@ -0,0 +1,58 @@
+import asyncio
+import email
+import email.utils
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from agents.email_agent import AsyncEmailAgent, EmailProcessor
+
+
+def test_format_email_reply_accepts_folded_headers():
+    original = email.message_from_bytes(
+        b"From: Accounts Payable Department of Example Corporation\r\n <ap@example.com>\r\n"
+        b"To: me@example.org\r\n"
+        b"Subject: Invoice\r\n"
+        b"\r\n"
+        b"Please see attached.\r\n"
+    )
+    email_data = {"from": original["From"], "to": original["To"], "subject": original["Subject"]}
+
+    formatted = AsyncEmailAgent.format_email_reply(None, {"body": "Thanks, received."}, email_data)
+
+    reply = email.message_from_string(formatted)
+    assert email.utils.parseaddr(reply["To"])[1] == "ap@example.com"
+    assert reply["Subject"] == "Re: Invoice"
+
+
+def test_extract_email_entities_batch_retries_malformed_entries():
+    agent = AsyncEmailAgent.__new__(AsyncEmailAgent)
+    emails = [{"from": "a@example.com", "body": "one"}, {"from": "b@example.com", "body": "two"}]
+    retried = []
+
+    async def ainvoke_json(call_site, messages):
+        return {"results": ["not an entry", {"id": 0, "entities": [{"type": "Person"}], "relationships": []}]}
+
+    async def extract_email_entities(email_data):
+        retried.append(email_data)
+        return {"entities": [], "relationships": []}
+
+    agent._ainvoke_json = ainvoke_json
+    agent.extract_email_entities = extract_email_entities
+
+    results = asyncio.run(agent.extract_email_entities_batch(emails))
+
+    assert results[0] == {"entities": [{"type": "Person"}], "relationships": []}
+    assert retried == [emails[1]]
+
+
+@pytest.mark.parametrize("raw", [
+    b"Content-Type: text/plain; charset=x-unknown\r\n\r\nAmount due: 100\r\n",
+    b"Content-Type: multipart/mixed; boundary=b\r\n\r\n"
+    b"--b\r\nContent-Type: text/plain; charset=x-unknown\r\n\r\nAmount due: 100\r\n--b--\r\n",
+])
+def test_parse_email_tolerates_unknown_charsets(raw):
+    email_data = EmailProcessor().parse_email(raw)
+
+    assert "Amount due: 100" in email_data["body"]
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from integrations import gmail
+from integrations.gmail import GmailMonitor
+
+_HEADER_1 = (b"From: Billing <billing@vendor.example>\r\nTo: me@example.org\r\n"
+             b"Subject: Invoice 42\r\nDate: Mon, 1 Jan 2024 09:00:00 +0000\r\n\r\n")
+_HEADER_2 = b"From: friend@example.org\r\nTo: me@example.org\r\nSubject: Lunch?\r\n\r\n"
+
+# multipart/mixed holding a multipart/alternative body and a PDF attachment
+_NESTED_STRUCTURE = (
+    b' BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "QUOTED-PRINTABLE" 24 1 NIL NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "UTF-8") NIL NIL "7BIT" 40 1 NIL NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "a") NIL NIL NIL)'
+    b'("APPLICATION" "PDF" ("NAME" "Invoice-42.pdf") NIL NIL "BASE64" 400 NIL ("ATTACHMENT" ("FILENAME" "Invoice-42.pdf")) NIL NIL)'
+    b' "MIXED" ("BOUNDARY" "m") NIL NIL NIL))'
+)
+
+# as returned by imaplib for UID FETCH 101,102 (BODY.PEEK[HEADER] BODYSTRUCTURE): the
+# first message has UID before its header literal, the second (as Gmail sends it) after
+_HEADER_RESPONSE = [
+    (b"1 (UID 101 BODY[HEADER] {%d}" % len(_HEADER_1), _HEADER_1),
+    _NESTED_STRUCTURE,
+    (b"2 (BODY[HEADER] {%d}" % len(_HEADER_2), _HEADER_2),
+    b' UID 102 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "US-ASCII") NIL NIL "7BIT" 9 1 NIL NIL NIL NIL))',
+]
+
+_PART_RESPONSES = {
+    "1.1": [(b"1 (UID 101 BODY[1.1] {24}", b"Amount due: =E2=82=AC100\r\n"), b")"],
+    "1": [(b"2 (UID 102 BODY[1] {9}", b"Noon? :)\r"), b")"],
+}
+
+
+def test_parse_fetch_response_keys_by_uid_before_or_after_the_literal():
+    messages = gmail._parse_fetch_response(_HEADER_RESPONSE)
+
+    assert set(messages) == {b"101", b"102"}
+    assert messages[b"101"]["BODY[HEADER]"] == _HEADER_1
+    assert messages[b"102"]["BODY[HEADER]"] == _HEADER_2
+    assert messages[b"102"]["BODYSTRUCTURE"][:2] == ["TEXT", "PLAIN"]
+
+
+def test_parse_fetch_response_reads_quoted_strings_and_nil():
+    data = [b'3 (UID 7 BODYSTRUCTURE ("TEXT" "PLAIN" ("NAME" "say \\"hi\\" (1).txt") NIL NIL "7BIT" 2 1 NIL NIL NIL NIL))']
+
+    structure = gmail._parse_fetch_response(data)[b"7"]["BODYSTRUCTURE"]
+
+    assert structure[2] == ["NAME", 'say "hi" (1).txt']
+    assert structure[3] is None
+
+
+def test_plan_parts_walks_nested_multipart_and_finds_invoice_attachments():
+    structure = gmail._parse_fetch_response(_HEADER_RESPONSE)[b"101"]["BODYSTRUCTURE"]
+
+    text_parts, attachments = GmailMonitor()._plan_parts(structure)
+
+    assert text_parts == [("1.1", "QUOTED-PRINTABLE", "UTF-8")]
+    assert attachments == [{"filename": "Invoice-42.pdf", "content_type": "application/pdf", "size": 300}]
+    assert gmail._INVOICE_FN_RE.search(attachments[0]["filename"])
+
+
+class _Mail:
+    def __init__(self):
+        self.commands = []
+
+    def uid(self, command, ids, items):
+        self.commands.append((ids, items))
+        if items == "(BODY.PEEK[HEADER] BODYSTRUCTURE)":
+            return "OK", _HEADER_RESPONSE
+        return "OK", _PART_RESPONSES[items[len("(BODY.PEEK["):-len("])")]]
+
+
+def test_fetch_email_batch_downloads_only_text_parts():
+    mail = _Mail()
+
+    emails = asyncio.run(GmailMonitor()._fetch_email_batch([b"101", b"102"], mail))
+
+    assert [e["id"] for e in emails] == ["101", "102"]
+    assert emails[0]["body"] == "Amount due: €100\r\n"
+    assert emails[0]["attachments"][0]["filename"] == "Invoice-42.pdf"
+    assert emails[0]["has_invoice"]
+    assert emails[1]["body"] == "Noon? :)\r"
+    assert not emails[1]["has_invoice"]
+    # one FETCH for the headers and structures, then one per distinct part number, never the PDF
+    assert [items for _, items in mail.commands] == [
+        "(BODY.PEEK[HEADER] BODYSTRUCTURE)", "(BODY.PEEK[1.1])", "(BODY.PEEK[1])",
+    ]
+
+
+_EMAIL_DATA = {
+    "id": "101",
+    "subject": "Invoice 42",
+    "from": "Accounts Payable Department of Example Corporation\r\n <ap@example.com>",
+    "to": "me@example.org",
+    "date": "2024-01-01T09:00:00+00:00",
+    "body": "Amount due: €100\n",
+    "attachments": [],
+    "has_invoice": True,
+}
+
+
+def test_email_message_feeds_the_analyser():
+    analyser = pytest.importorskip("agents.analyser")
+
+    message = gmail.email_message(_EMAIL_DATA)
+    instance = analyser.Analyser.__new__(analyser.Analyser)
+
+    assert instance._extract_email_metadata(message)["subject"] == "Invoice 42"
+    assert instance._extract_email_metadata(message)["date"] == "Mon, 01 Jan 2024 09:00:00 +0000"
+    assert instance._extract_email_content(message) == "Amount due: €100\n"
+
+
+def _monitoring():
+    monitor = GmailMonitor()
+    monitor._monitoring = True
+    return monitor
+
+
+def test_handle_email_marks_the_email_read_after_the_handler_succeeds():
+    monitor = _monitoring()
+    received = []
+
+    async def handler(message):
+        received.append(message["Subject"])
+        return "done"
+
+    assert asyncio.run(monitor.handle_email(_EMAIL_DATA, handler)) == "done"
+    assert received == ["Invoice 42"]
+    assert monitor._pending_seen == ["101"]
+
+
+def test_handle_email_leaves_the_email_unread_when_the_handler_fails():
+    monitor = _monitoring()
+
+    async def handler(message):
+        raise RuntimeError("LLM unavailable")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(monitor.handle_email(_EMAIL_DATA, handler))
+    assert monitor._pending_seen == []
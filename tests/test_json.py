@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from agents import _json
+from agents._json import JSONObjectStream, extract_json_object, parse_llm_json
+
+_RESPONSE = '{"subject": "Re: {Invoice}", "body": "He said \\"pay\\" \\\\ {now}", "items": [{"n": 1}, [2, 3]], "done": true}'
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', '{"a": 1}'),
+    ('Sure! Here you go: {"a": {"b": 2}} Hope that helps {:', '{"a": {"b": 2}}'),
+    ('```json\n{"a": "}"}\n```', '{"a": "}"}'),
+    ('{"a": "quote \\" and brace {"}', '{"a": "quote \\" and brace {"}'),
+    ('{"a": "backslash \\\\"} trailing }', '{"a": "backslash \\\\"}'),
+    ('no object here', None),
+    ('{"unterminated": {"a": 1}', None),
+])
+def test_extract_json_object(text, expected):
+    assert extract_json_object(text) == expected
+
+
+def test_parse_llm_json_handles_fences_and_trailing_text():
+    assert parse_llm_json('```json\n{"a": [1, {"b": "}"}]}\n```\nLet me know!') == {"a": [1, {"b": "}"}]}
+    with pytest.raises(ValueError):
+        parse_llm_json("I could not produce JSON.")
+
+
+@pytest.mark.parametrize("split", range(1, len(_RESPONSE)))
+def test_stream_yields_the_same_members_wherever_chunks_split(split):
+    stream = JSONObjectStream()
+
+    members = stream.feed(_RESPONSE[:split]) + stream.feed(_RESPONSE[split:])
+
+    assert dict(members) == json.loads(_RESPONSE)
+    assert [key for key, _ in members] == ["subject", "body", "items", "done"]
+    assert stream.done and stream.result() == json.loads(_RESPONSE)
+
+
+def test_stream_emits_members_as_soon_as_they_complete():
+    stream = JSONObjectStream()
+
+    assert stream.feed('```json\n{"subject": "Hi, {there}"') == []
+    assert stream.feed(', "body": "lo') == [("subject", "Hi, {there}")]
+    assert not stream.done
+    assert stream.feed('ng"}\n```\ntrailing {text}') == [("body", "long")]
+    assert stream.done
+    assert stream.feed('{"ignored": 1}') == []
+
+
+def test_stream_result_requires_the_closing_brace():
+    stream = JSONObjectStream()
+    stream.feed('{"a": 1, "b": ')
+
+    with pytest.raises(ValueError):
+        stream.result()
+
+
+def test_stream_raises_on_an_invalid_member():
+    stream = JSONObjectStream()
+
+    with pytest.raises(json.JSONDecodeError):
+        stream.feed('{"a": tru, "b": 1}')
+
+
+def test_loads_tolerates_raw_control_characters():
+    assert _json.loads('{"a": "line\nbreak"}') == {"a": "line\nbreak"}
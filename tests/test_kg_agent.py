@@ -0,0 +1,96 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("neo4j")
+pytest.importorskip("langchain_core")
+
+# the module lives in a directory whose name is not a valid package name
+_spec = importlib.util.spec_from_file_location(
+    "kg_agent",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge graph", "kg_agent.py"),
+)
+kg_agent = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kg_agent)
+
+
+class _Session:
+    def __init__(self):
+        self.queries = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        self.queries.append(query)
+        raise AssertionError(f"unexpected query: {query}")
+
+
+class _Driver:
+    def __init__(self):
+        self.session_ = _Session()
+
+    def session(self):
+        return self.session_
+
+
+def _graph():
+    graph = kg_agent.AsyncKnowledgeGraph.__new__(kg_agent.AsyncKnowledgeGraph)
+    graph.driver = _Driver()
+    return graph
+
+
+@pytest.mark.parametrize("from_props, to_props", [({}, {"name": "Report"}), ({"name": "Excel"}, {})])
+def test_store_extraction_rejects_empty_endpoint_props(from_props, to_props):
+    agent = kg_agent.AsyncKnowledgeGraphAgent.__new__(kg_agent.AsyncKnowledgeGraphAgent)
+    agent.kg = _graph()
+
+    result = asyncio.run(agent._store_extraction({"relationships": [{
+        "from_type": "Application", "from_props": from_props,
+        "rel_type": "GENERATES",
+        "to_type": "Output", "to_props": to_props,
+    }]}))
+
+    assert result["created_relationships"] == []
+    assert len(result["errors"]) == 1
+    assert agent.kg.driver.session_.queries == []
+
+
+def test_create_relationships_never_matches_without_where():
+    graph = _graph()
+    rows = [{"from_props": {}, "to_props": {"name": "Report"}}]
+
+    with pytest.raises(ValueError):
+        asyncio.run(graph.create_relationships("Application", "GENERATES", "Output", rows))
+    with pytest.raises(ValueError):
+        asyncio.run(graph.create_relationship("Application", {}, "GENERATES", "Output", {"name": "Report"}))
+
+    assert graph.driver.session_.queries == []
+
+
+def test_learn_from_tasks_iter_yields_every_task_index_once():
+    agent = kg_agent.AsyncKnowledgeGraphAgent.__new__(kg_agent.AsyncKnowledgeGraphAgent)
+    agent.max_concurrency = 2
+    tasks = [{"task_id": i} for i in range(kg_agent._TASK_BATCH_SIZE * 2 + 3)]
+
+    async def extract(batch):
+        return [{"task_id": task["task_id"]} for task in batch]
+
+    async def store(extraction):
+        return {"stored": extraction["task_id"]}
+
+    agent.extract_entities_from_tasks_batch = extract
+    agent._store_extraction = store
+
+    async def collect():
+        return [item async for item in agent.learn_from_tasks_iter(tasks)]
+
+    results = asyncio.run(collect())
+
+    assert sorted(results, key=lambda item: item[0]) == [(i, {"stored": i}) for i in range(len(tasks))]
+    assert asyncio.run(agent.learn_from_tasks(tasks)) == [{"stored": i} for i in range(len(tasks))]
@@ -0,0 +1,29 @@
+import importlib
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from agents import _llm_cache
+
+
+def test_default_cache_is_memory_only(monkeypatch, tmp_path):
+    monkeypatch.delenv("LUMORA_CACHE_DIR", raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    module = importlib.reload(_llm_cache)
+    try:
+        cache = module.LLMCache()
+        cache.put("key", {"answer": 1})
+
+        assert cache.cache_dir is None
+        assert cache.get("key") == {"answer": 1}
+        assert not any(tmp_path.iterdir())
+    finally:
+        monkeypatch.undo()
+        importlib.reload(_llm_cache)
+
+
+def test_cache_dir_persists_entries(tmp_path):
+    _llm_cache.LLMCache(cache_dir=str(tmp_path)).put("key", {"answer": 1})
+
+    assert _llm_cache.LLMCache(cache_dir=str(tmp_path)).get("key") == {"answer": 1}
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from agents import _rate_limit
+from agents._rate_limit import RateLimitedTransport, provider_profile, request_tokens
+
+
+def test_provider_profile_env_overrides(monkeypatch):
+    monkeypatch.setenv("LUMORA_LLM_RPM", "3")
+    monkeypatch.setenv("LUMORA_LLM_MAX_CONCURRENCY", "2")
+    monkeypatch.delenv("LUMORA_LLM_TPM", raising=False)
+
+    profile = provider_profile("azure")
+
+    assert profile.rpm == 3
+    assert profile.max_concurrency == 2
+    assert profile.tpm == _rate_limit.PROVIDER_PROFILES["azure"].tpm
+
+
+class _Body(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b"{}"
+
+
+class _Upstream(httpx.AsyncBaseTransport):
+    # unlike httpx.MockTransport, leaves the body unread, as a network transport does
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    async def handle_async_request(self, request):
+        return httpx.Response(self.status_code, stream=_Body())
+
+
+def _client(status_code):
+    transport = RateLimitedTransport(_Upstream(status_code))
+    return transport, httpx.AsyncClient(transport=transport)
+
+
+def test_transport_shares_one_limiter_per_provider():
+    transport, client = _client(200)
+
+    async def run():
+        async with client:
+            await client.post("https://api.openai.com/v1/chat/completions", content=b"x" * 400)
+            token = request_tokens.set(7)
+            try:
+                await client.post("https://api.openai.com/v1/chat/completions", content=b"x" * 400)
+            finally:
+                request_tokens.reset(token)
+
+    asyncio.run(run())
+
+    limiter = transport.limiter_for("api.openai.com")
+    assert [tokens for _, tokens in limiter._requests] == [100, 7]
+    assert transport.limiter_for("example.openai.azure.com") is not limiter
+
+
+def test_transport_backs_off_on_429():
+    transport, client = _client(429)
+
+    async def run():
+        async with client:
+            response = await client.post("https://api.openai.com/v1/chat/completions", content=b"{}")
+            assert response.status_code == 429
+
+    asyncio.run(run())
+
+    limiter = transport.limiter_for("api.openai.com")
+    assert limiter.limit == limiter.profile.max_concurrency / 2
+
+
+def test_transport_holds_slot_until_response_body_is_closed():
+    transport, client = _client(200)
+    limiter = transport.limiter_for("api.openai.com")
+
+    async def run():
+        async with client:
+            async with client.stream("POST", "https://api.openai.com/v1/chat/completions", content=b"{}") as response:
+                assert limiter._inflight == 1
+                await response.aread()
+            assert limiter._inflight == 0
+
+    asyncio.run(run())
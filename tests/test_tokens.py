@@ -0,0 +1,21 @@
+import pytest
+
+from agents import _tokens
+
+
+def test_falls_back_to_character_budget_when_encoding_cannot_load(monkeypatch):
+    tiktoken = pytest.importorskip("tiktoken")
+
+    def offline(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    _tokens._get_encoding.cache_clear()
+    _tokens.count_prompt_tokens.cache_clear()
+    try:
+        assert _tokens.truncate_to_tokens("x" * 12, max_tokens=2) == "x" * 8 + _tokens._TRUNCATION_MARKER
+        assert _tokens.count_prompt_tokens("x" * 12) == 3
+    finally:
+        _tokens._get_encoding.cache_clear()
+        _tokens.count_prompt_tokens.cache_clear()